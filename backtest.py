@@ -0,0 +1,244 @@
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import io
+import os
+import pickle
+import pandas as pd
+from weekend_functions import CombinationTables, drop_empties, enumerate_teams_vectorized, score_race_full, score_race_qualifying_sprint_predicted, sentinel_codes
+from sheet_loader import SheetCache, load_season
+
+
+def actual_race_inputs(weekend_df, track_name):
+    '''
+    the actual qualifying and race positions of a weekend dataframe, as numbers. the sentinel codes are kept as codes
+    (100 OUT, 200 DNF, 300 DNQ, 400 DQ), whether the sheet has them as numbers or as the words, so they score the points
+    the rules give them instead of being taken for finishing places. gain/loss and overtakes are worked out from the
+    difference between the actual qualifying and race positions, the same assumption the predicted scoring makes, and a
+    driver that didn't finish the race gains or loses no positions.
+
+    parameters:
+    weekend_df: dataframe, weekend dataframe with actual_qualifying_{track_name} and actual_race_{track_name} columns
+    track_name: str, track name as it appears in the sheet_gid dict
+
+    returns:
+    actual_df: dataframe, the Team and Driver of every driver with actual results, and their numeric 'qualifying' and 'race' positions
+    driver_gain_loss_overtake: dict, each driver's gain/loss and overtakes
+    '''
+    actual_df = weekend_df[['Team', 'Driver', f'actual_qualifying_{track_name}', f'actual_race_{track_name}']].dropna().copy()
+    actual_df.columns = ['Team', 'Driver', 'qualifying', 'race']
+    for session in ['qualifying', 'race']:
+        actual_df[session] = pd.to_numeric(actual_df[session].replace(sentinel_codes)).astype(int)
+
+    n_drivers = len(actual_df)
+    start = actual_df.qualifying.where(actual_df.qualifying <= n_drivers, n_drivers)
+    gain_loss = (start - actual_df.race).where(actual_df.race <= n_drivers, 0)
+    driver_gain_loss_overtake = {d: {'gain_loss': int(g), 'overtake': max(int(g), 0)} for d, g in zip(actual_df.Driver, gain_loss)}
+
+    return actual_df, driver_gain_loss_overtake
+
+
+def score_actual_weekend(weekend_df, track_name, superlatives=None, rules=None):
+    '''
+    scores the actual results of a weekend with score_race_full, the sentinel codes as positions so DNF, DNQ and DQ score their own points
+
+    parameters:
+    weekend_df: dataframe, weekend dataframe with actual_qualifying_{track_name} and actual_race_{track_name} columns
+    track_name: str, track name as it appears in the sheet_gid dict
+    superlatives: dict, see backtest_track
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
+
+    returns:
+    driver_scores: dict, each driver's actual score
+    constructor_scores: dict, each constructor's actual score
+    '''
+    superlatives = superlatives or {}
+    actual_df, driver_gain_loss_overtake = actual_race_inputs(weekend_df, track_name)
+    driver_to_constructor = dict(zip(actual_df.Driver, actual_df.Team))
+    constructor_to_driver = actual_df.groupby('Team', sort=False).Driver.apply(list).to_dict()
+
+    race_winner = actual_df.Driver[actual_df.race == 1].tolist()
+    driver_scores, constructor_scores, _, _ = score_race_full(
+        {},
+        {},
+        dict(zip(actual_df.Driver, actual_df.qualifying)),
+        dict(zip(actual_df.Driver, actual_df.race)),
+        driver_gain_loss_overtake,
+        driver_to_constructor,
+        constructor_to_driver,
+        superlatives.get('fastest_lap', race_winner[0] if race_winner else None),
+        superlatives.get('driver_ofthe_day'),
+        superlatives.get('fastest_pitstop'),
+        superlatives.get('second_fastest_pitstop'),
+        superlatives.get('third_fastest_pitstop'),
+        rules)
+
+    return driver_scores, constructor_scores
+
+
+def team_points(driver_selection, constructor_team, turbo_driver, driver_scores, constructor_scores):
+    '''
+    points a team scores with the turbo on turbo_driver, drivers or constructors without a score count as 0
+    '''
+    return sum(driver_scores.get(d, 0) for d in driver_selection) + driver_scores.get(turbo_driver, 0) + sum(constructor_scores.get(c, 0) for c in constructor_team)
+
+
+def backtest_track(weekend_df, track_name, driver_pricing, constructor_pricing, cost_cap=100.0, superlatives=None, rules=None):
+    '''
+    replays one race weekend: picks the best predicted team that fits in cost_cap (without any substitution penalty, so every
+    weekend can be replayed on its own), then scores that team on the actual results with the rules' score_weekends kernel.
+    the best team in hindsight, picked with the actual scores, is scored too as a yardstick.
+
+    parameters:
+    weekend_df: dataframe, weekend dataframe with predicted and actual columns
+    track_name: str, track name as it appears in the sheet_gid dict
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    cost_cap: float, cost cap the team is picked with
+    superlatives: dict, optional actual 'fastest_lap', 'driver_ofthe_day', 'fastest_pitstop', 'second_fastest_pitstop' and
+                  'third_fastest_pitstop' of the weekend. the fastest lap defaults to the race winner, the others to nobody.
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
+
+    returns:
+    row: dict, the track's row of the season backtest table
+    '''
+    superlatives = superlatives or {}
+    weekend_df = drop_empties(weekend_df)
+    current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+    current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        drivers, constructors, driver_scores, constructor_scores, _, _ = score_race_qualifying_sprint_predicted(weekend_df, track_name, rules)
+
+    # only drivers with a price for the weekend can be picked
+    drivers = [d for d in drivers if d in current_driver_values]
+    constructors = [c for c in constructors if c in current_constructor_values]
+
+    tables = CombinationTables(drivers, constructors, driver_scores, constructor_scores, current_driver_values, current_constructor_values, [], [])
+    top_teams, _ = enumerate_teams_vectorized(drivers, constructors, driver_scores, constructor_scores, current_driver_values, current_constructor_values, [], [], cost_cap, True, 1, tables=tables)
+    team = top_teams[-1]
+
+    # score the actual weekend
+    actual_driver_scores, actual_constructor_scores = score_actual_weekend(weekend_df, track_name, superlatives, rules)
+    actual_driver_scores = {d: actual_driver_scores.get(d, 0) for d in drivers}
+    actual_constructor_scores = {c: actual_constructor_scores.get(c, 0) for c in constructors}
+
+    # the best team that could have been picked knowing the results
+    hindsight_teams, _ = enumerate_teams_vectorized(drivers, constructors, actual_driver_scores, actual_constructor_scores, current_driver_values, current_constructor_values, [], [], cost_cap, True, 1, tables=tables.with_scores(actual_driver_scores, actual_constructor_scores))
+    hindsight_team = hindsight_teams[-1]
+
+    return {
+        'track': track_name,
+        'predicted_points': team.score,
+        'actual_points': team_points(team.driver_selection, team.constructor_team, team.turbo_driver, actual_driver_scores, actual_constructor_scores),
+        'hindsight_best_points': hindsight_team.score,
+        'drivers': ', '.join(team.driver_selection),
+        'turbo_driver': team.turbo_driver,
+        'constructors': ', '.join(team.constructor_team),
+        'team_value': team.proposed_team_value,
+    }
+
+
+# bumped whenever backtest_track scores differently, so results cached by an older version are replayed
+cache_version = 2
+
+
+def _inputs_hash(weekend_df, track_name, driver_pricing, constructor_pricing, cost_cap, superlatives):
+    '''
+    hash of everything a track's backtest depends on, to key its cached result
+    '''
+    inputs = hashlib.sha256()
+    inputs.update(weekend_df.to_csv(index=False).encode())
+    inputs.update(driver_pricing[['Driver', track_name]].to_csv(index=False).encode())
+    inputs.update(constructor_pricing[['Constructor', track_name]].to_csv(index=False).encode())
+    inputs.update(repr((cache_version, track_name, cost_cap, sorted((superlatives or {}).items()))).encode())
+    return inputs.hexdigest()
+
+
+def tracks_with_results(weekend_dfs):
+    '''
+    the tracks, in calendar order, whose weekend dataframe has actual qualifying and race results filled in
+    '''
+    tracks = []
+    for track_name, weekend_df in weekend_dfs.items():
+        columns = [f'actual_qualifying_{track_name}', f'actual_race_{track_name}']
+        if all(c in weekend_df.columns and weekend_df[c].notna().any() for c in columns):
+            tracks.append(track_name)
+    return tracks
+
+
+def run_backtest(
+    track_names = None,
+    cost_cap = 100.0,
+    workers = None,
+    cache = None,
+    cache_dir = 'backtest_cache',
+    output = 'season_backtest.csv',
+    superlatives = None):
+    '''
+    replays the prediction -> optimizer pipeline over the season. every track in sheet_gid with actual results is replayed
+    with backtest_track on a process pool, and the season table of predicted vs actual points is written to output.
+    each track's result is cached in cache_dir under a hash of its inputs, so only the weekends that changed are replayed.
+
+    parameters:
+    track_names: list, tracks to replay, defaults to every track in sheet_gid with actual results
+    cost_cap: float, cost cap the teams are picked with
+    workers: int, number of processes to replay tracks on
+    cache: SheetCache, where the sheets are loaded from, defaults to sheet_loader.default_cache
+    cache_dir: str, directory the per track results are cached in, None to not cache them
+    output: str, csv file the season table is written to, None to not write it
+    superlatives: dict, track name to the superlatives dict of backtest_track for that weekend
+
+    returns:
+    season_df: dataframe, one row per track of predicted vs actual points, plus a total row
+    '''
+    superlatives = superlatives or {}
+    weekend_dfs, driver_pricing, constructor_pricing, _ = load_season(track_names, cache, print_report=False)
+    if track_names is None:
+        track_names = tracks_with_results(weekend_dfs)
+
+    rows, to_replay = {}, []
+    for track_name in track_names:
+        key = _inputs_hash(weekend_dfs[track_name], track_name, driver_pricing, constructor_pricing, cost_cap, superlatives.get(track_name))
+        cache_path = os.path.join(cache_dir, f'{track_name}_{key}.pkl') if cache_dir else None
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                rows[track_name] = pickle.load(f)
+        else:
+            to_replay.append((track_name, cache_path))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {track_name: pool.submit(backtest_track, weekend_dfs[track_name], track_name, driver_pricing, constructor_pricing, cost_cap, superlatives.get(track_name)) for track_name, _ in to_replay}
+        for track_name, cache_path in to_replay:
+            rows[track_name] = futures[track_name].result()
+            if cache_path:
+                os.makedirs(cache_dir, exist_ok=True)
+                with open(cache_path, 'wb') as f:
+                    pickle.dump(rows[track_name], f)
+
+    season_df = pd.DataFrame([rows[t] for t in track_names])
+    if len(season_df):
+        season_df.loc[len(season_df)] = {'track': 'total', **season_df[['predicted_points', 'actual_points', 'hindsight_best_points']].sum().to_dict()}
+
+    if output:
+        season_df.to_csv(output, index=False)
+
+    return season_df
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the season: pick each weekend\'s team from the predictions and score it on the actual results.')
+    parser.add_argument('tracks', nargs='*', help='tracks to replay, defaults to every track with actual results')
+    parser.add_argument('--cost-cap', type=float, default=100.0, help='cost cap to pick the teams with')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes to replay tracks on')
+    parser.add_argument('--output', default='season_backtest.csv', help='csv file to write the season table to')
+    parser.add_argument('--offline', action='store_true', help='only use the locally cached sheets')
+    args = parser.parse_args()
+
+    season_df = run_backtest(
+        args.tracks or None,
+        cost_cap=args.cost_cap,
+        workers=args.workers,
+        cache=SheetCache(offline=args.offline))
+    print(season_df.to_string(index=False))
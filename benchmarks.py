@@ -0,0 +1,188 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+from weekend_functions import check_df, driver_constructor_mappings, main, score_race_full, score_race_qualifying_sprint_predicted, team_search_engines
+
+# grid sizes to benchmark, as (number of drivers, number of constructors)
+grid_sizes = [(20, 10), (22, 11), (24, 12)]
+
+# remaining cost cap on top of the current team, a tight cap leaves only a small share of the teams affordable
+cost_caps = {'tight': 0.0, 'loose': 50.0}
+
+bench_track = 'bahrain'
+
+
+def synthetic_weekend(n_drivers, n_constructors, track_name=bench_track, sprint=False, seed=0):
+    '''
+    builds a made up weekend dataframe and pricing tables in the same layout as the google sheet,
+    two drivers per constructor with fp, predicted and actual position columns for track_name
+
+    parameters:
+    n_drivers: int, number of drivers, twice n_constructors
+    n_constructors: int, number of constructors
+    track_name: str, track name used in the column names and as the pricing column
+    sprint: bool, if True the sprint qualifying and sprint race columns are added
+    seed: int, seed of the random positions and prices
+
+    returns:
+    weekend_df: dataframe, weekend dataframe
+    driver_pricing: dataframe, driver prices with a column for track_name
+    constructor_pricing: dataframe, constructor prices with a column for track_name
+    '''
+    rng = np.random.default_rng(seed)
+    constructors = [f'Constructor {i + 1}' for i in range(n_constructors)]
+    weekend_df = pd.DataFrame({
+        'Team': np.repeat(constructors, n_drivers // n_constructors),
+        'Driver': [f'Driver {i + 1}' for i in range(n_drivers)],
+    })
+
+    sessions = ['fp1', 'fp2', 'fp3', 'predicted_qualifying', 'predicted_race', 'actual_qualifying', 'actual_race']
+    if sprint:
+        sessions.extend(['predicted_sprint_qualifying', 'predicted_sprint_race'])
+    for session in sessions:
+        weekend_df[f'{session}_{track_name}'] = rng.permutation(n_drivers) + 1
+
+    driver_pricing = pd.DataFrame({'Driver': weekend_df.Driver, track_name: np.round(rng.uniform(4, 30, n_drivers), 1)})
+    constructor_pricing = pd.DataFrame({'Constructor': constructors, track_name: np.round(rng.uniform(5, 30, n_constructors), 1)})
+    return weekend_df, driver_pricing, constructor_pricing
+
+
+def time_call(function, repeats):
+    '''
+    runs function repeats times with its printing silenced
+
+    returns:
+    timings: dict, best, median and mean wall time in seconds
+    '''
+    times = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times), 'repeats': repeats}
+
+
+def run_benchmarks(grids=grid_sizes, engines=('vectorized', 'branch_and_bound', 'meet_in_the_middle'), repeats=5, main_repeats=3, seed=0):
+    '''
+    times the scoring functions and main end to end on synthetic weekends of each grid size, with and without a sprint,
+    and main with each engine under a tight and a loose cost cap
+
+    parameters:
+    grids: list, (number of drivers, number of constructors) grid sizes
+    engines: list, names of the team_search_engines to run main with
+    repeats: int, runs of each scoring function
+    main_repeats: int, runs of main for each engine and cost cap
+    seed: int, seed of the synthetic weekends
+
+    returns:
+    results: list, one dict per benchmark with its name, parameters and timings
+    '''
+    results = []
+    for n_drivers, n_constructors in grids:
+        for sprint in [False, True]:
+            weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(n_drivers, n_constructors, sprint=sprint, seed=seed)
+            parameters = {'drivers': n_drivers, 'constructors': n_constructors, 'sprint': sprint}
+
+            actual_qualifying_order = weekend_df.sort_values(f'actual_qualifying_{bench_track}')['Driver'].tolist()
+            actual_race_order = weekend_df.sort_values(f'actual_race_{bench_track}')['Driver'].tolist()
+            driver_gain_loss_overtake = {d: {'gain_loss': actual_qualifying_order.index(d) - actual_race_order.index(d), 'overtake': 0} for d in actual_race_order}
+            driver_to_constructor, constructor_to_driver = driver_constructor_mappings(weekend_df)
+
+            benchmarks = {
+                'score_race_qualifying_sprint_predicted': lambda: score_race_qualifying_sprint_predicted(weekend_df, bench_track),
+                'score_race_full': lambda: score_race_full({}, {}, actual_qualifying_order, actual_race_order, driver_gain_loss_overtake, driver_to_constructor, constructor_to_driver, actual_race_order[0], None, None, None, None),
+                'driver_constructor_mappings': lambda: driver_constructor_mappings(weekend_df),
+                'check_df': lambda: check_df(weekend_df),
+            }
+            for name, function in benchmarks.items():
+                results.append({'benchmark': name, **parameters, **time_call(function, repeats)})
+                print(f'{name} {parameters}: {results[-1]["best"] * 1000:.2f} ms')
+
+            # the current team is the middle of the pack, so the tight cap only affords teams around its value
+            driver_order = driver_pricing.sort_values(bench_track).Driver.tolist()
+            constructor_order = constructor_pricing.sort_values(bench_track).Constructor.tolist()
+            middle_drivers = driver_order[n_drivers // 2 - 2: n_drivers // 2 + 3]
+            middle_constructors = constructor_order[n_constructors // 2 - 1: n_constructors // 2 + 1]
+
+            for cap_name, remaining_cost_cap in cost_caps.items():
+                for engine in engines:
+                    function = lambda: main(middle_drivers, middle_constructors, weekend_df, bench_track, driver_pricing, constructor_pricing, remaining_cost_cap, engine=engine)
+                    results.append({'benchmark': 'main', **parameters, 'cost_cap': cap_name, 'engine': engine, **time_call(function, main_repeats)})
+                    print(f'main {parameters} {cap_name} cap, {engine}: {results[-1]["best"]:.3f} s')
+
+    return results
+
+
+def benchmark_key(result):
+    '''
+    identifies a benchmark across result files, everything but its timings
+    '''
+    return tuple((k, v) for k, v in sorted(result.items()) if k not in ('best', 'median', 'mean', 'repeats'))
+
+
+def compare_results(baseline_path, new_path):
+    '''
+    prints how the best time of each benchmark in new_path changed from baseline_path, e.g. results from two commits
+    '''
+    with open(baseline_path) as f:
+        baseline = {benchmark_key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    for result in new:
+        key = benchmark_key(result)
+        label = ', '.join(f'{k}={v}' for k, v in key)
+        if key not in baseline:
+            print(f'{label}: {result["best"] * 1000:.2f} ms (new)')
+            continue
+        ratio = result['best'] / baseline[key]['best']
+        print(f'{label}: {baseline[key]["best"] * 1000:.2f} ms -> {result["best"] * 1000:.2f} ms ({ratio:.2f}x)')
+
+
+def run_metadata():
+    '''
+    what the benchmarks ran on, so result files from different commits or machines can be told apart
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the scoring and team search on synthetic weekends.')
+    parser.add_argument('--output', default='benchmark_results.json', help='json file to write the results to')
+    parser.add_argument('--engines', nargs='+', default=['vectorized', 'branch_and_bound', 'meet_in_the_middle'], choices=list(team_search_engines), help='engines to run main with')
+    parser.add_argument('--grids', nargs='+', default=[f'{d}/{c}' for d, c in grid_sizes], help='grid sizes as drivers/constructors, e.g. 20/10')
+    parser.add_argument('--repeats', type=int, default=5, help='runs of each scoring function')
+    parser.add_argument('--main-repeats', type=int, default=3, help='runs of main for each engine and cost cap')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'NEW'), help='compare two result files instead of running the benchmarks')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+    else:
+        grids = [tuple(int(x) for x in grid.split('/')) for grid in args.grids]
+        results = run_benchmarks(grids, args.engines, args.repeats, args.main_repeats)
+        with open(args.output, 'w') as f:
+            json.dump({'metadata': run_metadata(), 'results': results}, f, indent=2)
+        print(f'Results written to {args.output}')
@@ -0,0 +1,247 @@
+import datetime
+import hashlib
+import json
+import sqlite3
+import pandas as pd
+
+# one row per main() run, its top teams (rank 1 is the best), the drivers and constructors on each of them,
+# and the predicted and actual points with their breakdowns
+schema = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    track TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    inputs_hash TEXT,
+    engine TEXT,
+    chip TEXT,
+    remaining_cost_cap REAL,
+    current_team_value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_track ON runs (track, created_at);
+CREATE INDEX IF NOT EXISTS runs_inputs_hash ON runs (inputs_hash);
+
+CREATE TABLE IF NOT EXISTS teams (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    rank INTEGER NOT NULL,
+    score REAL NOT NULL,
+    proposed_team_value REAL,
+    remaining_cost_cap REAL,
+    substitutions_needed INTEGER,
+    turbo_driver TEXT,
+    drivers TEXT,
+    constructors TEXT,
+    PRIMARY KEY (run_id, rank)
+);
+
+CREATE TABLE IF NOT EXISTS team_members (
+    run_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    multiplier INTEGER NOT NULL,
+    PRIMARY KEY (run_id, rank, kind, name)
+);
+CREATE INDEX IF NOT EXISTS team_members_name ON team_members (kind, name);
+
+CREATE TABLE IF NOT EXISTS predicted_points (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    points REAL NOT NULL,
+    breakdown TEXT,
+    PRIMARY KEY (run_id, kind, name)
+);
+CREATE INDEX IF NOT EXISTS predicted_points_name ON predicted_points (kind, name, run_id);
+
+CREATE TABLE IF NOT EXISTS actual_points (
+    track TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    points REAL NOT NULL,
+    breakdown TEXT,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (track, kind, name)
+);
+'''
+
+
+def inputs_hash(*inputs):
+    '''
+    hash of everything a run depends on, dataframes by their csv and anything else by its repr,
+    so runs on the same inputs can be found without recomputing them
+    '''
+    hashed = hashlib.sha256()
+    for value in inputs:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            hashed.update(value.to_csv(index=False).encode())
+        else:
+            hashed.update(repr(value).encode())
+    return hashed.hexdigest()
+
+
+def _to_json(breakdown):
+    # the score summaries have numpy integers in them
+    return json.dumps(breakdown, default=lambda x: x.item() if hasattr(x, 'item') else str(x)) if breakdown is not None else None
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+class ResultStore:
+    '''
+    sqlite file that keeps the results of main() runs and the actual weekend points, so the picks and points of the season
+    can be queried later instead of living only in notebook memory. every run is saved with its track, a timestamp and a hash
+    of its inputs, its top teams and the predicted points breakdown of every driver and constructor. main(store=...) saves
+    its runs here, and save_actual records how the weekend actually went.
+
+    parameters:
+    path: str, sqlite file to keep the results in, ':memory:' for a throwaway store
+    '''
+    def __init__(self, path='results.sqlite'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def query(self, sql, parameters=()):
+        '''
+        runs any sql query against the store and returns the result as a dataframe
+        '''
+        return pd.read_sql_query(sql, self.connection, params=parameters)
+
+    def save_run(
+        self,
+        track_name,
+        top_teams,
+        driver_scores,
+        constructor_scores,
+        driver_score_summary=None,
+        constructor_score_summary=None,
+        inputs=None,
+        engine=None,
+        chip=None,
+        remaining_cost_cap=None,
+        current_team_value=None,
+        created_at=None):
+        '''
+        saves one optimizer run
+
+        parameters:
+        track_name: str, track name as it appears in the sheet_gid dict
+        top_teams: SortedList, the Teams returned by main, in ascending order of score
+        driver_scores: dict, predicted driver scores
+        constructor_scores: dict, predicted constructor scores
+        driver_score_summary: dict, breakdown of the predicted driver scores
+        constructor_score_summary: dict, breakdown of the predicted constructor scores
+        inputs: tuple, everything the run depends on, saved as its inputs_hash
+        engine: str, team search engine the run used
+        chip: str, chip the run used
+        remaining_cost_cap: float, cost cap left on top of the current team
+        current_team_value: float, value of the current team plus the remaining cost cap
+        created_at: str, iso timestamp of the run, defaults to now
+
+        returns:
+        run_id: int, id of the run in the store
+        '''
+        driver_score_summary = driver_score_summary or {}
+        constructor_score_summary = constructor_score_summary or {}
+        with self.connection:
+            run_id = self.connection.execute(
+                'INSERT INTO runs (track, created_at, inputs_hash, engine, chip, remaining_cost_cap, current_team_value) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (track_name, created_at or _now(), inputs_hash(*inputs) if inputs is not None else None, engine, chip, remaining_cost_cap, current_team_value)).lastrowid
+
+            teams, members = [], []
+            for rank, team in enumerate(reversed(top_teams), 1):
+                teams.append((run_id, rank, float(team.score), float(team.proposed_team_value), float(team.remaining_cost_cap), int(team.substitutions_needed),
+                               team.turbo_driver, ', '.join(team.driver_selection), ', '.join(team.constructor_team)))
+                members.extend((run_id, rank, 'driver', driver, 2 if driver == team.turbo_driver else 1) for driver in team.driver_selection)
+                members.extend((run_id, rank, 'constructor', constructor, 1) for constructor in team.constructor_team)
+            self.connection.executemany('INSERT INTO teams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', teams)
+            self.connection.executemany('INSERT INTO team_members VALUES (?, ?, ?, ?, ?)', members)
+
+            self.connection.executemany('INSERT INTO predicted_points VALUES (?, ?, ?, ?, ?)', [
+                (run_id, kind, name, float(points), _to_json(summary.get(name)))
+                for kind, scores, summary in [('driver', driver_scores, driver_score_summary), ('constructor', constructor_scores, constructor_score_summary)]
+                for name, points in scores.items()])
+        return run_id
+
+    def save_actual(self, track_name, driver_scores, constructor_scores, driver_score_summary=None, constructor_score_summary=None):
+        '''
+        records the actual points of a weekend, e.g. from score_race_full, replacing any recorded before for the track
+        '''
+        driver_score_summary = driver_score_summary or {}
+        constructor_score_summary = constructor_score_summary or {}
+        recorded_at = _now()
+        with self.connection:
+            self.connection.execute('DELETE FROM actual_points WHERE track = ?', (track_name,))
+            self.connection.executemany('INSERT INTO actual_points VALUES (?, ?, ?, ?, ?, ?)', [
+                (track_name, kind, name, float(points), _to_json(summary.get(name)), recorded_at)
+                for kind, scores, summary in [('driver', driver_scores, driver_score_summary), ('constructor', constructor_scores, constructor_score_summary)]
+                for name, points in scores.items()])
+
+    def runs(self, track_name=None):
+        '''
+        the saved runs, oldest first, optionally only those of one track
+        '''
+        return self.query(
+            'SELECT * FROM runs WHERE ? IS NULL OR track = ? ORDER BY created_at, id',
+            (track_name, track_name))
+
+    def find_run(self, inputs):
+        '''
+        id of the latest run saved with these inputs (the same tuple passed to save_run), None if there isn't one
+        '''
+        row = self.connection.execute('SELECT MAX(id) FROM runs WHERE inputs_hash = ?', (inputs_hash(*inputs),)).fetchone()
+        return row[0]
+
+    def top_teams(self, run_id):
+        '''
+        the top teams of a run, best first
+        '''
+        # an id read back from runs() is a numpy integer, which sqlite would match as a blob
+        return self.query('SELECT * FROM teams WHERE run_id = ? ORDER BY rank', (int(run_id),))
+
+    def best_teams(self):
+        '''
+        the best team of the latest run of every track, in the order the tracks were first run
+        '''
+        return self.query('''
+            SELECT runs.track, runs.created_at, runs.chip, teams.*
+            FROM runs
+            JOIN (SELECT MAX(id) AS run_id FROM runs GROUP BY track) latest ON latest.run_id = runs.id
+            JOIN teams ON teams.run_id = runs.id AND teams.rank = 1
+            ORDER BY (SELECT MIN(id) FROM runs AS first_runs WHERE first_runs.track = runs.track)''')
+
+    def points_history(self, name, kind='driver', track_name=None):
+        '''
+        how the predicted points of a driver (or constructor, with kind='constructor') moved from run to run
+
+        returns:
+        history: dataframe of the track, run and timestamp, and the predicted points of every run, oldest first
+        '''
+        return self.query('''
+            SELECT runs.track, runs.id AS run_id, runs.created_at, predicted_points.points, predicted_points.breakdown
+            FROM predicted_points
+            JOIN runs ON runs.id = predicted_points.run_id
+            WHERE predicted_points.kind = ? AND predicted_points.name = ? AND (? IS NULL OR runs.track = ?)
+            ORDER BY runs.created_at, runs.id''', (kind, name, track_name, track_name))
+
+    def predicted_vs_actual(self):
+        '''
+        the predicted points of the best team of each track's latest run next to the points it actually scored,
+        the turbo driver counting twice. actual_points is empty for tracks without actual points recorded.
+        '''
+        return self.query('''
+            SELECT runs.track, runs.created_at, teams.score AS predicted_points,
+                CASE WHEN COUNT(actual_points.points) = 0 THEN NULL ELSE SUM(team_members.multiplier * COALESCE(actual_points.points, 0)) END AS actual_points,
+                teams.drivers, teams.turbo_driver, teams.constructors
+            FROM runs
+            JOIN (SELECT MAX(id) AS run_id FROM runs GROUP BY track) latest ON latest.run_id = runs.id
+            JOIN teams ON teams.run_id = runs.id AND teams.rank = 1
+            JOIN team_members ON team_members.run_id = teams.run_id AND team_members.rank = teams.rank
+            LEFT JOIN actual_points ON actual_points.track = runs.track AND actual_points.kind = team_members.kind AND actual_points.name = team_members.name
+            GROUP BY runs.id
+            ORDER BY (SELECT MIN(id) FROM runs AS first_runs WHERE first_runs.track = runs.track)''')
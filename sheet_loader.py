@@ -0,0 +1,320 @@
+import concurrent.futures
+import hashlib
+import http.client
+import io
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.parse
+import pandas as pd
+from weekend_functions import sheet_gid, drop_empties, validate_weekends
+
+# the google sheet with all the weekend tabs and the pricing tabs, gid picks the tab
+sheet_url = 'https://docs.google.com/spreadsheets/d/14kBO9LAo4-uPrQlH6xm_Fm2OcNB15xUdnzUbIaRFjOU/export?format=csv&gid={gid}'
+
+# gids of the pricing tabs, the weekend tabs are in sheet_gid in weekend_functions.py
+driver_pricing_gid = '920234107'
+constructor_pricing_gid = '1972297135'
+
+
+class SheetCache:
+    '''
+    on disk cache for the csv exports of the google sheet tabs, so a notebook doesn't pay the network round trip on every cell run
+    and can keep working offline.
+
+    for every gid the raw csv, the parsed dataframe (pickled, which loads much faster than re-parsing the csv) and some metadata
+    (when it was fetched, its ETag/Last-Modified headers and a hash of the csv) are kept in cache_dir. within ttl seconds of the
+    last fetch the pickled dataframe is returned straight away. after that the sheet is re-requested with If-None-Match/If-Modified-Since,
+    and the csv is only parsed again if it actually changed. if the request fails the cached copy is used.
+
+    requests go over a kept alive connection per thread and host, so after the first sheet a thread loads (e.g. in load_sheets)
+    the next ones skip the TCP and TLS handshakes.
+
+    parameters:
+    cache_dir: str, directory to keep the cached sheets in
+    ttl: float, seconds a cached sheet is used without checking for changes
+    offline: bool, if True only the cache is used and nothing is requested
+    url: str, format string of the csv export url with a {gid} field, e.g. pointing at a local stand-in server for testing
+    timeout: float, seconds to wait for the sheet to download
+    '''
+    def __init__(self, cache_dir='sheet_cache', ttl=300, offline=False, url=sheet_url, timeout=30):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.offline = offline
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _path(self, gid, extension):
+        return os.path.join(self.cache_dir, f'{gid}.{extension}')
+
+    def _read_metadata(self, gid):
+        try:
+            with open(self._path(gid, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_metadata(self, gid, metadata):
+        with open(self._path(gid, 'json'), 'w') as f:
+            json.dump(metadata, f)
+
+    def _read_frame(self, gid):
+        '''
+        the cached dataframe for gid, parsed from the cached csv if the pickle is missing. None if nothing is cached.
+        '''
+        try:
+            return pd.read_pickle(self._path(gid, 'pkl'))
+        except (OSError, ValueError, EOFError):
+            pass
+
+        if os.path.exists(self._path(gid, 'csv')):
+            df = pd.read_csv(self._path(gid, 'csv'))
+            df.to_pickle(self._path(gid, 'pkl'))
+            return df
+        return None
+
+    def _connection(self, scheme, host):
+        '''
+        this thread's open connection to host, made the first time the thread requests something from it
+        '''
+        connections = self._local.__dict__.setdefault('connections', {})
+        if (scheme, host) not in connections:
+            connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            connections[(scheme, host)] = connection_class(host, timeout=self.timeout)
+        return connections[(scheme, host)]
+
+    def _get(self, url, headers):
+        '''
+        one GET over this thread's connection to the url's host. if a kept alive connection fails (e.g. the server has since
+        closed it), it's reopened and the request sent again once.
+
+        returns:
+        response: http.client.HTTPResponse, already read
+        content: bytes, the body of the response
+        '''
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        while True:
+            connection = self._connection(parts.scheme, parts.netloc)
+            reused = connection.sock is not None
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                return response, response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                del self._local.connections[(parts.scheme, parts.netloc)]
+                if not reused:
+                    raise
+
+    def request(self, gid, metadata=None):
+        '''
+        requests the csv export for gid, conditionally if there's metadata from an earlier fetch
+
+        returns:
+        status: int, 200 if the csv came back, 304 if it hasn't changed since the earlier fetch
+        content: bytes, the csv, None for a 304
+        headers: dict, the ETag and Last-Modified headers of the response
+        '''
+        headers = {}
+        if metadata and metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata and metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+        # the csv export redirects to where the csv is actually served from
+        url = self.url.format(gid=gid)
+        for _ in range(5):
+            response, content = self._get(url, headers)
+            if response.status not in (301, 302, 303, 307, 308):
+                break
+            url = urllib.parse.urljoin(url, response.getheader('Location'))
+
+        response_headers = {'etag': response.getheader('ETag'), 'last_modified': response.getheader('Last-Modified')}
+        if response.status == 304:
+            return 304, None, response_headers
+        if response.status != 200:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.msg, None)
+        return 200, content, response_headers
+
+    def store(self, gid, content, headers, metadata=None):
+        '''
+        caches a freshly downloaded csv for gid, only parsing it again if it differs from the cached one
+
+        returns:
+        df: dataframe of the sheet
+        '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        content_hash = hashlib.sha256(content).hexdigest()
+
+        df = None
+        if metadata and metadata.get('hash') == content_hash:
+            df = self._read_frame(gid)
+        if df is None:
+            with open(self._path(gid, 'csv'), 'wb') as f:
+                f.write(content)
+            df = pd.read_csv(io.BytesIO(content))
+            df.to_pickle(self._path(gid, 'pkl'))
+
+        self._write_metadata(gid, {
+            'fetched_at': time.time(),
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last_modified'),
+            'hash': content_hash,
+        })
+        return df
+
+    def load(self, gid):
+        '''
+        loads the sheet tab with the given gid, from the cache when possible
+
+        parameters:
+        gid: str, gid of the sheet tab, e.g. sheet_gid[track_name]
+
+        returns:
+        df: dataframe of the sheet tab
+        '''
+        gid = str(gid)
+        metadata = self._read_metadata(gid)
+
+        if self.offline:
+            df = self._read_frame(gid)
+            if df is None:
+                raise FileNotFoundError(f'Sheet gid {gid} is not in the cache at {self.cache_dir}, it has to be loaded online once first.')
+            return df
+
+        if metadata and time.time() - metadata.get('fetched_at', 0) < self.ttl:
+            df = self._read_frame(gid)
+            if df is not None:
+                return df
+
+        try:
+            status, content, headers = self.request(gid, metadata)
+        except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+            df = self._read_frame(gid)
+            if df is None:
+                raise
+            print(f'Could not download sheet gid {gid} ({e}), using the cached copy.')
+            return df
+
+        if status == 304:
+            df = self._read_frame(gid)
+            if df is not None:
+                metadata['fetched_at'] = time.time()
+                self._write_metadata(gid, metadata)
+                return df
+            # the cache files went missing, so fetch the sheet unconditionally
+            status, content, headers = self.request(gid)
+
+        return self.store(gid, content, headers, metadata)
+
+
+# the cache used by the module level load functions
+default_cache = SheetCache()
+
+
+def load_weekend(track_name, cache=None, print_report=True):
+    '''
+    loads the weekend sheet tab for a track. it's checked with validate_weekends against the pricing tabs as it's loaded,
+    the same way load_season checks a whole season
+
+    parameters:
+    track_name: str, track name as it appears in the sheet_gid dict
+    cache: SheetCache, defaults to default_cache
+    print_report: bool, if True any problems validate_weekends finds are printed
+
+    returns:
+    weekend_df: dataframe of the weekend's fp results, qualifying and race predictions and results
+    '''
+    cache = cache or default_cache
+    weekend_df = cache.load(sheet_gid[track_name])
+    if print_report:
+        driver_pricing, constructor_pricing = load_pricing(cache)
+        print_validation_report(validate_weekends({track_name: drop_empties(weekend_df)}, driver_pricing, constructor_pricing))
+    return weekend_df
+
+
+def print_validation_report(report):
+    '''
+    prints the problems validate_weekends found, grouped by track
+
+    parameters:
+    report: dataframe, as returned by validate_weekends
+    '''
+    for track_name, problems in report.groupby('track', sort=False):
+        print(f'=== {track_name} ===')
+        for problem in problems.itertuples():
+            print(f'Column "{problem.column}" {problem.detail}')
+        print()
+
+
+def load_pricing(cache=None):
+    '''
+    loads the driver and constructor pricing sheet tabs, with the empty columns dropped
+
+    parameters:
+    cache: SheetCache, defaults to default_cache
+
+    returns:
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    '''
+    cache = cache or default_cache
+    driver_pricing = cache.load(driver_pricing_gid).dropna(axis=1, how='all')
+    constructor_pricing = cache.load(constructor_pricing_gid).dropna(axis=1, how='all')
+    return driver_pricing, constructor_pricing
+
+
+def load_sheets(gids, cache=None, workers=None):
+    '''
+    loads several sheet tabs at once, each on its own thread, so the download and parse of one sheet overlaps with the others
+    and the whole load takes about as long as the slowest sheet rather than the sum of them all. each worker thread keeps its
+    connection to the sheet open between the sheets it loads.
+
+    parameters:
+    gids: list, gids of the sheet tabs
+    cache: SheetCache, defaults to default_cache
+    workers: int, number of sheets downloaded at the same time, defaults to all of them
+
+    returns:
+    dfs: dict, gid to the dataframe of its sheet tab
+    '''
+    cache = cache or default_cache
+    gids = list(dict.fromkeys(str(gid) for gid in gids))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers or len(gids))) as pool:
+        futures = {gid: pool.submit(cache.load, gid) for gid in gids}
+        return {gid: future.result() for gid, future in futures.items()}
+
+
+def load_season(track_names=None, cache=None, workers=None, print_report=True):
+    '''
+    loads the weekend sheet tabs of a whole season and both pricing tabs concurrently with load_sheets.
+    the empty columns are dropped from every sheet, and the whole season is checked with validate_weekends as it's loaded.
+
+    parameters:
+    track_names: list, tracks as they appear in the sheet_gid dict, defaults to all of them
+    cache: SheetCache, defaults to default_cache
+    workers: int, number of sheets downloaded at the same time, defaults to all of them
+    print_report: bool, if True any problems validate_weekends finds are printed
+
+    returns:
+    weekend_dfs: dict, track name to its weekend dataframe
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    report: dataframe, the problems found by validate_weekends, empty if there are none
+    '''
+    track_names = list(track_names or sheet_gid)
+    dfs = load_sheets([sheet_gid[t] for t in track_names] + [driver_pricing_gid, constructor_pricing_gid], cache, workers)
+
+    weekend_dfs = {t: drop_empties(dfs[str(sheet_gid[t])]) for t in track_names}
+    driver_pricing = dfs[driver_pricing_gid].dropna(axis=1, how='all')
+    constructor_pricing = dfs[constructor_pricing_gid].dropna(axis=1, how='all')
+
+    report = validate_weekends(weekend_dfs, driver_pricing, constructor_pricing)
+    if print_report:
+        print_validation_report(report)
+
+    return weekend_dfs, driver_pricing, constructor_pricing, report
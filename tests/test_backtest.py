@@ -0,0 +1,34 @@
+import pandas as pd
+import pytest
+from weekend_functions import default_rules
+from backtest import actual_race_inputs, score_actual_weekend
+
+
+def dnf_weekend(dnf):
+    # the first driver retires from the race after qualifying on pole
+    return pd.DataFrame({
+        'Team': ['Team A', 'Team A', 'Team B', 'Team B'],
+        'Driver': ['Driver 1', 'Driver 2', 'Driver 3', 'Driver 4'],
+        'actual_qualifying_bahrain': [1, 2, 3, 4],
+        'actual_race_bahrain': [dnf, 1, 2, 3],
+    })
+
+
+@pytest.mark.parametrize('dnf', [200, 'DNF'])
+def test_dnf_has_no_gain_loss(dnf):
+    actual_df, driver_gain_loss_overtake = actual_race_inputs(dnf_weekend(dnf), 'bahrain')
+
+    assert actual_df.race.tolist() == [200, 1, 2, 3]
+    assert driver_gain_loss_overtake['Driver 1'] == {'gain_loss': 0, 'overtake': 0}
+    assert driver_gain_loss_overtake['Driver 2'] == {'gain_loss': 1, 'overtake': 1}
+
+
+@pytest.mark.parametrize('dnf', [200, 'DNF'])
+def test_dnf_scores_dnf_points(dnf):
+    driver_scores, constructor_scores = score_actual_weekend(dnf_weekend(dnf), 'bahrain')
+
+    race_points, quali_points = default_rules.race_position_to_points, default_rules.quali_position_to_points
+    assert driver_scores['Driver 1'] == race_points[200] + quali_points[1]
+    # Driver 2 wins from second, so also gets the fastest lap
+    assert driver_scores['Driver 2'] == race_points[1] + quali_points[2] + 1 + 1 + default_rules.superlative_points['fastest_lap']
+    assert constructor_scores['Team A'] == driver_scores['Driver 1'] + driver_scores['Driver 2'] + default_rules.constructor_bonus(2, 0)
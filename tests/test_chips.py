@@ -0,0 +1,113 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from weekend_functions import chip_rules, chip_search_settings, enumerate_teams_vectorized, main, recommend_chip
+
+
+def synthetic_grid(team_count, cost_cap, seed):
+    # distinct driver scores, so there's only ever one turbo driver, and plenty of them below zero
+    rng = np.random.default_rng(seed)
+    drivers = [f'Driver {i}' for i in range(2 * team_count)]
+    constructors = [f'Team {i}' for i in range(team_count)]
+    driver_scores = {d: int(x) for d, x in zip(drivers, rng.choice(np.arange(-20, 60), len(drivers), replace=False))}
+    constructor_scores = {c: int(x) for c, x in zip(constructors, rng.integers(-20, 90, len(constructors)))}
+    driver_values = {d: float(np.round(x, 1)) for d, x in zip(drivers, rng.uniform(4, 30, len(drivers)))}
+    constructor_values = {c: float(np.round(x, 1)) for c, x in zip(constructors, rng.uniform(4, 30, len(constructors)))}
+    current_team_drivers = drivers[:5]
+    current_team_constructors = constructors[:2]
+    current_team_value = sum(driver_values[d] for d in current_team_drivers) + sum(constructor_values[c] for c in current_team_constructors) + cost_cap
+    return (drivers, constructors, driver_scores, constructor_scores, driver_values, constructor_values,
+            current_team_drivers, current_team_constructors, current_team_value)
+
+
+def best_score_by_hand(grid, chip, race_points=None):
+    # scores every team one at a time the way the chip is described in the game's rules
+    drivers, constructors, driver_scores, constructor_scores, driver_values, constructor_values, current_team_drivers, current_team_constructors, current_team_value = grid
+    chip_rule = chip_rules[chip] if chip else {}
+    if chip_rule.get('no_negative'):
+        driver_scores = {d: max(score, 0) for d, score in driver_scores.items()}
+        constructor_scores = {c: max(score, 0) for c, score in constructor_scores.items()}
+    cost_cap = float('inf') if chip_rule.get('no_cost_cap') else current_team_value
+    multipliers = chip_rule.get('turbo_multipliers', (2,))
+
+    best = None
+    for driver_team in itertools.combinations(drivers, 5):
+        for constructor_team in itertools.combinations(constructors, 2):
+            price = sum(driver_values[d] for d in driver_team) + sum(constructor_values[c] for c in constructor_team)
+            if price > cost_cap:
+                continue
+            ranked = sorted(driver_team, key=lambda d: driver_scores[d], reverse=True)
+            score = sum(driver_scores[d] * (multipliers[i] if i < len(multipliers) else 1) for i, d in enumerate(ranked))
+            score += sum(constructor_scores[c] for c in constructor_team)
+            substitutions = len(set(driver_team) - set(current_team_drivers)) + len(set(constructor_team) - set(current_team_constructors))
+            if not chip_rule.get('use_wildcard'):
+                score -= 10 * max(substitutions - 2, 0)
+
+            # Final Fix: swap one driver for the race, the turbo goes with the seat
+            if race_points is not None:
+                swaps = [0]
+                for out in driver_team:
+                    for swap_in in set(drivers) - set(driver_team):
+                        if price - driver_values[out] + driver_values[swap_in] <= cost_cap:
+                            multiplier = multipliers[0] if out == ranked[0] else 1
+                            swaps.append(multiplier * (race_points[swap_in] - race_points[out]))
+                score += max(swaps)
+
+            best = score if best is None else max(best, score)
+    return best
+
+
+@pytest.mark.parametrize('chip', [None, 'wildcard', 'limitless', 'extra_drs', 'no_negative', 'autopilot'])
+@pytest.mark.parametrize('seed', [1, 2])
+def test_chip_search_matches_scoring_by_hand(chip, seed):
+    # with no cost cap to spare, every chip but autopilot changes the best score on one of these grids
+    grid = synthetic_grid(5, 0.0, seed)
+    drivers, constructors, driver_scores, constructor_scores, driver_values, constructor_values, current_team_drivers, current_team_constructors, current_team_value = grid
+    settings = chip_search_settings(chip, driver_scores, constructor_scores, {}, current_team_value)
+
+    top_teams, _ = enumerate_teams_vectorized(
+        drivers, constructors, settings['driver_scores'], settings['constructor_scores'], driver_values, constructor_values,
+        current_team_drivers, current_team_constructors, settings['search_team_value'], settings['use_wildcard'], 5,
+        settings['turbo_multipliers'])
+
+    assert top_teams[-1].score == best_score_by_hand(grid, chip)
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_final_fix_matches_scoring_by_hand(seed):
+    grid = synthetic_grid(5, 2.0, seed)
+    drivers = grid[0]
+    race_points = {d: int(x) for d, x in zip(drivers, np.random.default_rng(seed + 10).integers(-20, 40, len(drivers)))}
+
+    top_teams, _ = enumerate_teams_vectorized(*grid, top_k=5, final_fix_race_points=race_points)
+
+    assert top_teams[-1].score == best_score_by_hand(grid, 'final_fix', race_points)
+
+
+def synthetic_weekend(team_count, track, seed):
+    rng = np.random.default_rng(seed)
+    teams = [f'Team {i}' for i in range(team_count)]
+    weekend_df = pd.DataFrame({'Team': np.repeat(teams, 2), 'Driver': [f'Driver {i}' for i in range(2 * team_count)]})
+    for session in ['qualifying', 'race', 'sprint_qualifying', 'sprint_race']:
+        weekend_df[f'predicted_{session}_{track}'] = rng.permutation(len(weekend_df)) + 1
+    driver_pricing = pd.DataFrame({'Driver': weekend_df.Driver, track: np.round(rng.uniform(4, 30, len(weekend_df)), 1)})
+    constructor_pricing = pd.DataFrame({'Constructor': teams, track: np.round(rng.uniform(4, 30, team_count), 1)})
+    return weekend_df, driver_pricing, constructor_pricing
+
+
+def test_recommend_chip_matches_main(capsys):
+    weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(5, 'testtrack', 0)
+    current_team_drivers = weekend_df.Driver[:5].tolist()
+    current_team_constructors = ['Team 3', 'Team 4']
+    best_chip, chip_teams = recommend_chip(current_team_drivers, current_team_constructors, weekend_df, 'testtrack', driver_pricing, constructor_pricing, 1.0)
+
+    for chip in [None] + list(chip_rules):
+        engine = 'vectorized' if chip == 'final_fix' else 'brute_force'
+        top_teams = main(current_team_drivers, current_team_constructors, weekend_df, 'testtrack', driver_pricing, constructor_pricing, 1.0,
+                         engine=engine, top_k=1, chip=chip)
+        assert chip_teams[chip][-1].score == top_teams[-1].score
+        assert chip_teams[chip][-1].remaining_cost_cap == pytest.approx(top_teams[-1].remaining_cost_cap)
+
+    gains = {chip: chip_teams[chip][-1].score - chip_teams[None][-1].score for chip in chip_rules}
+    assert gains[best_chip] == max(gains.values()) > 0
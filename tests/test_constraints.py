@@ -0,0 +1,47 @@
+import pytest
+from weekend_functions import TeamConstraints, enumerate_teams_brute_force, enumerate_teams_vectorized
+from test_engines import synthetic_grid, team_keys
+
+
+driver_to_constructor = {f'Driver {i}': f'Team {i // 2}' for i in range(12)}
+constraint_cases = {
+    'locked_and_banned': dict(locked_drivers=['Driver 7'], banned_drivers=['Driver 0'], locked_constructors=['Team 5'], banned_constructors=['Team 1']),
+    'max_substitutions': dict(max_substitutions=2),
+    'min_remaining_cost_cap': dict(min_remaining_cost_cap=3.0),
+    'one_driver_per_team': dict(one_driver_per_team=True, driver_to_constructor=driver_to_constructor),
+    'all_of_them': dict(locked_drivers=['Driver 8'], banned_constructors=['Team 0'], max_substitutions=3, min_remaining_cost_cap=1.0,
+                        one_driver_per_team=True, driver_to_constructor=driver_to_constructor),
+}
+
+
+def meets(team, current_team_value, locked_drivers=(), banned_drivers=(), locked_constructors=(), banned_constructors=(),
+          max_substitutions=None, min_remaining_cost_cap=0.0, one_driver_per_team=False, driver_to_constructor=None):
+    # the constraints checked one team at a time
+    return (set(locked_drivers) <= set(team.driver_selection) and not set(banned_drivers) & set(team.driver_selection)
+            and set(locked_constructors) <= set(team.constructor_team) and not set(banned_constructors) & set(team.constructor_team)
+            and (max_substitutions is None or team.substitutions_needed <= max_substitutions)
+            and current_team_value - team.proposed_team_value >= min_remaining_cost_cap
+            and (not one_driver_per_team or len({driver_to_constructor[d] for d in team.driver_selection}) == 5))
+
+
+@pytest.mark.parametrize('case', list(constraint_cases))
+@pytest.mark.parametrize('use_wildcard', [False, True])
+def test_constraints_match_filtering_every_team(case, use_wildcard):
+    grid = synthetic_grid(6, 5.0, 0)
+    current_team_value = grid[-1]
+    every_team, _ = enumerate_teams_brute_force(*grid, use_wildcard=use_wildcard, top_k=10 ** 6)
+    expected = [team for team in every_team if meets(team, current_team_value, **constraint_cases[case])][-20:]
+
+    top_teams, _ = enumerate_teams_vectorized(*grid, use_wildcard=use_wildcard, top_k=20, constraints=TeamConstraints(**constraint_cases[case]))
+
+    assert len(expected) == 20
+    assert team_keys(top_teams) == team_keys(expected)
+
+
+def test_conflicting_constraints_are_refused():
+    with pytest.raises(ValueError):
+        TeamConstraints(locked_drivers=['Driver 1'], banned_drivers=['Driver 1'])
+    with pytest.raises(ValueError):
+        TeamConstraints(locked_constructors=['Team 0', 'Team 1', 'Team 2'])
+    with pytest.raises(ValueError):
+        TeamConstraints(one_driver_per_team=True)
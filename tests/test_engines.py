@@ -0,0 +1,70 @@
+import itertools
+import numpy as np
+import pytest
+from weekend_functions import enumerate_teams_brute_force, team_search_engines
+
+
+def synthetic_grid(team_count, cost_cap, seed):
+    # a seeded grid of team_count constructors with two drivers each, my current team is the first 5 drivers and 2 constructors
+    rng = np.random.default_rng(seed)
+    drivers = [f'Driver {i}' for i in range(2 * team_count)]
+    constructors = [f'Team {i}' for i in range(team_count)]
+    driver_scores = {d: int(x) for d, x in zip(drivers, rng.integers(-10, 60, len(drivers)))}
+    constructor_scores = {c: int(x) for c, x in zip(constructors, rng.integers(-10, 90, len(constructors)))}
+    driver_values = {d: float(np.round(x, 1)) for d, x in zip(drivers, rng.uniform(4, 30, len(drivers)))}
+    constructor_values = {c: float(np.round(x, 1)) for c, x in zip(constructors, rng.uniform(4, 30, len(constructors)))}
+    current_team_drivers = drivers[:5]
+    current_team_constructors = constructors[:2]
+    current_team_value = sum(driver_values[d] for d in current_team_drivers) + sum(constructor_values[c] for c in current_team_constructors) + cost_cap
+    return (drivers, constructors, driver_scores, constructor_scores, driver_values, constructor_values,
+            current_team_drivers, current_team_constructors, current_team_value)
+
+
+def team_keys(top_teams):
+    return [(t.score, tuple(t.constructor_team), tuple(t.driver_selection), t.turbo_driver, t.substitutions_needed,
+             t.proposed_team_value, t.remaining_cost_cap) for t in top_teams]
+
+
+@pytest.mark.parametrize('engine', [e for e in team_search_engines if e != 'brute_force'])
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('cost_cap', [0.0, 5.0, 1000.0])
+@pytest.mark.parametrize('use_wildcard', [False, True])
+def test_engine_matches_brute_force(engine, seed, cost_cap, use_wildcard):
+    grid = synthetic_grid(6, cost_cap, seed)
+    expected, expected_counts = enumerate_teams_brute_force(*grid, use_wildcard=use_wildcard, top_k=20)
+    top_teams, search_counts = team_search_engines[engine](*grid, use_wildcard=use_wildcard, top_k=20)
+
+    assert team_keys(top_teams) == team_keys(expected)
+    assert search_counts['possible_team_count'] == expected_counts['possible_team_count']
+    if 'team_count' in search_counts:
+        # branch and bound skips whole subtrees, so it can't count the affordable teams
+        assert search_counts['team_count'] == expected_counts['team_count']
+
+
+@pytest.mark.parametrize('engine', list(team_search_engines))
+@pytest.mark.parametrize('turbo_multipliers', [(2,), (3,), (3, 2)])
+def test_engine_turbo_multipliers(engine, turbo_multipliers):
+    grid = synthetic_grid(5, 1000.0, 2)
+    expected, _ = enumerate_teams_brute_force(*grid, top_k=10, turbo_multipliers=turbo_multipliers)
+    top_teams, _ = team_search_engines[engine](*grid, top_k=10, turbo_multipliers=turbo_multipliers)
+
+    assert team_keys(top_teams) == team_keys(expected)
+
+
+@pytest.mark.parametrize('engine', list(team_search_engines))
+@pytest.mark.parametrize('use_wildcard', [False, True])
+def test_substitution_penalty(engine, use_wildcard):
+    # every affordable team is kept, so each one can be checked against scoring it by hand
+    grid = synthetic_grid(5, 1000.0, 3)
+    drivers, constructors, driver_scores, constructor_scores, _, _, current_team_drivers, current_team_constructors, _ = grid
+    team_count = len(list(itertools.combinations(drivers, 5))) * len(list(itertools.combinations(constructors, 2)))
+    top_teams, _ = team_search_engines[engine](*grid, use_wildcard=use_wildcard, top_k=team_count)
+
+    assert len(top_teams) == team_count
+    for team in top_teams:
+        substitutions = len(set(team.driver_selection) - set(current_team_drivers)) + len(set(team.constructor_team) - set(current_team_constructors))
+        raw_score = (sum(driver_scores[d] for d in team.driver_selection) + max(driver_scores[d] for d in team.driver_selection)
+                     + sum(constructor_scores[c] for c in team.constructor_team))
+        penalty = 0 if use_wildcard else 10 * max(substitutions - 2, 0)
+        assert team.substitutions_needed == substitutions
+        assert team.score == raw_score - penalty
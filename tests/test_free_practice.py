@@ -0,0 +1,41 @@
+import pandas as pd
+from weekend_functions import driver_eval_fp, team_eval_fp
+
+
+def fp_weekend(track_name, fp1, fp2, fp3):
+    return pd.DataFrame({
+        'Team': ['Team A', 'Team A', 'Team B', 'Team B'],
+        'Driver': ['Driver 1', 'Driver 2', 'Driver 3', 'Driver 4'],
+        f'fp1_{track_name}': fp1,
+        f'fp2_{track_name}': fp2,
+        f'fp3_{track_name}': fp3,
+        f'predicted_race_{track_name}': [1, 2, 3, 4],
+    })
+
+
+# Driver 4 doesn't set a time in fp2 at monaco
+weekend_dfs = {
+    'bahrain': fp_weekend('bahrain', [4, 3, 2, 1], [3, 4, 1, 2], [1, 2, 3, 4]),
+    'monaco': fp_weekend('monaco', [1, 2, 3, 4], [1, 2, 3, 400], [2, 1, 4, 3]),
+}
+
+
+def test_driver_eval_fp():
+    driver_eval = driver_eval_fp(weekend_dfs)
+
+    assert driver_eval.loc[('bahrain', 'Driver 1')].tolist() == [4, 3, 1, 8, 8 / 3, 1, 2, 3]
+    # the 400 is left out of the total and the average, and there's no change into or out of a session without a time
+    monaco = driver_eval.loc[('monaco', 'Driver 4')]
+    assert monaco['Total Finish'] == 7
+    assert monaco['Average Finish'] == 3.5
+    assert pd.isna(monaco['FP2 Results']) and pd.isna(monaco['FP1-FP2 Change']) and monaco['FP1-FP3 Change'] == 1
+
+
+def test_team_eval_fp():
+    team_eval = team_eval_fp(weekend_dfs)
+
+    # Team B is ahead in bahrain fp2, on the average finish
+    assert team_eval.loc[('bahrain', 'fp2')].index.tolist() == ['Team B', 'Team A']
+    assert team_eval.loc[('bahrain', 'fp2', 'Team B')].tolist() == [1.5, 3, 1]
+    # only Driver 3 counts for Team B in monaco fp2
+    assert team_eval.loc[('monaco', 'fp2', 'Team B')].tolist() == [3.0, 3, 0]
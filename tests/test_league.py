@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from weekend_functions import score_rosters
+
+
+drivers = [f'Driver {i}' for i in range(12)]
+constructors = [f'Team {i}' for i in range(6)]
+chips = [None, 'wildcard', 'limitless', 'extra_drs', 'no_negative', 'autopilot', 'final_fix']
+
+
+def random_league(seed, n_rosters):
+    rng = np.random.default_rng(seed)
+    rosters = []
+    for _ in range(n_rosters):
+        roster_drivers = list(rng.choice(drivers, 5, replace=False))
+        turbo_driver, extra_drs_driver = rng.choice(roster_drivers, 2, replace=False)
+        rosters.append({
+            'drivers': roster_drivers,
+            'constructors': list(rng.choice(constructors, 2, replace=False)),
+            'turbo_driver': turbo_driver,
+            'chip': chips[rng.integers(len(chips))],
+            'extra_drs_driver': extra_drs_driver,
+            'substitutions': int(rng.integers(0, 6)),
+        })
+    return pd.DataFrame(rosters, index=[f'Member {i}' for i in range(n_rosters)])
+
+
+def score_by_hand(roster, driver_scores, constructor_scores, previous=None):
+    # one roster at a time, the way the game scores it
+    driver_points = {d: driver_scores.get(d, 0) for d in roster.drivers}
+    constructor_points = {c: constructor_scores.get(c, 0) for c in roster.constructors}
+    if roster.chip == 'no_negative':
+        driver_points = {d: max(p, 0) for d, p in driver_points.items()}
+        constructor_points = {c: max(p, 0) for c, p in constructor_points.items()}
+
+    turbo_driver = roster.turbo_driver
+    if roster.chip == 'autopilot':
+        # the later driver wins a tie for the highest score
+        turbo_driver = max(reversed(roster.drivers), key=driver_points.get)
+    points = sum(driver_points.values()) + driver_points[turbo_driver] + sum(constructor_points.values())
+    if roster.chip == 'extra_drs':
+        points += 2 * driver_points[roster.extra_drs_driver]
+
+    substitutions = roster.substitutions
+    if previous is not None:
+        substitutions = len(set(roster.drivers) - set(previous.drivers)) + len(set(roster.constructors) - set(previous.constructors))
+    if roster.chip not in ('wildcard', 'limitless'):
+        points -= 10 * max(substitutions - 2, 0)
+    return points
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_league_matches_scoring_each_roster(seed):
+    rng = np.random.default_rng(seed + 100)
+    # Driver 11 and Team 5 didn't score at all, e.g. they didn't race
+    driver_scores = {d: int(x) for d, x in zip(drivers[:11], rng.integers(-15, 40, 11))}
+    constructor_scores = {c: int(x) for c, x in zip(constructors[:5], rng.integers(-15, 60, 5))}
+    rosters = random_league(seed, 300)
+    # last weekend's rosters for half of the league
+    previous_rosters = random_league(seed + 10, 150)
+
+    standings, breakdown = score_rosters(rosters, driver_scores, constructor_scores, previous_rosters)
+
+    expected = [score_by_hand(roster, driver_scores, constructor_scores, previous_rosters.loc[member] if member in previous_rosters.index else None)
+                for member, roster in rosters.iterrows()]
+    assert breakdown.points.tolist() == expected
+    assert standings.points.tolist() == sorted(expected, reverse=True)
+    assert standings['rank'].iloc[0] == 1
@@ -0,0 +1,43 @@
+import itertools
+import numpy as np
+import pytest
+from weekend_functions import pareto_frontier
+from test_engines import synthetic_grid
+
+
+def frontier_by_hand(grid, use_wildcard):
+    # every affordable team against every other one, in the brute force order
+    drivers, constructors, driver_scores, constructor_scores, driver_values, constructor_values, current_team_drivers, current_team_constructors, current_team_value = grid
+    teams = []
+    for driver_team in itertools.combinations(drivers, 5):
+        for constructor_team in itertools.combinations(constructors, 2):
+            price = sum(driver_values[d] for d in driver_team) + sum(constructor_values[c] for c in constructor_team)
+            if price > current_team_value:
+                continue
+            substitutions = len(set(driver_team) - set(current_team_drivers)) + len(set(constructor_team) - set(current_team_constructors))
+            score = sum(driver_scores[d] for d in driver_team) + max(driver_scores[d] for d in driver_team) + sum(constructor_scores[c] for c in constructor_team)
+            if not use_wildcard:
+                score -= 10 * max(substitutions - 2, 0)
+            teams.append((score, round(price, 6), substitutions, driver_team, constructor_team))
+
+    scores, prices, subs = (np.array([team[i] for team in teams]) for i in range(3))
+    order = np.arange(len(teams))
+    frontier = []
+    for i, team in enumerate(teams):
+        as_good = (scores >= scores[i]) & (prices <= prices[i]) & (subs <= subs[i])
+        better = (scores > scores[i]) | (prices < prices[i]) | (subs < subs[i]) | (order > i)
+        if not (as_good & better).any():
+            frontier.append(team)
+    return sorted(frontier, key=lambda team: (team[1], -team[0]))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('cost_cap', [0.0, 1000.0])
+@pytest.mark.parametrize('use_wildcard', [False, True])
+def test_frontier_matches_comparing_every_team(seed, cost_cap, use_wildcard):
+    grid = synthetic_grid(5, cost_cap, seed)
+    frontier, search_counts = pareto_frontier(*grid, use_wildcard=use_wildcard)
+
+    expected = frontier_by_hand(grid, use_wildcard)
+    assert [(t.score, round(t.proposed_team_value, 6), t.substitutions_needed, tuple(t.driver_selection), tuple(t.constructor_team)) for t in frontier] == expected
+    assert search_counts['frontier_count'] == len(expected)
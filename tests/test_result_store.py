@@ -0,0 +1,51 @@
+from weekend_functions import main
+from backtest import score_actual_weekend
+from result_store import ResultStore
+from test_chips import synthetic_weekend
+
+
+def test_saved_runs_can_be_queried(tmp_path, capsys):
+    weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(5, 'bahrain', 4)
+    weekend_df['actual_qualifying_bahrain'] = weekend_df['predicted_qualifying_bahrain'][::-1].to_numpy()
+    weekend_df['actual_race_bahrain'] = weekend_df['predicted_race_bahrain'][::-1].to_numpy()
+    current_team_drivers = weekend_df.Driver[:5].tolist()
+    current_team_constructors = ['Team 3', 'Team 4']
+    path = str(tmp_path / 'results.sqlite')
+
+    store = ResultStore(path)
+    main(current_team_drivers, current_team_constructors, weekend_df, 'bahrain', driver_pricing, constructor_pricing, 1.0, top_k=3, store=store)
+    top_teams = main(current_team_drivers, current_team_constructors, weekend_df, 'bahrain', driver_pricing, constructor_pricing, 1.0, top_k=3,
+                     chip='no_negative', store=store)
+    driver_points, constructor_points = score_actual_weekend(weekend_df, 'bahrain')
+    store.save_actual('bahrain', driver_points, constructor_points)
+    store.close()
+
+    # everything is still there when the file is opened again
+    store = ResultStore(path)
+    runs = store.runs('bahrain')
+    assert runs.chip.fillna('none').tolist() == ['none', 'no_negative']
+    assert store.runs('monaco').empty
+
+    saved_teams = store.top_teams(runs.id.iloc[-1])
+    assert saved_teams['rank'].tolist() == [1, 2, 3]
+    assert saved_teams.score.tolist() == [team.score for team in reversed(top_teams)]
+    assert saved_teams.drivers.tolist() == [', '.join(team.driver_selection) for team in reversed(top_teams)]
+
+    # the best team of the latest run, with the turbo driver's actual points counted twice
+    best = top_teams[-1]
+    actual = sum(driver_points[d] for d in best.driver_selection) + driver_points[best.turbo_driver] + sum(constructor_points[c] for c in best.constructor_team)
+    predicted_vs_actual = store.predicted_vs_actual()
+    assert predicted_vs_actual[['track', 'predicted_points', 'actual_points']].values.tolist() == [['bahrain', best.score, actual]]
+    assert len(store.points_history('Driver 0')) == 2
+    store.close()
+
+
+def test_find_run_by_inputs():
+    store = ResultStore(':memory:')
+    first = store.save_run('bahrain', [], {'Driver 1': 10}, {'Team A': 20}, inputs=('bahrain', 1.0))
+    second = store.save_run('bahrain', [], {'Driver 1': 12}, {'Team A': 20}, inputs=('bahrain', 2.0))
+    store.save_run('bahrain', [], {'Driver 1': 11}, {'Team A': 20}, inputs=('bahrain', 3.0))
+
+    assert store.find_run(('bahrain', 2.0)) == second
+    assert first != second
+    assert store.find_run(('bahrain', 4.0)) is None
@@ -0,0 +1,42 @@
+import statistics
+import numpy as np
+import pandas as pd
+import pytest
+from weekend_functions import RiskObjective, enumerate_teams_vectorized
+
+
+def scenarios(seed):
+    # scores of 10 drivers and 5 constructors over 300 weekends, each car's drivers and constructor sharing a good or bad weekend
+    rng = np.random.default_rng(seed)
+    car = rng.normal(0, 8, (300, 5))
+    drivers = [f'Driver {i}' for i in range(10)]
+    constructors = [f'Team {i}' for i in range(5)]
+    driver_samples = pd.DataFrame(rng.normal(15, 6, (300, 10)) + np.repeat(car, 2, axis=1), columns=drivers)
+    constructor_samples = pd.DataFrame(rng.normal(30, 10, (300, 5)) + 2 * car, columns=constructors)
+    return driver_samples, constructor_samples
+
+
+@pytest.mark.parametrize('measure', ['stdev', 'cvar'])
+def test_risk_score_is_mean_less_stdev_of_the_samples(measure):
+    driver_samples, constructor_samples = scenarios(0)
+    risk = RiskObjective.from_samples(driver_samples, constructor_samples, measure=measure, risk_aversion=1.0, alpha=0.2)
+    drivers, constructors = list(driver_samples.columns), list(constructor_samples.columns)
+    prices = {name: 10.0 for name in drivers + constructors}
+
+    # every team is kept, with no substitution penalty or cost cap to get in the way
+    top_teams, _ = enumerate_teams_vectorized(
+        drivers, constructors, risk.driver_scores, risk.constructor_scores, prices, prices, drivers[:5], constructors[:2], 1000.0,
+        use_wildcard=True, top_k=10 ** 6, risk=risk)
+
+    # the points of every team in each sampled weekend, the turbo driver counting twice
+    names = drivers + constructors
+    weights = np.zeros((len(top_teams), len(names)))
+    for row, team in enumerate(top_teams):
+        for name in list(team.driver_selection) + list(team.constructor_team) + [team.turbo_driver]:
+            weights[row, names.index(name)] += 1
+    points = pd.concat([driver_samples, constructor_samples], axis=1).to_numpy() @ weights.T
+
+    normal = statistics.NormalDist()
+    multiplier = 1.0 if measure == 'stdev' else normal.pdf(normal.inv_cdf(0.2)) / 0.2
+    assert len(top_teams) == 252 * 10
+    np.testing.assert_allclose([team.score for team in top_teams], points.mean(axis=0) - multiplier * points.std(axis=0, ddof=1))
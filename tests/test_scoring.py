@@ -0,0 +1,44 @@
+import pytest
+from weekend_functions import default_rules, score_race_full
+
+
+drivers = ['Driver 1', 'Driver 2', 'Driver 3', 'Driver 4']
+driver_to_constructor = {'Driver 1': 'Team A', 'Driver 2': 'Team A', 'Driver 3': 'Team B', 'Driver 4': 'Team B'}
+constructor_to_driver = {'Team A': ['Driver 1', 'Driver 2'], 'Team B': ['Driver 3', 'Driver 4']}
+
+
+def score(quali_order, race_order, driver_gain_loss_overtake=None):
+    return score_race_full(
+        {}, {}, quali_order, race_order, driver_gain_loss_overtake, driver_to_constructor, constructor_to_driver,
+        'Driver 4', 'Driver 3', 'Team B', 'Team A', None)
+
+
+def test_orders_score_positions_gain_loss_and_superlatives():
+    # Driver 4 comes through from the back to win, Driver 1 drops from pole to last
+    driver_scores, constructor_scores, driver_score_summary, _ = score(drivers, drivers[::-1])
+
+    race, quali, awards = default_rules.race_position_to_points, default_rules.quali_position_to_points, default_rules.superlative_points
+    assert driver_scores['Driver 1'] == race[4] + quali[1] - 3
+    assert driver_scores['Driver 4'] == race[1] + quali[4] + 3 + 3 + awards['fastest_lap']
+    assert driver_scores['Driver 3'] == race[2] + quali[3] + 1 + 1 + awards['driver_of_the_day']
+    assert constructor_scores['Team A'] == driver_scores['Driver 1'] + driver_scores['Driver 2'] + default_rules.constructor_bonus(2, 0) + awards['second_fastest_pitstop']
+    # driver of the day is only for the driver, the fastest lap counts for the constructor too
+    assert constructor_scores['Team B'] == driver_scores['Driver 3'] - awards['driver_of_the_day'] + driver_scores['Driver 4'] + default_rules.constructor_bonus(2, 0) + awards['fastest_pitstop']
+    assert driver_score_summary['Driver 4']['gain_loss'] == 3
+
+
+def test_hand_entered_gain_loss_is_used():
+    driver_gain_loss_overtake = {d: {'gain_loss': 0, 'overtake': 2} for d in drivers}
+    driver_scores, _, _, _ = score(drivers, drivers[::-1], driver_gain_loss_overtake)
+
+    assert driver_scores['Driver 1'] == default_rules.race_position_to_points[4] + default_rules.quali_position_to_points[1] + 2
+
+
+@pytest.mark.parametrize('code', [200, 400])
+def test_positions_with_sentinel_codes(code):
+    quali_positions = {'Driver 1': 1, 'Driver 2': 2, 'Driver 3': 3, 'Driver 4': 4}
+    race_positions = {'Driver 1': code, 'Driver 2': 1, 'Driver 3': 2, 'Driver 4': 3}
+    driver_scores, _, driver_score_summary, _ = score(quali_positions, race_positions)
+
+    assert driver_scores['Driver 1'] == default_rules.race_position_to_points[code] + default_rules.quali_position_to_points[1]
+    assert driver_score_summary['Driver 1']['gain_loss'] == 0
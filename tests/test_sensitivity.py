@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from weekend_functions import _move_position, main, sensitivity_sweep
+from test_chips import synthetic_weekend
+
+
+def test_moved_positions_are_still_a_finishing_order():
+    positions = np.random.default_rng(0).permutation(12) + 1
+    for i in range(12):
+        for position in range(1, 13):
+            moved = _move_position(positions, i, position)
+            assert moved[i] == position
+            assert sorted(moved) == list(range(1, 13))
+            # the drivers that weren't in between keep their positions
+            between = (positions >= min(position, positions[i])) & (positions <= max(position, positions[i]))
+            assert (moved[~between] == positions[~between]).all()
+
+
+def test_sweep_scores_the_moved_finishing_order(capsys):
+    weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(6, 'testtrack', 3)
+    current_team_drivers = weekend_df.Driver[:5].tolist()
+    current_team_constructors = ['Team 4', 'Team 5']
+    _, sweep = sensitivity_sweep(current_team_drivers, current_team_constructors, weekend_df, 'testtrack', driver_pricing, constructor_pricing, 1.0,
+                                 sessions=['race', 'sprint_qualifying'], price_changes=())
+
+    for _, change in sweep.sample(20, random_state=0).iterrows():
+        column = f'predicted_{change.change}_testtrack'
+        moved_df = weekend_df.copy()
+        moved_df[column] = _move_position(weekend_df[column].to_numpy(), weekend_df.Driver.tolist().index(change['name']), change.value)
+        top_teams = main(current_team_drivers, current_team_constructors, moved_df, 'testtrack', driver_pricing, constructor_pricing, 1.0, top_k=1)
+        assert change.score == top_teams[-1].score
@@ -0,0 +1,47 @@
+import pytest
+from weekend_functions import OptimizerSession, ScoringRules, default_rules, main
+from test_chips import synthetic_weekend
+from test_engines import team_keys
+
+
+def doubled_race_points():
+    rules = default_rules.to_dict()
+    rules['race_position_to_points'] = {position: 2 * points for position, points in rules['race_position_to_points'].items()}
+    return ScoringRules.from_dict(rules)
+
+
+@pytest.mark.parametrize('use_wildcard', [False, True])
+@pytest.mark.parametrize('rules', [None, doubled_race_points()])
+def test_session_matches_main_after_updates(use_wildcard, rules, capsys):
+    weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(6, 'testtrack', 1)
+    current_team_drivers = weekend_df.Driver[:5].tolist()
+    current_team_constructors = ['Team 4', 'Team 5']
+    chip = 'wildcard' if use_wildcard else None
+    # a small reserve, so the updates have to repair it and sometimes rescan
+    session = OptimizerSession(weekend_df, 'testtrack', driver_pricing, constructor_pricing, current_team_drivers, current_team_constructors, 1.0,
+                               use_wildcard=use_wildcard, top_k=10, reserve=15, rules=rules)
+
+    updates = [
+        ('position', 'Driver 9', 'race', 1),
+        ('position', 'Driver 0', 'qualifying', 12),
+        ('position', 'Driver 6', 'sprint_race', 2),
+        ('driver_price', 'Driver 7', 8.0),
+        ('constructor_price', 'Team 0', 5.5),
+        ('driver_price', 'Driver 1', 25.0),
+        ('position', 'Driver 11', 'race', 3),
+    ]
+    for update in updates:
+        if update[0] == 'position':
+            _, driver, session_name, position = update
+            session.update_position(driver, session_name, position)
+            weekend_df.loc[weekend_df.Driver == driver, f'predicted_{session_name}_testtrack'] = position
+        elif update[0] == 'driver_price':
+            session.update_driver_price(update[1], update[2])
+            driver_pricing.loc[driver_pricing.Driver == update[1], 'testtrack'] = update[2]
+        else:
+            session.update_constructor_price(update[1], update[2])
+            constructor_pricing.loc[constructor_pricing.Constructor == update[1], 'testtrack'] = update[2]
+
+        top_teams = main(current_team_drivers, current_team_constructors, weekend_df, 'testtrack', driver_pricing, constructor_pricing, 1.0,
+                         top_k=10, chip=chip, rules=rules)
+        assert team_keys(session.best_teams()) == team_keys(top_teams)
@@ -0,0 +1,125 @@
+import hashlib
+import http.server
+import threading
+import urllib.parse
+import pytest
+from sheet_loader import SheetCache, constructor_pricing_gid, driver_pricing_gid, load_sheets, load_weekend
+
+
+class SheetHandler(http.server.BaseHTTPRequestHandler):
+    # a local stand-in for the csv export: /export redirects to /csv like the real sheet does, and /csv serves the tab with an ETag
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        if self.server.gone:
+            # hang up without answering, like a kept alive connection the server dropped
+            self.close_connection = True
+            return
+
+        url = urllib.parse.urlsplit(self.path)
+        gid = urllib.parse.parse_qs(url.query)['gid'][0]
+        if url.path == '/export':
+            self.send_response(307)
+            self.send_header('Location', f'/csv?gid={gid}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = self.server.sheets[gid].encode()
+        etag = '"' + hashlib.sha256(body).hexdigest() + '"'
+        with self.server.lock:
+            self.server.requests.append((gid, self.headers.get('If-None-Match') == etag))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sheet_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), SheetHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    server.gone = False
+    server.requests = []
+    server.sheets = {str(gid): f'Driver,price\nDriver {gid},{gid}.5\n' for gid in range(8)}
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/export?format=csv&gid={{gid}}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_sheets_reuses_connections(sheet_server, tmp_path):
+    cache = SheetCache(str(tmp_path), ttl=0, url=sheet_server.url)
+    dfs = load_sheets(list(sheet_server.sheets), cache, workers=2)
+
+    assert sorted(dfs) == sorted(sheet_server.sheets)
+    for gid, df in dfs.items():
+        assert df.Driver.tolist() == [f'Driver {gid}']
+        assert df.price.tolist() == [int(gid) + 0.5]
+    # 16 requests (the redirect and the csv for each sheet) over at most one connection per worker thread
+    assert sheet_server.connections <= 2
+
+
+def test_unchanged_sheet_is_revalidated(sheet_server, tmp_path):
+    cache = SheetCache(str(tmp_path), ttl=0, url=sheet_server.url)
+    first = cache.load('3')
+    second = cache.load('3')
+
+    assert second.equals(first)
+    assert sheet_server.requests == [('3', False), ('3', True)]
+    assert sheet_server.connections == 1
+
+
+def test_changed_sheet_is_downloaded_again(sheet_server, tmp_path):
+    cache = SheetCache(str(tmp_path), ttl=0, url=sheet_server.url)
+    cache.load('3')
+    sheet_server.sheets['3'] = 'Driver,price\nDriver 3,4.0\n'
+
+    assert cache.load('3').price.tolist() == [4.0]
+
+
+def test_cached_copy_is_used_when_the_server_is_gone(sheet_server, tmp_path, capsys):
+    cache = SheetCache(str(tmp_path), ttl=0, url=sheet_server.url)
+    first = cache.load('5')
+    sheet_server.gone = True
+    sheet_server.shutdown()
+    sheet_server.server_close()
+
+    assert cache.load('5').equals(first)
+    assert 'using the cached copy' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('print_report', [True, False])
+def test_load_weekend_reports_problems(sheet_server, tmp_path, capsys, print_report):
+    # Driver 2 and Driver 3 are both P2, and Driver 4 has no price
+    sheet_server.sheets['0'] = 'Team,Driver,actual_race_bahrain\nTeam A,Driver 1,1\nTeam A,Driver 2,2\nTeam B,Driver 3,2\nTeam B,Driver 4,DNF\n'
+    sheet_server.sheets[driver_pricing_gid] = 'Driver,bahrain\nDriver 1,10.0\nDriver 2,9.0\nDriver 3,8.0\n'
+    sheet_server.sheets[constructor_pricing_gid] = 'Constructor,bahrain\nTeam A,20.0\nTeam B,18.0\n'
+    cache = SheetCache(str(tmp_path), ttl=0, url=sheet_server.url)
+    weekend_df = load_weekend('bahrain', cache, print_report=print_report)
+
+    assert weekend_df.Driver.tolist() == ['Driver 1', 'Driver 2', 'Driver 3', 'Driver 4']
+    out = capsys.readouterr().out
+    if print_report:
+        assert '=== bahrain ===' in out
+        assert 'Column "Driver" has no price for Driver 4' in out
+        assert 'Column "actual_race_bahrain" has positions entered more than once: Driver 2 (2), Driver 3 (2)' in out
+    else:
+        assert out == ''
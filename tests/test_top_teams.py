@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sortedcontainers import SortedList
+from weekend_functions import Team, TopTeamCollector
+
+
+def make_team(score, order):
+    return Team(score, ('Team A', 'Team B'), (f'Driver {order}',), f'Driver {order}', 0, 0.0, 0.0)
+
+
+@pytest.mark.parametrize('k', [1, 5, 50])
+def test_collector_keeps_what_sorted_list_kept(k):
+    # lots of tied scores, the later team wins a tie like it did with SortedList add and pop(0)
+    scores = np.random.default_rng(0).integers(0, 10, 200).tolist()
+    teams = [make_team(score, order) for order, score in enumerate(scores)]
+
+    top_teams = SortedList()
+    collector = TopTeamCollector(k)
+    for order, team in enumerate(teams):
+        top_teams.add(team)
+        if len(top_teams) > k:
+            top_teams.pop(0)
+        collector.add(team.score, order, team)
+
+    assert [id(t) for t in collector.sorted_list()] == [id(t) for t in top_teams]
+    assert collector.threshold() == top_teams[0].score
+
+
+def test_collector_threshold_and_would_keep():
+    collector = TopTeamCollector(2)
+    assert collector.threshold() is None
+    collector.add(10, 0, make_team(10, 0))
+    assert collector.threshold() is None
+    collector.add(20, 1, make_team(20, 1))
+
+    assert collector.threshold() == 10
+    assert not collector.would_keep(9, 2)
+    assert collector.would_keep(10, 2)
+    assert not collector.would_keep(10, -1)
+    collector.add(9, 2, make_team(9, 2))
+    assert [entry[:2] for entry in collector.entries()] == [(10, 0), (20, 1)]
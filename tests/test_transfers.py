@@ -0,0 +1,19 @@
+import pytest
+from weekend_functions import main, plan_transfers
+from test_chips import synthetic_weekend
+from test_session import doubled_race_points
+
+
+@pytest.mark.parametrize('rules', [None, doubled_race_points()])
+def test_one_week_plan_is_the_best_team(rules, capsys):
+    # with a single track to plan for, the best plan is just the best team with the usual substitution penalty
+    weekend_df, driver_pricing, constructor_pricing = synthetic_weekend(6, 'testtrack', 2)
+    current_team_drivers = weekend_df.Driver[:5].tolist()
+    current_team_constructors = ['Team 4', 'Team 5']
+    plan, total_score = plan_transfers(current_team_drivers, current_team_constructors, weekend_df, ['testtrack'], driver_pricing, constructor_pricing, 1.0,
+                                       rules=rules)
+    top_teams = main(current_team_drivers, current_team_constructors, weekend_df, 'testtrack', driver_pricing, constructor_pricing, 1.0,
+                     top_k=1, rules=rules)
+
+    assert total_score == top_teams[-1].score
+    assert set(plan[0]['drivers']) == set(top_teams[-1].driver_selection)
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+from weekend_functions import validate_weekends
+
+
+def weekend(**columns):
+    return pd.DataFrame({'Team': ['Team A', 'Team A', 'Team B', 'Team B'], 'Driver': ['Driver 1', 'Driver 2', 'Driver 3', 'Driver 4'], **columns})
+
+
+@pytest.mark.parametrize('positions', [[1, 2, 3, 4], [100, 1, 2, 3], [1, 200, 2, 3], [1, 2, 300, 3], [400, 1, 2, 3], ['OUT', 'DNF', 1, 'DQ']])
+def test_finishing_orders_and_codes_pass(positions):
+    weekend_df = weekend(actual_race_bahrain=positions, predicted_race_bahrain=[None] * 4)
+    prices = pd.DataFrame({'Driver': weekend_df.Driver, 'bahrain': [10.0] * 4})
+    constructor_prices = pd.DataFrame({'Constructor': ['Team A', 'Team B'], 'bahrain': [20.0] * 2})
+
+    assert validate_weekends({'bahrain': weekend_df}, prices, constructor_prices).empty
+
+
+@pytest.mark.parametrize('positions, check, detail', [
+    ([1, 2, None, 3], 'missing', 'has no position for Driver 3'),
+    ([1, 2, 2, 3], 'duplicate', 'has positions entered more than once: Driver 2 (2), Driver 3 (2)'),
+    ([1, 2, 4, 200], 'gap', 'has positions past the number of finishers: Driver 3 (4)'),
+    ([1, 2, 3, 500], 'invalid_code', 'has positions past the grid that aren\'t codes: Driver 4 (500)'),
+])
+def test_problems_are_reported(positions, check, detail):
+    report = validate_weekends({'bahrain': weekend(actual_race_bahrain=positions)})
+
+    assert report[['track', 'column', 'check', 'detail']].values.tolist() == [['bahrain', 'actual_race_bahrain', check, detail]]
+
+
+def test_missing_prices_are_reported():
+    weekend_df = weekend(actual_race_bahrain=[1, 2, 3, 4])
+    prices = pd.DataFrame({'Driver': ['Driver 1', 'Driver 2', 'Driver 3'], 'bahrain': [10.0] * 3})
+    report = validate_weekends({'bahrain': weekend_df}, prices, pd.DataFrame({'Constructor': ['Team A', 'Team B']}))
+
+    assert report.detail.tolist() == ['has no price for Driver 4', 'has no constructor prices for bahrain']
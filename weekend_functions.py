@@ -1,5 +1,17 @@
+import concurrent.futures
+import contextlib
+import copy
+import heapq
+import io
 import itertools
+import json
+import math
+import os
+import statistics
+import time
+import tracemalloc
 from sortedcontainers import SortedList
+import numpy as np
 import pandas as pd
 
 # in the google sheets, to have everything be numeric instead of having some entries as 'DNF' when all other entries are integers, the following will be used for OUT, DNF, DNQ, and DQ:
@@ -7,6 +19,7 @@ import pandas as pd
 # DNF: 200 (racer did not finish the race, e.g. Gasly and Stroll in Saudi Arabia)
 # DNQ: 300 (racer did not set a qualifying position, e.g. Zhou in Saudi Arabia)
 # DQ: 400 (racer was disqualified from the session)
+sentinel_codes = {'OUT': 100, 'DNF': 200, 'DNQ': 300, 'DQ': 400}
 
 # this dictionary is used for awarding points based on race finishing position
 race_position_to_points = {
@@ -131,7 +144,7 @@ def drop_empties(df):
         if all(df[col].isna()):
             drops.append(col)
     
-    df = df.drop(columns = drops, axis=1)
+    df = df.drop(columns = drops)
     
     return df
 
@@ -149,7 +162,7 @@ def drops_keep_fp(df):
     
     drops = [x for x in df.columns if 'predicted' in x or 'actual' in x or 'bonus' in x]
 
-    df = df.drop(columns=drops, axis=1)
+    df = df.drop(columns=drops)
     
     return df
 
@@ -157,7 +170,9 @@ def drops_keep_fp(df):
 def check_df(weekend_df):
     '''
     This function checks that the columns in the dataframe don't have any errors in the position numbers entered.
-    Its checking that the sorted order of positions match the expected list of integers 1 through 20 for a col
+    Its checking that the finishing positions in each col are the integers 1 through the number of finishers, with the
+    sentinel codes for the rest, and that every team has two drivers. See validate_weekends for the checks, it returns the
+    problems as a dataframe instead of printing them.
     
     parametrs:
     df: dataframe of weekend fp results, qualifying and race predictions and results
@@ -165,22 +180,182 @@ def check_df(weekend_df):
     returns:
     nothing, just prints some statements based on anything identified that needs fixing
     '''
+    for problem in validate_weekends({None: weekend_df}).itertuples():
+        print(f'Column "{problem.column}" {problem.detail}')
+
+
+def validate_weekends(weekend_dfs, driver_pricing=None, constructor_pricing=None):
+    '''
+    checks the weekend dataframes of any number of tracks, e.g. a whole season, and reports every problem found in one table.
+    the position columns (fp, predicted and actual) of all the tracks are checked together in one pass:
+    
+    every position has to be filled in, unless the column is still empty altogether
+    a position is either a finishing position or one of the sentinel codes (100 OUT, 200 DNF, 300 DNQ, 400 DQ, or those words)
+    the finishing positions of a column are 1 through the number of drivers without a code, each of them once
+    
+    every team has to have exactly two drivers, a driver can only be in the sheet once, and if the pricing is given every driver
+    and constructor of a weekend has to have a price for it.
+    
+    parameters:
+    weekend_dfs: dict, track name to its weekend dataframe
+    driver_pricing: dataframe, optional driver prices with a column per track
+    constructor_pricing: dataframe, optional constructor prices with a column per track
+    
+    returns:
+    report: dataframe with track, column, check and detail columns, one row per problem, empty if everything checks out
+    '''
+    problems = []
+    driver_prices = driver_pricing.set_index('Driver') if driver_pricing is not None else None
+    constructor_prices = constructor_pricing.set_index('Constructor') if constructor_pricing is not None else None
     
-    for col in [x for x in weekend_df.columns if 'fp' in x or 'predicted' in x or 'actual' in x]:
+    # the position columns of every track stacked into one long table of (track, column, Driver, value)
+    stacked = {'track': [], 'column': [], 'Driver': [], 'value': [], 'n_drivers': []}
+    for track_name, weekend_df in weekend_dfs.items():
+        columns = [x for x in weekend_df.columns if 'fp' in x or 'predicted' in x or 'actual' in x]
+        n_drivers = len(weekend_df)
+        stacked['track'].append(np.full(n_drivers * len(columns), track_name, dtype=object))
+        stacked['column'].append(np.repeat(np.array(columns, dtype=object), n_drivers))
+        stacked['Driver'].append(np.tile(weekend_df['Driver'].to_numpy(dtype=object), len(columns)))
+        stacked['value'].append(weekend_df[columns].to_numpy(dtype=object).ravel(order='F'))
+        stacked['n_drivers'].append(np.full(n_drivers * len(columns), n_drivers))
         
-        dnf_flag = 'DNF' in weekend_df[col].values.tolist()
-        check_order = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]
-        finishers = [x for x in weekend_df[col].values if x != 'DNF']
+        team_sizes = weekend_df['Team'].value_counts(sort=False)
+        for team, size in team_sizes[team_sizes != 2].items():
+            problems.append((track_name, 'Team', 'team_drivers', f'has {team} with {size} driver(s) instead of 2'))
+        for driver in weekend_df['Driver'][weekend_df['Driver'].duplicated()].unique():
+            problems.append((track_name, 'Driver', 'duplicate_driver', f'has {driver} more than once'))
         
-        if dnf_flag:
-            print(f'Column "{col}" had some DNF\'s')
-            check_order = check_order[:len(finishers)]
-        if sorted(finishers) != check_order:
-            print(f'Column "{col}" has an issue with the finishing positins represented in the data!')
-            print(sorted(weekend_df[col].values))
-            print('\n')
-            
-            
+        # only weekends that have been filled in need prices
+        for prices, name, names in [(driver_prices, 'Driver', weekend_df['Driver']), (constructor_prices, 'Constructor', weekend_df['Team'].drop_duplicates())]:
+            if prices is None or not columns:
+                continue
+            if track_name not in prices.columns:
+                problems.append((track_name, name, 'price', f'has no {name.lower()} prices for {track_name}'))
+                continue
+            unpriced = names[names.map(prices[track_name]).isna()]
+            if len(unpriced):
+                problems.append((track_name, name, 'price', f'has no price for {", ".join(unpriced)}'))
+    
+    if weekend_dfs:
+        positions = pd.DataFrame({key: np.concatenate(arrays) for key, arrays in stacked.items()})
+        keys = [positions['track'], positions['column']]
+        raw = positions['value']
+        value = pd.to_numeric(raw.replace(sentinel_codes), errors='coerce')
+        missing = raw.isna()
+        
+        # a column that isn't filled in at all yet is fine
+        filled = ~missing.groupby(keys, sort=False, dropna=False).transform('all')
+        sentinel = value.isin(list(sentinel_codes.values()))
+        not_a_position = ~missing & (value.isna() | (value % 1 != 0))
+        finisher = ~missing & ~not_a_position & ~sentinel & (value >= 1) & (value <= positions['n_drivers'])
+        # every driver without a code should have a finishing position, so the highest one is the grid less the codes
+        finishers = positions['n_drivers'] - sentinel.groupby(keys, sort=False, dropna=False).transform('sum')
+        
+        checks = {
+            'missing': (filled & missing, 'has no position for'),
+            'not_a_position': (not_a_position, 'has entries that aren\'t positions or codes:'),
+            'invalid_code': (~missing & ~not_a_position & ~sentinel & ~finisher, 'has positions past the grid that aren\'t codes:'),
+            'duplicate': (finisher & positions.assign(value=value).duplicated(['track', 'column', 'value'], keep=False), 'has positions entered more than once:'),
+            'gap': (finisher & (value > finishers), 'has positions past the number of finishers:'),
+        }
+        for check, (flagged, message) in checks.items():
+            for (track_name, column), rows in positions[flagged].groupby(['track', 'column'], sort=False, dropna=False):
+                entries = ', '.join(d if check == 'missing' else f'{d} ({v:g})' if isinstance(v, float) else f'{d} ({v})' for d, v in zip(rows['Driver'], rows['value']))
+                problems.append((track_name, column, check, f'{message} {entries}'))
+    
+    report = pd.DataFrame(problems, columns=['track', 'column', 'check', 'detail'])
+    order = {track_name: i for i, track_name in enumerate(weekend_dfs)}
+    return report.iloc[np.argsort(report['track'].map(order).to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def fp_results(weekend_dfs):
+    '''
+    puts the free practice results of every track into one long table, one row per driver, track and session, so a whole
+    season of practice can be analysed with a single groupby. positions past the number of drivers (the sentinel codes, e.g.
+    a 400 for a driver that didn't set a time) and results that aren't filled in are left out.
+    
+    parameters:
+    weekend_dfs: dict, track name to its weekend dataframe, e.g. from sheet_loader.load_season
+    
+    returns:
+    results: dataframe with track, session ('fp1', 'fp2' or 'fp3'), Team, Driver and position columns, tracks in the order of weekend_dfs
+    '''
+    frames = []
+    for track_name, weekend_df in weekend_dfs.items():
+        fp_df = drops_keep_fp(weekend_df)
+        sessions = [f'{session}_{track_name}' for session in ['fp1', 'fp2', 'fp3'] if f'{session}_{track_name}' in fp_df.columns]
+        track_results = fp_df.melt(id_vars=['Team', 'Driver'], value_vars=sessions, var_name='session', value_name='position')
+        track_results['session'] = track_results['session'].str.split('_').str[0]
+        track_results.insert(0, 'track', track_name)
+        track_results['n_drivers'] = len(fp_df)
+        frames.append(track_results)
+    
+    if not frames:
+        return pd.DataFrame(columns=['track', 'session', 'Team', 'Driver', 'position'])
+    
+    results = pd.concat(frames, ignore_index=True)
+    results['position'] = pd.to_numeric(results['position'], errors='coerce')
+    results = results[results['position'] <= results['n_drivers']].drop(columns='n_drivers')
+    results['track'] = pd.Categorical(results['track'], categories=list(weekend_dfs))
+    return results.astype({'position': int}).reset_index(drop=True)
+
+
+def driver_eval_fp(weekend_dfs):
+    '''
+    evaluates the drivers' performance progression through the free practice sessions of every track at once,
+    assuming they are trying to drive as quick as possible while they learn the track.
+    
+    parameters:
+    weekend_dfs: dict, track name to its weekend dataframe, e.g. {track_name: fp_df} for a single weekend
+    
+    returns:
+    driver_eval: dataframe indexed by (track, Driver) with each session's result, the total and average finish over the sessions
+                 the driver set a time in, and the change from one session to the next (positive is moving up the order).
+                 columns for sessions that aren't in any of the weekends are dropped.
+    '''
+    results = fp_results(weekend_dfs)
+    positions = results.pivot_table(index=['track', 'Driver'], columns='session', values='position', aggfunc='first', observed=True)
+    positions = positions.reindex(columns=['fp1', 'fp2', 'fp3'])
+    
+    driver_eval = pd.DataFrame(index=positions.index)
+    for session in ['fp1', 'fp2', 'fp3']:
+        driver_eval[f'{session.upper()} Results'] = positions[session]
+    driver_eval['Total Finish'] = positions.sum(axis=1, min_count=1)
+    driver_eval['Average Finish'] = positions.mean(axis=1)
+    driver_eval['FP1-FP2 Change'] = positions['fp1'] - positions['fp2']
+    driver_eval['FP2-FP3 Change'] = positions['fp2'] - positions['fp3']
+    driver_eval['FP1-FP3 Change'] = positions['fp1'] - positions['fp3']
+    
+    return driver_eval.dropna(axis=1, how='all')
+
+
+def team_eval_fp(weekend_dfs):
+    '''
+    evaluates team strength after each free practice session of every track at once. This is done on several parameters:
+    
+    Average Finish: average finishing position of the team based on driver positions. A lower value in this column is better.
+    Total Finish: sum of the finishing positions of each driver. A lower value in this column is better.
+    Finish Spread: difference between finishing positions of the team's drivers. A lower value in this column means the drivers finished closer together on the grid.
+    
+    parameters:
+    weekend_dfs: dict, track name to its weekend dataframe, e.g. {track_name: fp_df} for a single weekend
+    
+    returns:
+    team_eval: dataframe indexed by (track, session, Team), within each track and session sorted by Average Finish,
+               then by Total Finish, then by Finish Spread
+    '''
+    results = fp_results(weekend_dfs)
+    team_eval = results.groupby(['track', 'session', 'Team'], observed=True)['position'].agg(['mean', 'sum', 'max', 'min'])
+    team_eval = pd.DataFrame({
+        'Average Finish': team_eval['mean'],
+        'Total Finish': team_eval['sum'],
+        'Finish Spread': team_eval['max'] - team_eval['min'],
+    })
+    
+    team_eval = team_eval.reset_index().sort_values(['track', 'session', 'Average Finish', 'Total Finish', 'Finish Spread'], kind='stable')
+    return team_eval.set_index(['track', 'session', 'Team'])
+
+
 def driver_constructor_mappings(weekend_df):
     '''
     This function establishes the relationships between drives and constructors for the purpose of scoring lookups when assigning points.
@@ -242,6 +417,70 @@ def quali_result(position):
         return 'Q1'
 
 
+def _score_actual_weekend(
+    driver_to_constructor,
+    quali_order=None,
+    race_order=None,
+    driver_gain_loss_overtake=None,
+    fastest_lap=None,
+    driver_ofthe_day=None,
+    pitstops=(None, None, None),
+    rules=None):
+    '''
+    scores one actual weekend with the rules' score_weekends kernel, for score_race_full and the scorers it's made of.
+    an order is a list of drivers in finishing order, or a dict of driver to position with the sentinel codes (100 OUT, 200 DNF,
+    300 DNQ, 400 DQ) for the drivers that didn't finish or qualify. a driver missing from an order (or without the order) is OUT.
+    
+    parameters:
+    driver_to_constructor: dict, maps drivers to the constructor they drive for
+    quali_order: list or dict, actual qualifying order
+    race_order: list or dict, actual race order
+    driver_gain_loss_overtake: dict, each driver's gain/loss and overtakes, worked out from the positions if not given
+    fastest_lap: str, driver with the fastest lap, or None
+    driver_ofthe_day: str, driver of the day, or None
+    pitstops: tuple, constructors with the fastest, second and third fastest pitstops, None for nobody
+    rules: ScoringRules, defaults to default_rules
+    
+    returns:
+    drivers: list, drivers in either order (every driver in driver_to_constructor if there's no order)
+    constructors: list, their constructors
+    breakdown: dict, the kernel's breakdown of the weekend, one list entry per driver or constructor, with the positions
+               scored as 'quali_position' and 'race_position'
+    '''
+    orders = [order for order in [quali_order, race_order] if order is not None]
+    drivers = [d for d in driver_to_constructor if not orders or any(d in order for order in orders)]
+    constructors = list(dict.fromkeys(driver_to_constructor[d] for d in drivers))
+    
+    def positions(order):
+        if isinstance(order, dict):
+            return np.array([order.get(d, sentinel_codes['OUT']) for d in drivers], dtype=np.int64)
+        order = list(order or [])
+        return np.array([order.index(d) + 1 if d in order else sentinel_codes['OUT'] for d in drivers], dtype=np.int64)
+    
+    def driver_index(driver):
+        return drivers.index(driver) if driver in drivers else -1
+    
+    quali_positions, race_positions = positions(quali_order), positions(race_order)
+    gain_loss = overtake = None
+    if driver_gain_loss_overtake is not None:
+        gain_loss = np.array([[driver_gain_loss_overtake[d]['gain_loss'] for d in drivers]], dtype=np.int64)
+        overtake = np.array([[driver_gain_loss_overtake[d]['overtake'] for d in drivers]], dtype=np.int64)
+    
+    _, _, breakdown = (rules or default_rules).score_weekends(
+        quali_positions[None, :],
+        race_positions[None, :],
+        constructor_membership([driver_to_constructor[d] for d in drivers], constructors),
+        gain_loss=gain_loss,
+        overtake=overtake,
+        fastest_lap=np.array([driver_index(fastest_lap)]),
+        driver_of_the_day=np.array([driver_index(driver_ofthe_day)]),
+        pitstops=np.array([[constructors.index(c) if c in constructors else -1 for c in pitstops]]))
+    
+    breakdown = {part: np.asarray(points)[0].tolist() for part, points in breakdown.items()}
+    breakdown['quali_position'], breakdown['race_position'] = quali_positions.tolist(), race_positions.tolist()
+    return drivers, constructors, breakdown
+
+
 def score_race_order(
     quali_order,
     race_order,
@@ -249,65 +488,49 @@ def score_race_order(
     constructor_scores,
     driver_gain_loss_overtake,
     driver_to_constructor,
-    constructor_to_driver):
+    constructor_to_driver,
+    rules=None):
     '''
     this function scores the race results, whether predicted or actual. 
     it takes the predicted and actual from either qualifying or the race, awards points for positions gained/lost, and awards points for finish order in the top 10. 
-    it does not account for fastest lap although maybe it should... have to think more about that.
+    it does not account for fastest lap, that's score_superlatives. the points come from the rules' score_weekends kernel.
     
     parameters:
-    quali_order: list, either predicted or actual quali order
-    race_order: list, either predicted or actual race order
+    quali_order: list, either predicted or actual quali order, or a dict of driver to position (sentinel codes included)
+    race_order: list, either predicted or actual race order, or a dict of driver to position (sentinel codes included)
     driver_scores: dict, dict of the drivers' scores
-    driver_gain_loss_overtake: dict, dict of each driver's gain/loss and overtake for the race, as determined by F1 Fantasy folks, hand-entered in google sheet after the race
+    driver_gain_loss_overtake: dict, dict of each driver's gain/loss and overtake for the race, as determined by F1 Fantasy folks, hand-entered in google sheet after the race.
+                               None to work them out from the qualifying and race positions
     constructor_scores: dict, dict of the constructors' scores
     driver_to_construcotr: dict, maps drivers to the constructor they drive for
     constructor_to_driver: dict, maps constructors to their drivers
+    rules: ScoringRules, defaults to default_rules
     
     returns: 
     driver_scores: dict, updated dict that was passed in of the drivers' scores
     constructor_scores: dict, updated dict that was passed in of the constructors' scores
     
     '''
-    # Assumed to have finished the race. Not looking at streaks yet.
+    drivers, _, breakdown = _score_actual_weekend(driver_to_constructor, quali_order, race_order, driver_gain_loss_overtake, rules=rules)
     driver_score_summary = {}
     constructor_score_summary = {}
-    for index, driver in enumerate(race_order):
-        
+    for i, driver in enumerate(drivers):
         constructor = driver_to_constructor[driver]
-        driver_score_summary[driver] = {}
-        driver_score_summary[driver]['constructor'] = constructor
-        driver_points = 0
-        constructor_points = 0
-        
-        driver_gain_loss = driver_gain_loss_overtake[driver]['gain_loss']
-        driver_overtake = driver_gain_loss_overtake[driver]['overtake']
-        
-        # score driver and constructor for positions gained/lost +1/-1
-        driver_points += driver_gain_loss + driver_overtake
-        constructor_points += driver_gain_loss + driver_overtake
-
-        quali_position = quali_order.index(driver) + 1
-        race_position = index + 1
-        
-        driver_score_summary[driver]['quali_position'] = quali_position
-        driver_score_summary[driver]['race_position'] = race_position
-        driver_score_summary[driver]['gain_loss'] = driver_gain_loss
-        driver_score_summary[driver]['overtake'] = driver_overtake
-        
-        # score driver and constructor for finishing position
-        # +1-25 for position
-        position_points = race_position_to_points.get(race_position)
-        if position_points:
-            driver_points += position_points
-            constructor_points += position_points
-        
-        driver_score_summary[driver]['quali_position_points'] = 11 - quali_position if quali_position <=10 else 0
-        driver_score_summary[driver]['race_position_points'] = position_points
         
-        driver_scores = increase_score(driver_scores, driver, driver_points)
-        constructor_scores = increase_score(constructor_scores, constructor, constructor_points)
+        # score driver and constructor for positions gained/lost +1/-1, and finishing position
+        race_points = breakdown['gain_loss'][i] + breakdown['overtake'][i] + breakdown['race_position_points'][i]
+        driver_scores = increase_score(driver_scores, driver, race_points)
+        constructor_scores = increase_score(constructor_scores, constructor, race_points)
         
+        driver_score_summary[driver] = {
+            'constructor': constructor,
+            'quali_position': breakdown['quali_position'][i],
+            'race_position': breakdown['race_position'][i],
+            'gain_loss': breakdown['gain_loss'][i],
+            'overtake': breakdown['overtake'][i],
+            'quali_position_points': breakdown['quali_position_points'][i],
+            'race_position_points': breakdown['race_position_points'][i],
+        }
     
     return driver_scores, constructor_scores, driver_score_summary, constructor_score_summary
 
@@ -319,18 +542,20 @@ def score_qualification_order(
     driver_to_constructor,
     constructor_to_driver,
     driver_score_summary,
-    constructor_score_summary):
+    constructor_score_summary,
+    rules=None):
     '''
-    this scores the quali results for drivers and constructors, whether predicted or actual.
+    this scores the quali results for drivers and constructors, whether predicted or actual, with the rules' score_weekends kernel.
     
     parameters:
-    quali_order: list, names in order of qualifying, either predicted or actual
+    quali_order: list, names in order of qualifying, either predicted or actual, or a dict of driver to position (sentinel codes included)
     driver_scores: dict, dict of the drivers' scores
     constructor_scores, dict, dict of the constructors' scores
     driver_to_construcotr: dict, maps drivers to the constructor they drive for
     constructor_to_driver: dict, maps constructors to their drivers
     driver_score_summary: dict, tracks points and their source attributed to each driver
     constructor_score_summary: dict, tracks points and their sourec attributed to each contstructor
+    rules: ScoringRules, defaults to default_rules
     
     returns:
     driver_scores: dict, updated dict that was passed in of the drivers' scores
@@ -338,61 +563,22 @@ def score_qualification_order(
     driver_score_summary: dict, updated tracking points and their source attributed to each driver
     constructor_score_summary: dict, updated tracking points and their sourec attributed to each contstructor
     '''
+    drivers, constructors, breakdown = _score_actual_weekend(driver_to_constructor, quali_order, rules=rules)
+    
+    # +1-10 for top 10 positions, to the driver and their constructor
+    for i, driver in enumerate(drivers):
+        driver_scores = increase_score(driver_scores, driver, breakdown['quali_position_points'][i])
+    
+    # the constructors' qualifying bonus, based on how far the drivers got
+    for c, constructor in enumerate(constructors):
+        team_quali_score = breakdown['quali_bonus'][c]
+        constructor_scores = increase_score(constructor_scores, constructor, breakdown['constructor_quali_position_points'][c] + team_quali_score)
+        constructor_score_summary[constructor] = {
+            'quali_position_points': breakdown['constructor_quali_position_points'][c],
+            'quali_finish_points': team_quali_score,
+            'quali_results': {d: breakdown['quali_position'][i] for i, d in enumerate(drivers) if driver_to_constructor[d] == constructor},
+        }
     
-    # score drivers' qualification results assuming all qualify and aren't getting negative points
-    for index, driver in enumerate(quali_order):
-        driver_points = 0
-        constructor_points = 0
-        constructor = driver_to_constructor[driver]
-        constructor_score_summary[constructor] = {}
-        
-        # +1-10 for top 10 positions
-        quali_position = index + 1
-        position_points = quali_position_to_points.get(quali_position)
-        position_points = position_points if type(position_points) == int else 0
-        
-        driver_points += position_points
-        constructor_points += position_points
-        
-        driver_scores = increase_score(driver_scores, driver, driver_points)
-        constructor_scores = increase_score(constructor_scores, constructor, constructor_points)
-            
-    # score constructors' qualification results based on how the drivers qualify
-    for constructor, drivers in constructor_to_driver.items():
-        # which qualifying position did each driver finish in
-        driver1_quali_pos, driver2_quali_pos = quali_order.index(drivers[0]) + 1, quali_order.index(drivers[1]) + 1
-        
-        # which qualifying round did each driver finish in
-        driver1_quali_round, driver2_quali_round = quali_result(driver1_quali_pos), quali_result(driver2_quali_pos)
-
-        quali_position_points = sum(map(lambda d: quali_position_to_points[d], [driver1_quali_pos, driver2_quali_pos]))
-
-        qualis = [driver1_quali_round, driver2_quali_round]
-        q3_tot = [x for x in qualis if x == 'Q3']
-        q2_tot = [x for x in qualis if x == 'Q2']
-
-        # q3 finishers
-        if len(q3_tot) == 2:
-            team_quali_score = 10
-        elif len(q3_tot) == 1:
-            team_quali_score = 5
-                
-        # q2 finishers
-        elif len(q2_tot) == 2:
-            team_quali_score = 3
-        elif len(q2_tot) == 1:
-            team_quali_score = 1
-
-        # nobody got past q1
-        else:
-            team_quali_score = -1
-
-        constructor_scores = increase_score(constructor_scores, constructor, team_quali_score)
-        
-        constructor_score_summary[constructor]['quali_position_points'] = quali_position_points
-        constructor_score_summary[constructor]['quali_finish_points'] = team_quali_score
-        constructor_score_summary[constructor]['quali_results'] = {drivers[0]: driver1_quali_pos, drivers[1]: driver2_quali_pos}
-
     return driver_scores, constructor_scores, driver_score_summary, constructor_score_summary
 
 
@@ -406,12 +592,14 @@ def score_superlatives(
     driver_ofthe_day = None,
     fastest_constructor = None,
     second_fastest_constructor = None,
-    third_fastest_constructor = None,):
+    third_fastest_constructor = None,
+    rules = None):
     '''
     This scores the extra bits after the race is over. Fastest driver, driver of the day, fastest, second and third fastest pitstops.
+    The points come from the rules' score_weekends kernel.
     
     params:
-    fastest_driver: string
+    fastest_driver: string, or None
     driver_ofthe_day: string
     fastest_constructor: string
     second_fastest_constructor: string
@@ -419,6 +607,7 @@ def score_superlatives(
     constructor_scores: dictionary
     driver_score_summary: dict, tracks points and their source attributed to each driver
     constructor_score_summary: dict, tracks points and their sourec attributed to each contstructor
+    rules: ScoringRules, defaults to default_rules
     
     returns:
     driver_scores: dictionary
@@ -426,33 +615,22 @@ def score_superlatives(
     driver_score_summary: dict, updated tracking points and their source attributed to each driver
     constructor_score_summary: dict, updated tracking points and their sourec attributed to each contstructor
     '''
+    pitstops = (fastest_constructor, second_fastest_constructor, third_fastest_constructor)
+    drivers, constructors, breakdown = _score_actual_weekend(driver_to_constructor, fastest_lap=fastest_driver, driver_ofthe_day=driver_ofthe_day, pitstops=pitstops, rules=rules)
     
-    # fastest lap
-    driver_scores = increase_score(driver_scores, fastest_driver, 10)
-    constructor_scores = increase_score(constructor_scores, driver_to_constructor[fastest_driver], 10)
-    driver_score_summary[fastest_driver]['fastest_lap'] = 10
-    constructor_score_summary[driver_to_constructor[fastest_driver]]['fastest_lap'] = 10
-    
-    # driver of the day
-    if driver_ofthe_day:
-        driver_scores = increase_score(driver_scores, driver_ofthe_day, 10)
-        driver_score_summary[driver_ofthe_day]['driver_of_the_day'] = 10
-    
-    # fastest pitstop
-    if fastest_constructor:
-        constructor_scores = increase_score(constructor_scores, fastest_constructor, 10)
-        constructor_score_summary[fastest_constructor]['fastest_pitstop'] = 10
+    # fastest lap and driver of the day
+    for award in ['fastest_lap', 'driver_of_the_day']:
+        for i, driver in enumerate(drivers):
+            if breakdown[award][i]:
+                driver_scores = increase_score(driver_scores, driver, breakdown[award][i])
+                driver_score_summary.setdefault(driver, {})[award] = breakdown[award][i]
     
-    # second fastest pitstop
-    if second_fastest_constructor:
-        constructor_scores = increase_score(constructor_scores, second_fastest_constructor, 5)
-        constructor_score_summary[second_fastest_constructor]['second_fastest_pitstop'] = 5
-    
-    # third fastest pitstop
-    if third_fastest_constructor:
-        constructor_scores = increase_score(constructor_scores, third_fastest_constructor, 3)
-        constructor_score_summary[third_fastest_constructor]['third_fastest_pitstop'] = 3
-
+    # the fastest lap driver's constructor, and the fastest, second and third fastest pitstops
+    for award, summary_name in [('constructor_fastest_lap', 'fastest_lap'), ('fastest_pitstop',) * 2, ('second_fastest_pitstop',) * 2, ('third_fastest_pitstop',) * 2]:
+        for c, constructor in enumerate(constructors):
+            if breakdown[award][c]:
+                constructor_scores = increase_score(constructor_scores, constructor, breakdown[award][c])
+                constructor_score_summary.setdefault(constructor, {})[summary_name] = breakdown[award][c]
     
     return driver_scores, constructor_scores, driver_score_summary, constructor_score_summary
 
@@ -468,25 +646,28 @@ def score_race_full(driver_scores,
                driver_ofthe_day,
                fastest_pitstop,
                second_fastest_pitstop,
-               third_fastest_pitstop
+               third_fastest_pitstop,
+               rules=None
               ):
     
     '''
     This function combines all the pieces to score a full race weekend into one function call for the take of taking less space up in the jupyter notebook where its going to be used.
+    Every piece is scored with the rules' score_weekends kernel, the same one the predicted and simulated scoring use.
     
     parameters:
     driver_scores: dict, drivers and their scores
     constructor_scores: dict, constructors and their scores
-    actual_qualifying_order: list, final order of qualifying
-    actual_race_order: list, final order of the race
-    driver_gain_loss_overtake: dict, driver's weekend tally for gain/loss and overtakes
+    actual_qualifying_order: list, final order of qualifying, or a dict of driver to position with the sentinel codes for DNQ/DQ/OUT
+    actual_race_order: list, final order of the race, or a dict of driver to position with the sentinel codes for DNF/DQ/OUT
+    driver_gain_loss_overtake: dict, driver's weekend tally for gain/loss and overtakes, None to work them out from the positions
     driver_to_constructor: dict, driver to constructor mapping
     constructor_to_driver: dict, constructor to driver mapping
-    fastest_lap: str
+    fastest_lap: str or None
     driver_ofthe_day: str or None
     fastest_pitstop: str or None
     second_fastest_pitstop: str or None
     third_fastest_pitstop: str or None
+    rules: ScoringRules, scoring rules of the season, defaults to default_rules
     
     returns:
     driver_scores: dict, final tabulated driver scores for the weekend
@@ -503,7 +684,8 @@ def score_race_full(driver_scores,
         constructor_scores,
         driver_gain_loss_overtake,
         driver_to_constructor,
-        constructor_to_driver)
+        constructor_to_driver,
+        rules)
     
     # score qualifying order
     driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = score_qualification_order(
@@ -513,7 +695,8 @@ def score_race_full(driver_scores,
         driver_to_constructor,
         constructor_to_driver,
         driver_score_summary,
-        constructor_score_summary)
+        constructor_score_summary,
+        rules)
     
     # score superlatives
     driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = score_superlatives(
@@ -526,22 +709,297 @@ def score_race_full(driver_scores,
         driver_ofthe_day,
         fastest_pitstop,
         second_fastest_pitstop,
-        third_fastest_pitstop,)
+        third_fastest_pitstop,
+        rules)
     
     return driver_scores, constructor_scores, driver_score_summary, constructor_score_summary
 
 
+def position_points_lookup(position_to_points):
+    '''
+    turns one of the position to points dicts into a dense array, so a whole column of positions can be scored
+    with numpy indexing instead of a dict lookup per driver. positions without an entry in the dict score 0.
+    
+    parameters:
+    position_to_points: dict, e.g. race_position_to_points
+    
+    returns:
+    lookup: array, lookup[position] is the points for that position
+    '''
+    lookup = np.zeros(max(position_to_points) + 1, dtype=np.int64)
+    for position, points in position_to_points.items():
+        lookup[position] = points
+    return lookup
+
+
+def score_positions(lookup, positions):
+    '''
+    scores an array of positions (any shape) with a lookup from position_points_lookup
+    '''
+    positions = np.asarray(positions).astype(np.int64)
+    in_table = (positions >= 0) & (positions < len(lookup))
+    return np.where(in_table, lookup[np.where(in_table, positions, 0)], 0)
+
+
+def constructor_quali_bonus(q3_count, q2_count, rules=None):
+    '''
+    the constructor bonus for how far its drivers got in qualifying, for arrays of counts of drivers reaching Q3 and Q2
+    both in Q3: +10, one in Q3: +5, both in Q2: +3, one in Q2: +1, nobody got past Q1: -1 (with the default rules)
+    '''
+    return (rules or default_rules).constructor_bonus(q3_count, q2_count)
+
+
+class ScoringRules:
+    '''
+    the scoring rules of one fantasy season, compiled into dense arrays so the predicted, actual and simulated scorers all
+    run the same batched kernel, score_weekends. positions index straight into the points arrays, sentinel codes
+    (100 OUT, 200 DNF, 300 DNQ, 400 DQ) included, and positions without an entry score 0.
+    
+    a season with different rules is a new entry in season_rules, or a json file loaded with from_json, not a code change.
+    
+    parameters:
+    race_position_to_points: dict, race finishing position (or sentinel code) to points
+    quali_position_to_points: dict, qualifying position (or sentinel code) to points
+    sprint_position_to_points: dict, sprint finishing position (or sentinel code) to points
+    quali_bonus_points: dict, constructor qualifying bonus for 'both_q3', 'one_q3', 'both_q2', 'one_q2' and 'neither'
+                        (nobody got past Q1). a constructor with a driver in Q3 gets one of the Q3 bonuses.
+    superlative_points: dict, points for 'fastest_lap' (driver, and constructor in the actual scoring), 'fastest_sprint_lap',
+                        'driver_of_the_day', 'fastest_pitstop', 'second_fastest_pitstop' and 'third_fastest_pitstop'
+    q3_cutoff: int, the last qualifying position that makes it into Q3
+    q2_cutoff: int, the last qualifying position that makes it into Q2
+    '''
+    def __init__(
+        self,
+        race_position_to_points,
+        quali_position_to_points,
+        sprint_position_to_points,
+        quali_bonus_points,
+        superlative_points,
+        q3_cutoff=10,
+        q2_cutoff=15):
+        
+        self.race_position_to_points = dict(race_position_to_points)
+        self.quali_position_to_points = dict(quali_position_to_points)
+        self.sprint_position_to_points = dict(sprint_position_to_points)
+        self.quali_bonus_points = dict(quali_bonus_points)
+        self.superlative_points = dict(superlative_points)
+        self.q3_cutoff = q3_cutoff
+        self.q2_cutoff = q2_cutoff
+        
+        self.race_points = position_points_lookup(self.race_position_to_points)
+        self.quali_points = position_points_lookup(self.quali_position_to_points)
+        self.sprint_points = position_points_lookup(self.sprint_position_to_points)
+        
+        # bonus_table[drivers in Q3, drivers in Q2]
+        self.bonus_table = np.full((3, 3), self.quali_bonus_points['neither'], dtype=np.int64)
+        self.bonus_table[0, 1] = self.quali_bonus_points['one_q2']
+        self.bonus_table[0, 2] = self.quali_bonus_points['both_q2']
+        self.bonus_table[1, :] = self.quali_bonus_points['one_q3']
+        self.bonus_table[2, :] = self.quali_bonus_points['both_q3']
+    
+    def to_dict(self):
+        return {
+            'race_position_to_points': self.race_position_to_points,
+            'quali_position_to_points': self.quali_position_to_points,
+            'sprint_position_to_points': self.sprint_position_to_points,
+            'quali_bonus_points': self.quali_bonus_points,
+            'superlative_points': self.superlative_points,
+            'q3_cutoff': self.q3_cutoff,
+            'q2_cutoff': self.q2_cutoff,
+        }
+    
+    @classmethod
+    def from_dict(cls, rules):
+        '''
+        rules from a dict shaped like to_dict, e.g. read from json, where the positions are string keys
+        '''
+        rules = dict(rules)
+        for table in ['race_position_to_points', 'quali_position_to_points', 'sprint_position_to_points']:
+            rules[table] = {int(position): points for position, points in rules[table].items()}
+        return cls(**rules)
+    
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+    
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+    
+    def constructor_bonus(self, q3_count, q2_count):
+        '''
+        constructor qualifying bonus for arrays of how many of its drivers reached Q3 and (only) Q2
+        '''
+        return self.bonus_table[np.minimum(q3_count, 2), np.minimum(q2_count, 2)]
+    
+    def score_weekends(
+        self,
+        quali_positions,
+        race_positions,
+        membership,
+        sprint_quali_positions=None,
+        sprint_race_positions=None,
+        sprint_weekends=None,
+        gain_loss=None,
+        overtake=None,
+        fastest_lap=None,
+        driver_of_the_day=None,
+        pitstops=None,
+        constructor_fastest_lap=True):
+        '''
+        the batched scoring kernel. scores N weekends at once, one row per weekend, e.g. the predictions for several tracks,
+        or N simulated orders of the same weekend.
+        
+        drivers score their race, qualifying and sprint position points, positions gained/lost and overtakes (from qualifying
+        to the race, and sprint qualifying to the sprint), the fastest lap and driver of the day. constructors score the sum of
+        their drivers' points before the superlatives, the qualifying bonus, the fastest lap of their driver (unless
+        constructor_fastest_lap is False) and the pitstop awards. a driver without a qualifying position starts from the back,
+        and a driver that doesn't finish (a sentinel code) gains or loses no positions.
+        
+        parameters:
+        quali_positions: array, N x drivers array of qualifying positions
+        race_positions: array, N x drivers array of race positions
+        membership: array, drivers x constructors array, 1 where the driver drives for the constructor
+        sprint_quali_positions: array, N x drivers array of sprint qualifying positions, None if there are no sprints
+        sprint_race_positions: array, N x drivers array of sprint race positions, None if there are no sprints
+        sprint_weekends: array, N bools, which rows are sprint weekends, all of them if not given
+        gain_loss: array, N x drivers array of positions gained/lost, worked out from the positions if not given
+        overtake: array, N x drivers array of overtakes, worked out from the positions if not given
+        fastest_lap: array, N driver indexes (-1 for nobody), the race winner if not given
+        driver_of_the_day: array, N driver indexes (-1 for nobody), nobody if not given
+        pitstops: array, N x 3 constructor indexes (-1 for nobody) of the fastest, second and third fastest pitstops
+        constructor_fastest_lap: bool, if False the fastest lap only counts for the driver
+        
+        returns:
+        driver_points: array, N x drivers array of driver scores
+        constructor_points: array, N x constructors array of constructor scores
+        breakdown: dict, each part of the scores as an N x drivers or N x constructors array
+        '''
+        quali_positions = np.asarray(quali_positions)
+        race_positions = np.asarray(race_positions)
+        membership = np.asarray(membership, dtype=np.int64)
+        n_weekends, n_drivers = race_positions.shape
+        n_constructors = membership.shape[1]
+        weekends = np.arange(n_weekends)
+        
+        def gain_loss_overtake(start_positions, finish_positions):
+            start = np.where(start_positions > n_drivers, n_drivers, start_positions)
+            gain_loss = np.where(finish_positions <= n_drivers, start - finish_positions, 0)
+            return gain_loss, np.maximum(gain_loss, 0)
+        
+        def winners(positions):
+            # the driver in first place in each row, -1 if nobody is
+            if n_drivers == 0:
+                return np.full(n_weekends, -1)
+            winner = np.argmin(positions, axis=1)
+            return np.where(positions[weekends, winner] == 1, winner, -1)
+        
+        def award(indexes, size, points):
+            # points for the one driver or constructor index of each row, -1 means nobody
+            indexes = np.asarray(indexes)
+            awarded = np.zeros((n_weekends, size), dtype=np.int64)
+            awarded[weekends[indexes >= 0], indexes[indexes >= 0]] = points
+            return awarded
+        
+        breakdown = {
+            'race_position_points': score_positions(self.race_points, race_positions),
+            'quali_position_points': score_positions(self.quali_points, quali_positions),
+        }
+        if gain_loss is None:
+            gain_loss, overtake = gain_loss_overtake(quali_positions, race_positions)
+        breakdown['gain_loss'], breakdown['overtake'] = gain_loss, overtake
+        driver_points = breakdown['race_position_points'] + breakdown['quali_position_points'] + gain_loss + overtake
+        
+        # there are no points for sprint qualifying position, only sprint finish position
+        if sprint_race_positions is not None:
+            sprint_weekends = np.ones(n_weekends, dtype=bool) if sprint_weekends is None else np.asarray(sprint_weekends, dtype=bool)
+            sprint_gain_loss, sprint_overtake = gain_loss_overtake(np.asarray(sprint_quali_positions), np.asarray(sprint_race_positions))
+            breakdown['sprint_position_points'] = np.where(sprint_weekends[:, None], score_positions(self.sprint_points, sprint_race_positions), 0)
+            breakdown['sprint_gain_loss'] = np.where(sprint_weekends[:, None], sprint_gain_loss, 0)
+            breakdown['sprint_overtake'] = np.where(sprint_weekends[:, None], sprint_overtake, 0)
+            driver_points = driver_points + breakdown['sprint_position_points'] + breakdown['sprint_gain_loss'] + breakdown['sprint_overtake']
+        
+        # constructors get their drivers' points plus the qualifying bonus
+        constructor_points = driver_points @ membership
+        breakdown['constructor_quali_position_points'] = breakdown['quali_position_points'] @ membership
+        q3_count = (quali_positions <= self.q3_cutoff).astype(np.int64) @ membership
+        q2_count = ((quali_positions > self.q3_cutoff) & (quali_positions <= self.q2_cutoff)).astype(np.int64) @ membership
+        breakdown['quali_bonus'] = self.constructor_bonus(q3_count, q2_count)
+        constructor_points = constructor_points + breakdown['quali_bonus']
+        
+        # fastest lap, to the race winner unless it's known
+        if fastest_lap is None:
+            fastest_lap = winners(race_positions)
+        breakdown['fastest_lap'] = award(fastest_lap, n_drivers, self.superlative_points['fastest_lap'])
+        driver_points = driver_points + breakdown['fastest_lap']
+        if constructor_fastest_lap:
+            breakdown['constructor_fastest_lap'] = breakdown['fastest_lap'] @ membership
+            constructor_points = constructor_points + breakdown['constructor_fastest_lap']
+        
+        # fastest sprint lap to the sprint winner
+        if sprint_race_positions is not None:
+            sprint_winner = np.where(sprint_weekends, winners(np.asarray(sprint_race_positions)), -1)
+            breakdown['fastest_sprint_lap'] = award(sprint_winner, n_drivers, self.superlative_points['fastest_sprint_lap'])
+            driver_points = driver_points + breakdown['fastest_sprint_lap']
+        
+        if driver_of_the_day is not None:
+            breakdown['driver_of_the_day'] = award(driver_of_the_day, n_drivers, self.superlative_points['driver_of_the_day'])
+            driver_points = driver_points + breakdown['driver_of_the_day']
+        
+        if pitstops is not None:
+            pitstops = np.asarray(pitstops).reshape(n_weekends, 3)
+            for rank, award_name in enumerate(['fastest_pitstop', 'second_fastest_pitstop', 'third_fastest_pitstop']):
+                breakdown[award_name] = award(pitstops[:, rank], n_constructors, self.superlative_points[award_name])
+                constructor_points = constructor_points + breakdown[award_name]
+        
+        return driver_points, constructor_points, breakdown
+
+
+# the scoring rules of each season, the points dicts above are this season's
+season_rules = {
+    2024: ScoringRules(
+        race_position_to_points,
+        quali_position_to_points,
+        sprint_position_to_points,
+        quali_bonus_points={'both_q3': 10, 'one_q3': 5, 'both_q2': 3, 'one_q2': 1, 'neither': -1},
+        superlative_points={
+            'fastest_lap': 10,
+            'fastest_sprint_lap': 5,
+            'driver_of_the_day': 10,
+            'fastest_pitstop': 10,
+            'second_fastest_pitstop': 5,
+            'third_fastest_pitstop': 3,
+        }),
+}
+
+# the rules the scorers use when they aren't given any
+default_rules = season_rules[2024]
+
+
+def constructor_membership(teams, constructors):
+    '''
+    drivers x constructors array, 1 where a driver (given by the constructor in teams) drives for the constructor
+    '''
+    return (np.asarray(teams)[:, None] == np.asarray(constructors)[None, :]).astype(np.int64)
+
+
 def score_race_qualifying_sprint_predicted(
     weekend_df,
-    track_name):
+    track_name,
+    rules=None):
     '''
     this function scores the predicted race and qualifying results in one go. only the predicted results. it also scores the sprint predictions if its a sprint race weekend.
     it takes the predicted from qualifying and the race, awards points for positions gained/lost and overtakes, and awards points for finish order in qualifying and in the race. same logic for the sprint. there are no points awarded for sprint qualifying position, only sprint finish position.
     it awards fastest lap to the race winner because usually that's how it goes, but not always.
     
+    the scoring is done with the batched ScoringRules.score_weekends kernel, one row per track. if track_name is a list,
+    the predicted columns of every track in it are scored together, e.g. for a dataframe with a whole season of predicted columns.
+    
     parameters:
-    track_name: str, track name as it appears in the sheet_gid dict for the purpose of loading the correct track.
-    predicted_df: dataframe, a sub-df of the weekend_df that only has predicted qualifying and race positions for each driver, and non participations removed
+    weekend_df: dataframe, weekend dataframe with the predicted qualifying and race positions for each driver (and sprint, if a sprint weekend)
+    track_name: str, track name as it appears in the sheet_gid dict for the purpose of loading the correct track. or a list of track names.
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
     
     returns: 
     drivers: list
@@ -550,137 +1008,477 @@ def score_race_qualifying_sprint_predicted(
     constructor_scores: dict, dict of the constructors' scores
     driver_score_summary: dict, breaking down the pieces of the drivers' scores
     constructor_score_summary: dict, breaking down the pieces of the constructors' scores
+    
+    if track_name is a list, a dict is returned instead with the track names as keys and the above tuple as values
     '''
+    track_names = [track_name] if isinstance(track_name, str) else list(track_name)
     
-    # check if sprint race for scoring
-    sprint_flag = False
-    for col in weekend_df.columns:
-        if 'sprint' in col:
-            sprint_flag = True
-            print(f'{track_name.capitalize()} is a Sprint Race Weekend.')
-            break
-            
     # some setup
     cols = ['Team', 'Driver']
     cols.extend([x for x in weekend_df.columns if 'predicted' in x])
     predicted_df = weekend_df[cols]
-    driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = {}, {}, {}, {}
-    driver_to_constructor, constructor_to_driver = driver_constructor_mappings(predicted_df)
-    predicted_qualifying_order = predicted_df.sort_values(by=[f'predicted_qualifying_{track_name}'])['Driver'].tolist()
-    
-    # Score race and qualifying order. Assume all drivers posted a qualifying time and finished the race.
-    for driver in predicted_df.Driver:
-        constructor = predicted_df.loc[predicted_df.Driver == driver]['Team'].values[0]
-        driver_score_summary[driver] = {}
-        driver_score_summary[driver]['constructor'] = constructor
-        driver_score_summary[driver]['sprint_race'] = sprint_flag
-        driver_points = 0
-        constructor_points = 0
-        
-        # score quali and race positions, and determine gain/loss and overtakes
-        quali_position = predicted_df.loc[predicted_df.Driver == driver][f'predicted_qualifying_{track_name}'].values[0]
-        race_position = predicted_df.loc[predicted_df.Driver == driver][f'predicted_race_{track_name}'].values[0]
-
-        # assume gain/loss and overtakes are strictly due to difference between qualifying and race positions
-        # overtakes cannot be negative
-        driver_gain_loss = quali_position - race_position
-        driver_overtake = (driver_gain_loss if driver_gain_loss >= 0 else 0)
-        
-        driver_score_summary[driver]['quali_position'] = quali_position
-        driver_score_summary[driver]['race_position'] = race_position
-        driver_score_summary[driver]['gain_loss'] = driver_gain_loss
-        driver_score_summary[driver]['overtake'] = driver_overtake
-        
-        # score driver and constructor for finishing position
-        # +1-25 for position
-        race_position_points = race_position_to_points.get(race_position)
-        quali_position_points = quali_position_to_points.get(quali_position)
-        
-        # score sprint predictions
-        sprint_position_points, driver_sprint_gain_loss, driver_sprint_overtake = 0, 0, 0
-        
+    drivers = predicted_df.Driver.tolist()
+    teams = predicted_df.Team.to_numpy()
+    constructors = predicted_df.Team.unique()
+    
+    # check which tracks are sprint race weekends for scoring
+    sprint_flags = []
+    for track in track_names:
+        sprint_flag = f'predicted_sprint_race_{track}' in predicted_df.columns
         if sprint_flag:
-            sprint_quali_position = predicted_df.loc[predicted_df.Driver == driver][f'predicted_sprint_qualifying_{track_name}'].values[0]
-            sprint_race_position = predicted_df.loc[predicted_df.Driver == driver][f'predicted_sprint_race_{track_name}'].values[0]
-            
-            driver_sprint_gain_loss = sprint_quali_position - sprint_race_position
-            driver_sprint_overtake = (driver_sprint_gain_loss if driver_sprint_gain_loss >= 0 else 0)
-            sprint_position_points = sprint_position_to_points.get(sprint_race_position)
-
-            driver_score_summary[driver]['sprint_quali_position'] = sprint_quali_position
-            driver_score_summary[driver]['sprint_race_position'] = sprint_race_position
-            driver_score_summary[driver]['sprint_gain_loss'] = driver_sprint_gain_loss
-            driver_score_summary[driver]['sprint_overtake'] = driver_sprint_overtake
-            driver_score_summary[driver]['sprint_position_points'] = sprint_position_points
-        
-        # tally up the gain/loss, overtake, race position points, and quali position points
-        driver_points += driver_gain_loss + driver_overtake + race_position_points + quali_position_points + sprint_position_points + driver_sprint_gain_loss + driver_sprint_overtake
-        constructor_points += driver_gain_loss + driver_overtake + race_position_points + quali_position_points + sprint_position_points + driver_sprint_gain_loss + driver_sprint_overtake
-        
-        driver_score_summary[driver]['quali_position_points'] = quali_position_points
-        driver_score_summary[driver]['race_position_points'] = race_position_points
-        
-        driver_scores = increase_score(driver_scores, driver, driver_points)
-        constructor_scores = increase_score(constructor_scores, constructor, constructor_points)
+            print(f'{track.capitalize()} is a Sprint Race Weekend.')
+        sprint_flags.append(sprint_flag)
+    sprint_flags = np.array(sprint_flags)
     
+    # one column per track, one row per driver. non sprint tracks get a placeholder sprint column that scores nothing
+    def position_columns(column_format, fill=None):
+        columns = []
+        for track in track_names:
+            column = column_format.format(track)
+            columns.append(predicted_df[column].to_numpy() if fill is None or column in predicted_df.columns else np.full(len(predicted_df), fill))
+        return np.column_stack(columns) if columns else np.zeros((len(predicted_df), 0))
+    
+    quali_positions = position_columns('predicted_qualifying_{}')
+    race_positions = position_columns('predicted_race_{}')
+    sprint_quali_positions = position_columns('predicted_sprint_qualifying_{}', fill=0)
+    sprint_race_positions = position_columns('predicted_sprint_race_{}', fill=0)
+    
+    # Score race and qualifying order, one row per track. Assume all drivers posted a qualifying time and finished the race.
+    # gain/loss and overtakes are strictly due to difference between qualifying and race positions
+    # fastest lap goes to the race winner (+5 for the fastest sprint lap to the sprint winner), only for the driver
+    driver_points, constructor_points, breakdown = (rules or default_rules).score_weekends(
+        quali_positions.T,
+        race_positions.T,
+        constructor_membership(teams, constructors),
+        sprint_quali_positions.T,
+        sprint_race_positions.T,
+        sprint_weekends=sprint_flags,
+        constructor_fastest_lap=False)
+    
+    # back to one row per driver, one column per track
+    driver_points, constructor_points = driver_points.T, constructor_points.T
+    gain_loss, overtake = breakdown['gain_loss'].T, breakdown['overtake'].T
+    race_position_points, quali_position_points = breakdown['race_position_points'].T, breakdown['quali_position_points'].T
+    sprint_gain_loss, sprint_overtake = breakdown['sprint_gain_loss'].T, breakdown['sprint_overtake'].T
+    sprint_position_points = breakdown['sprint_position_points'].T
+    constructor_quali_position_points = breakdown['constructor_quali_position_points'].T
+    team_quali_score = breakdown['quali_bonus'].T
+    
+    # put the arrays back into the per driver and per constructor dicts, one set per track
+    results = {}
+    for t, track in enumerate(track_names):
+        driver_scores = dict(zip(drivers, driver_points[:, t].tolist()))
+        constructor_scores = dict(zip(constructors, constructor_points[:, t].tolist()))
         
-    # Score constructors' qualification results based on how the drivers qualify. Assume all drivers post a qualifying position
-    for constructor in predicted_df.Team.unique():
-        constructor_score_summary[constructor] = {}
-        
-        # which qualifying position did each driver finish in
-        team_qualifying_positions = predicted_df.loc[predicted_df.Team == constructor][f'predicted_qualifying_{track_name}'].tolist()
+        driver_score_summary = {}
+        for i, driver in enumerate(drivers):
+            driver_score_summary[driver] = {
+                'constructor': teams[i],
+                'sprint_race': bool(sprint_flags[t]),
+                'quali_position': quali_positions[i, t],
+                'race_position': race_positions[i, t],
+                'gain_loss': gain_loss[i, t],
+                'overtake': overtake[i, t],
+            }
+            if sprint_flags[t]:
+                driver_score_summary[driver]['sprint_quali_position'] = sprint_quali_positions[i, t]
+                driver_score_summary[driver]['sprint_race_position'] = sprint_race_positions[i, t]
+                driver_score_summary[driver]['sprint_gain_loss'] = sprint_gain_loss[i, t]
+                driver_score_summary[driver]['sprint_overtake'] = sprint_overtake[i, t]
+                driver_score_summary[driver]['sprint_position_points'] = sprint_position_points[i, t]
+            driver_score_summary[driver]['quali_position_points'] = quali_position_points[i, t]
+            driver_score_summary[driver]['race_position_points'] = race_position_points[i, t]
         
-        # which qualifying round did each driver finish in
-        team_qualifying_rounds = list(map(lambda p: quali_result(p), team_qualifying_positions))
+        constructor_score_summary = {}
+        for c, constructor in enumerate(constructors):
+            on_team = teams == constructor
+            constructor_score_summary[constructor] = {
+                'quali_position': dict(zip(predicted_df.Driver.to_numpy()[on_team], quali_positions[on_team, t])),
+                'quali_position_points': constructor_quali_position_points[c, t],
+                'quali_finish_points': team_quali_score[c, t],
+            }
         
-        # points for qualifying positions
-        quali_position_points = sum(map(lambda d: quali_position_to_points[d], team_qualifying_positions))
+        results[track] = (drivers, constructors, driver_scores, constructor_scores, driver_score_summary, constructor_score_summary)
+    
+    if isinstance(track_name, str):
+        return results[track_name]
+    return results
 
-        q3_tot = [x for x in team_qualifying_rounds if x == 'Q3']
-        q2_tot = [x for x in team_qualifying_rounds if x == 'Q2']
 
-        # q3 finishers
-        if len(q3_tot) == 2:
-            team_quali_score = 10
-        elif len(q3_tot) == 1:
-            team_quali_score = 5
-                
-        # q2 finishers
-        elif len(q2_tot) == 2:
-            team_quali_score = 3
-        elif len(q2_tot) == 1:
-            team_quali_score = 1
+def sample_session_positions(
+    rng,
+    predicted_positions,
+    n_samples,
+    position_noise,
+    retirement_code=None,
+    retirement_probability=0,
+    dq_probability=0):
+    '''
+    samples finishing orders for one session around each driver's predicted position. each driver's pace is their
+    predicted position plus normally distributed noise, and the sampled order is the ranking of those paces.
+    drivers predicted as OUT (100) stay out of every sample, and any other sentinel prediction starts from the back.
+    drivers that retire (retirement_code, i.e. 200 for DNF or 300 for DNQ) or are disqualified (400) get that code
+    and the remaining drivers are ranked 1, 2, 3, ... among themselves.
+    
+    parameters:
+    rng: numpy Generator
+    predicted_positions: array, predicted position of each driver
+    n_samples: int, number of orders to sample
+    position_noise: float or array, standard deviation in positions of each driver's pace
+    retirement_code: int, sentinel code for a retirement in this session, None if there are no retirements
+    retirement_probability: float or array, chance of each driver retiring
+    dq_probability: float or array, chance of each driver being disqualified
+    
+    returns:
+    positions: array, n_samples x drivers array of sampled positions, with sentinel codes for drivers that didn't finish
+    '''
+    predicted_positions = np.asarray(predicted_positions).astype(np.int64)
+    n_drivers = len(predicted_positions)
+    out = predicted_positions == 100
+    start = np.where(predicted_positions > n_drivers, n_drivers, predicted_positions)
+    
+    pace = start + rng.normal(0, 1, (n_samples, n_drivers)) * position_noise
+    codes = np.zeros((n_samples, n_drivers), dtype=np.int64)
+    if retirement_code is not None:
+        codes[rng.random((n_samples, n_drivers)) < retirement_probability] = retirement_code
+    codes[(codes == 0) & (rng.random((n_samples, n_drivers)) < dq_probability)] = 400
+    codes[:, out] = 100
+    
+    # rank the drivers that finished, everyone else gets their code
+    pace[codes > 0] = np.inf
+    positions = np.argsort(np.argsort(pace, axis=1), axis=1) + 1
+    return np.where(codes > 0, codes, positions)
 
-        # nobody got past q1
-        else:
-            team_quali_score = -1
-            
-        constructor_scores = increase_score(constructor_scores, constructor, team_quali_score)
-        
-        constructor_score_summary[constructor]['quali_position'] = {q[0]: q[1] for q in predicted_df.loc[predicted_df.Team == constructor][['Driver', f'predicted_qualifying_{track_name}']].values}
-        constructor_score_summary[constructor]['quali_position_points'] = quali_position_points
-        constructor_score_summary[constructor]['quali_finish_points'] = team_quali_score
+
+def score_simulated_weekends(
+    quali_positions,
+    race_positions,
+    teams,
+    constructors,
+    sprint_quali_positions=None,
+    sprint_race_positions=None,
+    rules=None):
+    '''
+    scores many simulated weekends in one batched pass with the ScoringRules.score_weekends kernel, following the same rules as score_race_full:
+    race and qualifying position points, positions gained/lost and overtakes, the constructor qualifying bonus,
+    and the fastest lap for the driver and constructor of the race winner. sprint results are scored like
+    score_race_qualifying_sprint_predicted does, with the fastest sprint lap for the sprint winner.
+    drivers that don't finish get the sentinel code points and no gain/loss or overtakes, and a driver without a
+    qualifying position starts the race from the back.
+    
+    parameters:
+    quali_positions: array, samples x drivers array of qualifying positions
+    race_positions: array, samples x drivers array of race positions
+    teams: array, the constructor of each driver
+    constructors: array, constructor names, the order of the constructor columns in the result
+    sprint_quali_positions: array, samples x drivers array of sprint qualifying positions, None if not a sprint weekend
+    sprint_race_positions: array, samples x drivers array of sprint race positions, None if not a sprint weekend
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
+    
+    returns:
+    driver_points: array, samples x drivers array of driver scores
+    constructor_points: array, samples x constructors array of constructor scores
+    '''
+    driver_points, constructor_points, _ = (rules or default_rules).score_weekends(
+        quali_positions,
+        race_positions,
+        constructor_membership(teams, constructors),
+        sprint_quali_positions,
+        sprint_race_positions)
+    
+    return driver_points, constructor_points
+
+
+def _simulate_weekend_chunk(
+    seed_sequence,
+    n_samples,
+    teams,
+    constructors,
+    predicted_quali,
+    predicted_race,
+    predicted_sprint_quali,
+    predicted_sprint_race,
+    position_noise,
+    dnf_probability,
+    dnq_probability,
+    dq_probability,
+    rules):
+    '''
+    samples and scores one chunk of simulated weekends, used by simulate_race_weekend on its own or on a process pool
+    '''
+    rng = np.random.default_rng(seed_sequence)
+    quali = sample_session_positions(rng, predicted_quali, n_samples, position_noise, 300, dnq_probability, dq_probability)
+    race = sample_session_positions(rng, predicted_race, n_samples, position_noise, 200, dnf_probability, dq_probability)
+    sprint_quali, sprint_race = None, None
+    if predicted_sprint_race is not None:
+        sprint_quali = sample_session_positions(rng, predicted_sprint_quali, n_samples, position_noise)
+        sprint_race = sample_session_positions(rng, predicted_sprint_race, n_samples, position_noise, 200, dnf_probability, dq_probability)
+    
+    return score_simulated_weekends(quali, race, teams, constructors, sprint_quali, sprint_race, rules)
+
+
+def simulate_race_weekend(
+    weekend_df,
+    track_name,
+    n_samples = 10000,
+    position_noise = 3.0,
+    dnf_probability = 0.05,
+    dnq_probability = 0.01,
+    dq_probability = 0.002,
+    seed = None,
+    workers = 1,
+    chunk_size = 2500,
+    rules = None):
+    '''
+    Monte Carlo simulation of a race weekend around the predicted positions, to see the spread of points each driver and
+    constructor could score instead of just the single predicted order (e.g. Verstappen's DNF in Australia).
+    qualifying, sprint and race orders are sampled with sample_session_positions, including DNF (200), DNQ (300) and
+    DQ (400) codes, and all samples are scored at once with score_simulated_weekends.
+    
+    the samples are split into chunks that each get their own seed spawned from seed, so the results are the same
+    for a given seed whatever the number of workers.
+    
+    parameters:
+    weekend_df: dataframe, weekend dataframe with the predicted positions for each driver
+    track_name: str, track name as it appears in the sheet_gid dict
+    n_samples: int, number of weekends to simulate
+    position_noise: float or array, standard deviation in positions around each driver's predicted position
+    dnf_probability: float or array, chance of each driver not finishing the race (or sprint)
+    dnq_probability: float or array, chance of each driver not setting a qualifying time
+    dq_probability: float or array, chance of each driver being disqualified from a session
+    seed: int, seed for the random numbers
+    workers: int, number of processes to simulate on
+    chunk_size: int, number of weekends simulated per chunk
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
+    
+    returns:
+    driver_samples: dataframe, one row per simulated weekend and one column per driver of their score
+    constructor_samples: dataframe, one row per simulated weekend and one column per constructor of their score
+    '''
+    drivers = weekend_df.Driver.tolist()
+    teams = weekend_df.Team.to_numpy()
+    constructors = weekend_df.Team.unique()
+    sprint_flag = f'predicted_sprint_race_{track_name}' in weekend_df.columns
+    
+    chunk_sizes = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    chunk_args = [(
+        seed_sequence,
+        size,
+        teams,
+        constructors,
+        weekend_df[f'predicted_qualifying_{track_name}'].to_numpy(),
+        weekend_df[f'predicted_race_{track_name}'].to_numpy(),
+        weekend_df[f'predicted_sprint_qualifying_{track_name}'].to_numpy() if sprint_flag else None,
+        weekend_df[f'predicted_sprint_race_{track_name}'].to_numpy() if sprint_flag else None,
+        position_noise,
+        dnf_probability,
+        dnq_probability,
+        dq_probability,
+        rules) for seed_sequence, size in zip(seed_sequences, chunk_sizes)]
+    
+    if workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_weekend_chunk, *zip(*chunk_args)))
+    else:
+        results = [_simulate_weekend_chunk(*args) for args in chunk_args]
+    
+    driver_samples = pd.DataFrame(np.concatenate([r[0] for r in results]), columns=drivers)
+    constructor_samples = pd.DataFrame(np.concatenate([r[1] for r in results]), columns=constructors)
+    
+    return driver_samples, constructor_samples
+
+
+class RiskObjective:
+    '''
+    risk adjusted objective for the team search, so two teams with the same expected points but different risk (e.g. both
+    drivers and the constructor of one team, who all lose out together when that car has a bad weekend) aren't ranked the same.
+    teams are ranked by their mean points less a multiple of the standard deviation of their points, worked out from the
+    covariance of the driver and constructor scores:
+    
+    'stdev': mean - risk_aversion * stdev
+    'cvar': expected points of the worst alpha share of weekends, taking a team's points as normally distributed,
+            which is mean - stdev * pdf(z_alpha) / alpha
+    
+    the covariance only has to be worked out once per weekend, see CombinationTables.score_stdev_grid for how it's used.
+    
+    parameters:
+    driver_scores: dict, mean score of each driver
+    constructor_scores: dict, mean score of each constructor
+    covariance: dataframe, covariance of the driver and constructor scores, with the driver and constructor names as its index and columns
+    measure: str, 'stdev' or 'cvar'
+    risk_aversion: float, standard deviations taken off the mean with the 'stdev' measure
+    alpha: float, share of the worst weekends averaged with the 'cvar' measure
+    '''
+    def __init__(self, driver_scores, constructor_scores, covariance, measure='stdev', risk_aversion=1.0, alpha=0.1):
+        if measure not in ('stdev', 'cvar'):
+            raise ValueError(f'Unknown risk measure {measure}, it has to be stdev or cvar.')
+        self.driver_scores = dict(driver_scores)
+        self.constructor_scores = dict(constructor_scores)
+        self.covariance = covariance
+        self.measure = measure
+        self.risk_aversion = risk_aversion
+        self.alpha = alpha
+    
+    @classmethod
+    def from_samples(cls, driver_samples, constructor_samples, **kwargs):
+        '''
+        the mean scores and covariance of a scenario matrix, e.g. the simulated weekends from simulate_race_weekend
         
-    # award fastest lap scores, +10 for fastest race lap, +5 for fastest sprint lap
-    fastest_driver = predicted_df.sort_values(f'predicted_race_{track_name}')['Driver'].tolist()[0]
-    driver_scores = increase_score(driver_scores, fastest_driver, 10)
+        parameters:
+        driver_samples: dataframe, one row per scenario and one column per driver of their score
+        constructor_samples: dataframe, one row per scenario and one column per constructor of their score, in the same scenario order
+        kwargs: measure, risk_aversion and alpha, see RiskObjective
+        '''
+        samples = pd.concat([driver_samples.reset_index(drop=True), constructor_samples.reset_index(drop=True)], axis=1).astype(float)
+        means = samples.mean()
+        return cls(means[driver_samples.columns].to_dict(), means[constructor_samples.columns].to_dict(), samples.cov(), **kwargs)
+    
+    @property
+    def stdev_multiplier(self):
+        '''
+        standard deviations taken off a team's mean points
+        '''
+        if self.measure == 'cvar':
+            normal = statistics.NormalDist()
+            return normal.pdf(normal.inv_cdf(self.alpha)) / self.alpha
+        return self.risk_aversion
+    
+    def covariance_array(self, drivers, constructors):
+        '''
+        the covariance as an array, the drivers and then the constructors in the order given
+        '''
+        names = list(drivers) + list(constructors)
+        return self.covariance.loc[names, names].to_numpy(dtype=float)
+    
+    def __str__(self):
+        if self.measure == 'cvar':
+            return f'expected points of the worst {self.alpha:.0%} of weekends'
+        return f'mean points - {self.risk_aversion} x stdev'
+
+
+_byte_popcount = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def popcount(masks):
+    '''
+    number of set bits in each of an array of bitmasks, e.g. how many drivers a roster bitmask has
+    
+    parameters:
+    masks: array of unsigned integer bitmasks
+    
+    returns:
+    array of int64 bit counts, the same shape as masks
+    '''
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(masks).astype(np.int64)
+    
+    # numpy before 2.0 has no bitwise_count, so count the bits a byte at a time
+    return _byte_popcount[masks.reshape(-1, 1).view(np.uint8)].sum(axis=1).reshape(masks.shape)
 
-    fastest_sprint_driver = predicted_df.sort_values(f'predicted_sprint_race_{track_name}')['Driver'].tolist()[0]
-    driver_scores = increase_score(driver_scores, fastest_sprint_driver, 5)
 
-    return predicted_df.Driver.tolist(), predicted_df.Team.unique(), driver_scores, constructor_scores, driver_score_summary, constructor_score_summary
+class Roster:
+    '''
+    integer codes for a weekend's drivers and constructors. a driver's code is their index in drivers, and a set of drivers
+    (a team, or my current team) is a bitmask with bit code set for each of them, the same for constructors. with teams as
+    bitmasks, the substitutions between two teams are the popcount of one masked out of the other, and equality or overlap
+    checks are single bit operations, instead of scanning lists of names.
+    
+    names are only needed to show a team, see Team.
+    
+    parameters:
+    drivers: list, driver names, in code order
+    constructors: list, constructor names, in code order
+    '''
+    def __init__(self, drivers, constructors):
+        self.drivers = list(drivers)
+        self.constructors = list(constructors)
+        self.driver_codes = {d: i for i, d in enumerate(self.drivers)}
+        self.constructor_codes = {c: i for i, c in enumerate(self.constructors)}
+    
+    def driver_mask(self, drivers):
+        '''
+        bitmask of the named drivers, names the roster doesn't have are left out
+        '''
+        return sum(1 << self.driver_codes[d] for d in set(drivers) if d in self.driver_codes)
+    
+    def constructor_mask(self, constructors):
+        '''
+        bitmask of the named constructors, names the roster doesn't have are left out
+        '''
+        return sum(1 << self.constructor_codes[c] for c in set(constructors) if c in self.constructor_codes)
+    
+    def driver_names(self, mask):
+        return tuple(d for i, d in enumerate(self.drivers) if mask >> i & 1)
+    
+    def constructor_names(self, mask):
+        return tuple(c for i, c in enumerate(self.constructors) if mask >> i & 1)
+    
+    @staticmethod
+    def combo_masks(combos):
+        '''
+        bitmask of every row of an array of code combinations, e.g. CombinationTables.driver_combos
+        '''
+        return np.bitwise_or.reduce(np.left_shift(np.uint64(1), combos.astype(np.uint64)), axis=1)
+    
+    @staticmethod
+    def substitutions(masks, current_mask):
+        '''
+        how many members of each of the masks aren't in current_mask, i.e. the substitutions needed to get to them
+        '''
+        return popcount(np.bitwise_and(masks, np.uint64(~current_mask & (2 ** 64 - 1))))
 
 
 class Team:
+    '''
+    a proposed team. the engines that work on CombinationTables make their Teams with from_codes, keeping the drivers and
+    constructors as Roster bitmasks, and the names are only decoded when they're asked for, e.g. to print the team.
+    '''
+    __slots__ = ('score', 'substitutions_needed', 'proposed_team_value', 'remaining_cost_cap', 'roster', 'driver_mask', 'constructor_mask', 'turbo_code', '_constructor_team', '_driver_selection', '_turbo_driver')
+
     def __init__(self, score, constructor_team, driver_selection, turbo_driver, substitutions_needed, proposed_team_value, remaining_cost_cap):
         self.score = score
-        self.constructor_team = constructor_team
-        self.driver_selection = driver_selection
-        self.turbo_driver = turbo_driver
+        self._constructor_team = constructor_team
+        self._driver_selection = driver_selection
+        self._turbo_driver = turbo_driver
         self.substitutions_needed = substitutions_needed
         self.proposed_team_value = proposed_team_value
         self.remaining_cost_cap = remaining_cost_cap
+        self.roster = None
+        self.driver_mask = None
+        self.constructor_mask = None
+        self.turbo_code = None
+    
+    @classmethod
+    def from_codes(cls, score, roster, driver_mask, constructor_mask, turbo_code, substitutions_needed, proposed_team_value, remaining_cost_cap):
+        '''
+        a Team kept as Roster bitmasks of its drivers and constructors and the code of its turbo driver
+        '''
+        team = cls(score, None, None, None, substitutions_needed, proposed_team_value, remaining_cost_cap)
+        team.roster = roster
+        team.driver_mask = driver_mask
+        team.constructor_mask = constructor_mask
+        team.turbo_code = turbo_code
+        return team
+    
+    @property
+    def constructor_team(self):
+        if self._constructor_team is None:
+            self._constructor_team = self.roster.constructor_names(self.constructor_mask)
+        return self._constructor_team
+    
+    @property
+    def driver_selection(self):
+        if self._driver_selection is None:
+            self._driver_selection = self.roster.driver_names(self.driver_mask)
+        return self._driver_selection
+    
+    @property
+    def turbo_driver(self):
+        if self._turbo_driver is None:
+            self._turbo_driver = self.roster.drivers[self.turbo_code]
+        return self._turbo_driver
 
     def __lt__(self, other):
         return self.score < other.score
@@ -694,42 +1492,711 @@ class Team:
                f'Remaining Cost Cap: {round(self.remaining_cost_cap, 2)}'
 
 
-def main(
-    current_team_drivers,
-    current_team_constructors,
-    weekend_df,
-    track_name,
-    driver_pricing,
-    constructor_pricing,
-    remaining_cost_cap
-        ):
+class TopTeamCollector:
+    '''
+    bounded min heap of the k best teams seen so far. a candidate's raw score is checked against the current
+    threshold before anything is built for it, so only the teams that make the cut are ever turned into a Team.
+    
+    teams are ranked by score, and among equal scores by their order, a unique sortable value per candidate.
+    with the visit count as the order, later teams win ties, which is what the SortedList add/pop(0) pattern did.
+    
+    parameters:
+    k: int, how many teams to keep
+    '''
+    __slots__ = ('k', 'heap')
+    
+    def __init__(self, k=100):
+        self.k = k
+        self.heap = []
     
-    # score predicted weekend points
-    drivers, constructors, driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = score_race_qualifying_sprint_predicted(weekend_df, track_name)
+    def __len__(self):
+        return len(self.heap)
     
-    print(f'=== Predicted Driver Scores for {track_name.capitalize()} ===')
-    print(driver_scores)
+    def threshold(self):
+        '''
+        the lowest kept score once k teams have been collected, None until then
+        '''
+        return self.heap[0][0] if len(self.heap) >= self.k else None
+    
+    def would_keep(self, score, order):
+        return len(self.heap) < self.k or (score, order) > self.heap[0][:2]
+    
+    def add(self, score, order, item):
+        '''
+        offers a candidate to the collector, item is whatever should be kept for it (e.g. a Team)
+        '''
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, (score, order, item))
+        elif (score, order) > self.heap[0][:2]:
+            heapq.heapreplace(self.heap, (score, order, item))
+    
+    def entries(self):
+        '''
+        the kept (score, order, item) entries in ascending order of score and order
+        '''
+        return sorted(self.heap, key=lambda entry: entry[:2])
+    
+    def sorted_list(self):
+        '''
+        the kept items as a SortedList, in the same order SortedList would have kept them in
+        '''
+        top_teams = SortedList()
+        for score, order, item in self.entries():
+            top_teams.add(item)
+        return top_teams
 
-    # reevaluate team value after changes in driver valuations
-    current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
-    current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+
+class SearchStats:
+    '''
+    instrumentation for a run of main. pass one in to main and it records the wall time of each stage, the engine's
+    search counts and the peak memory of the run, so a slow run can be broken down without adding prints to the module.
     
-    # current_team_value is the updated value of drivers and teams, along with remaining_cost_cap
-    current_team_value = sum(map(lambda c: current_constructor_values[c], current_team_constructors)) + sum(map(lambda d: current_driver_values[d], current_team_drivers)) + remaining_cost_cap
+    the stages are 'predicted_scoring', 'pricing' (the price dicts and current team value), 'enumeration' (the engine's search),
+    'top_k' (picking the top teams out of the scored ones and building their Teams) and 'output' (the printout).
+    the brute force and branch and bound engines keep their top teams up to date as they go, so that part of their
+    top-k upkeep is counted in 'enumeration'. stages can be nested, a stage's time doesn't include the stages inside it.
+    
+    the search counts include 'pruned_by_cost', the team combinations ruled out for being over the cost cap, and
+    'pruned_by_score', the ones ruled out without being scored because they couldn't beat the top_k-th best score.
+    
+    parameters:
+    callback: function, optional, called as callback(stage, seconds) as each stage finishes
+    print_stages: bool, if True each stage's time is printed as it finishes
+    track_memory: bool, if True the peak memory of the run is traced with tracemalloc, which slows the pure python engines
+                  down noticeably. memory used by the worker processes of the parallel engine isn't traced.
+    '''
+    def __init__(self, callback=None, print_stages=False, track_memory=True):
+        self.callback = callback
+        self.print_stages = print_stages
+        self.track_memory = track_memory
+        self.stage_times = {}
+        self.search_counts = {}
+        self.peak_memory = None
+        self._child_times = []
+    
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        times the code run inside it as the stage name, adding up if the stage is run more than once
+        '''
+        self._child_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            seconds = elapsed - self._child_times.pop()
+            if self._child_times:
+                self._child_times[-1] += elapsed
+            self.stage_times[name] = self.stage_times.get(name, 0) + seconds
+            if self.callback:
+                self.callback(name, seconds)
+            if self.print_stages:
+                print(f'[{name}: {seconds:.4f} s]')
+    
+    @contextlib.contextmanager
+    def tracing_memory(self):
+        '''
+        records the peak memory allocated inside it in peak_memory (bytes), if track_memory is set
+        '''
+        if not self.track_memory:
+            yield
+            return
+        
+        # if something else is already tracing it's left running, with its peak reset where python has reset_peak (3.9+)
+        already_tracing = tracemalloc.is_tracing()
+        if not already_tracing:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            self.peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+            if not already_tracing:
+                tracemalloc.stop()
+    
+    @property
+    def total_time(self):
+        return sum(self.stage_times.values())
+    
+    def as_dict(self):
+        return {
+            'stage_times': dict(self.stage_times),
+            'total_time': self.total_time,
+            'search_counts': dict(self.search_counts),
+            'peak_memory': self.peak_memory,
+        }
+    
+    def __str__(self):
+        lines = [f'{stage}: {seconds:.4f} s' for stage, seconds in self.stage_times.items()]
+        lines.append(f'total: {self.total_time:.4f} s')
+        lines.extend(f'{name}: {count}' for name, count in self.search_counts.items())
+        if self.peak_memory is not None:
+            lines.append(f'peak memory: {self.peak_memory / 2 ** 20:.1f} MiB')
+        return '\n'.join(lines)
+
+
+def _stage(stats, name):
+    '''
+    stats.stage(name), or a context that does nothing if there are no stats to record
+    '''
+    return stats.stage(name) if stats is not None else contextlib.nullcontext()
+
+
+class TeamConstraints:
+    '''
+    rules a team has to meet, pushed down into the team search instead of filtering its top teams afterwards.
+    the rules on drivers and on constructors decide which driver and constructor combinations CombinationTables generates
+    at all, so a locked driver or a small max_substitutions cuts the tables down to a fraction of the combinations.
+    max_substitutions over the whole team and min_remaining_cost_cap are checked for each team, on what's left.
+    
+    parameters:
+    locked_drivers: list, drivers every team has to have
+    banned_drivers: list, drivers no team can have
+    locked_constructors: list, constructors every team has to have
+    banned_constructors: list, constructors no team can have
+    max_substitutions: int, most substitutions a team can need, None for no limit
+    min_remaining_cost_cap: float, least cost cap a team has to leave unspent
+    one_driver_per_team: bool, if True a team can't have both drivers of a constructor
+    driver_to_constructor: dict, maps drivers to their constructor, needed for one_driver_per_team
+    '''
+    def __init__(
+        self,
+        locked_drivers=(),
+        banned_drivers=(),
+        locked_constructors=(),
+        banned_constructors=(),
+        max_substitutions=None,
+        min_remaining_cost_cap=0.0,
+        one_driver_per_team=False,
+        driver_to_constructor=None):
+        
+        self.locked_drivers = list(locked_drivers)
+        self.banned_drivers = list(banned_drivers)
+        self.locked_constructors = list(locked_constructors)
+        self.banned_constructors = list(banned_constructors)
+        self.max_substitutions = max_substitutions
+        self.min_remaining_cost_cap = min_remaining_cost_cap
+        self.one_driver_per_team = one_driver_per_team
+        self.driver_to_constructor = driver_to_constructor
+        
+        if set(self.locked_drivers) & set(self.banned_drivers) or set(self.locked_constructors) & set(self.banned_constructors):
+            raise ValueError('A driver or constructor can\'t be both locked and banned.')
+        if len(self.locked_drivers) > 5 or len(self.locked_constructors) > 2:
+            raise ValueError('At most 5 drivers and 2 constructors can be locked.')
+        if one_driver_per_team and driver_to_constructor is None:
+            raise ValueError('one_driver_per_team needs the driver_to_constructor mapping.')
+    
+    @staticmethod
+    def _combos(names, size, locked, banned, current, max_new):
+        '''
+        every combination of size indexes into names that has all the locked names, none of the banned ones and at most max_new
+        names that aren't in current, in the order of itertools.combinations(range(len(names)), size).
+        only these combinations are generated, as the locked indexes plus the free ones split into current and new names.
+        '''
+        locked_indexes = tuple(i for i, name in enumerate(names) if name in locked)
+        kept = [i for i, name in enumerate(names) if name not in locked and name not in banned and name in current]
+        new = [i for i, name in enumerate(names) if name not in locked and name not in banned and name not in current]
+        still_needed = size - len(locked_indexes)
+        
+        # a locked name that can't be picked at all, e.g. a driver without a price this weekend, rules out every combination
+        if len(locked_indexes) < len(set(locked)):
+            return np.empty((0, size), dtype=np.int64)
+        
+        # the locked names that aren't on the team already use up some of the new names allowed
+        most_new = still_needed
+        if max_new is not None:
+            most_new = min(most_new, max_new - len([i for i in locked_indexes if names[i] not in current]))
+        
+        combos = [
+            sorted(locked_indexes + new_part + kept_part)
+            for n_new in range(most_new + 1)
+            for new_part in itertools.combinations(new, n_new)
+            for kept_part in itertools.combinations(kept, still_needed - n_new)]
+        combos = np.array(combos, dtype=np.int64).reshape(-1, size)
+        
+        # back into itertools.combinations order, so ties between teams are broken the same way as in the full search
+        return combos[np.lexsort(combos.T[::-1])]
+    
+    def driver_combos(self, drivers, current_team_drivers):
+        '''
+        the 5 driver combinations, as indexes into drivers, that meet the driver rules
+        '''
+        combos = self._combos(drivers, 5, self.locked_drivers, self.banned_drivers, current_team_drivers, self.max_substitutions)
+        if self.one_driver_per_team:
+            teams = np.unique([self.driver_to_constructor[d] for d in drivers], return_inverse=True)[1].ravel()
+            combo_teams = np.sort(teams[combos], axis=1)
+            combos = combos[(np.diff(combo_teams, axis=1) != 0).all(axis=1)]
+        return combos
+    
+    def constructor_combos(self, constructors, current_team_constructors):
+        '''
+        the 2 constructor combinations, as indexes into constructors, that meet the constructor rules
+        '''
+        return self._combos(constructors, 2, self.locked_constructors, self.banned_constructors, current_team_constructors, self.max_substitutions)
+    
+    def allowed_teams(self, tables, current_team_value):
+        '''
+        driver combinations x constructor combinations array of the teams in tables that leave min_remaining_cost_cap unspent
+        and don't need more than max_substitutions
+        '''
+        allowed = current_team_value - tables.price_grid() >= self.min_remaining_cost_cap
+        if self.max_substitutions is not None:
+            allowed &= tables.substitution_grid() <= self.max_substitutions
+        return allowed
+
+
+def _rows_by_member(combos, n_members):
+    '''
+    for each member index (a driver or a constructor), the ascending rows of combos that have it in them
+    '''
+    # a stable sort of the flattened combos keeps each member's rows in ascending order
+    rows = np.argsort(combos.ravel(), kind='stable') // combos.shape[1]
+    return np.split(rows, np.cumsum(np.bincount(combos.ravel(), minlength=n_members))[:-1])
+
+
+def _union_rows(rows_by_member, members, n_rows):
+    '''
+    ascending rows (out of n_rows) that have any of the members in them, from a _rows_by_member index
+    '''
+    if len(members) == 1:
+        return rows_by_member[members[0]]
+    has_member = np.zeros(n_rows, dtype=bool)
+    for member in members:
+        has_member[rows_by_member[member]] = True
+    return np.flatnonzero(has_member)
+
+
+class CombinationTables:
+    '''
+    array backed tables of every 5 driver combination and every 2 constructor combination for a weekend.
+    the price, score, top driver score, turbo driver and substitutions needed are precomputed once per combination,
+    so a whole weekend of team combinations can be scored with broadcast operations instead of a python loop.
+    
+    combinations are generated with itertools.combinations over the driver and constructor indexes, so row i of
+    driver_combos is the i-th team of itertools.combinations(drivers, 5), the same order the brute force loop visits them in.
+    
+    parameters:
+    drivers: list, driver names as returned by score_race_qualifying_sprint_predicted
+    constructors: list, constructor names as returned by score_race_qualifying_sprint_predicted
+    driver_scores: dict, predicted driver scores
+    constructor_scores: dict, predicted constructor scores
+    current_driver_values: dict, driver prices for this weekend
+    current_constructor_values: dict, constructor prices for this weekend
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    turbo_multipliers: tuple, multipliers for the highest scoring drivers on a team, in order. (2,) is the regular turbo,
+                       (3, 2) is the Extra DRS chip on top of it
+    constraints: TeamConstraints, if given only the driver and constructor combinations that meet its rules are in the tables,
+                 still in the same relative order
+    '''
+    def __init__(
+        self,
+        drivers,
+        constructors,
+        driver_scores,
+        constructor_scores,
+        current_driver_values,
+        current_constructor_values,
+        current_team_drivers,
+        current_team_constructors,
+        turbo_multipliers=(2,),
+        constraints=None):
+        
+        self.drivers = list(drivers)
+        self.constructors = list(constructors)
+        
+        # per driver and per constructor arrays, indexed in the same order as the names above
+        self.driver_price_array = np.array([current_driver_values[d] for d in self.drivers], dtype=float)
+        self.constructor_price_array = np.array([current_constructor_values[c] for c in self.constructors], dtype=float)
+        self.roster = Roster(self.drivers, self.constructors)
+        self.current_driver_mask = self.roster.driver_mask(current_team_drivers)
+        self.current_constructor_mask = self.roster.constructor_mask(current_team_constructors)
+        
+        if constraints is None:
+            self.driver_combos = np.array(list(itertools.combinations(range(len(self.drivers)), 5)), dtype=np.int64).reshape(-1, 5)
+            self.constructor_combos = np.array(list(itertools.combinations(range(len(self.constructors)), 2)), dtype=np.int64).reshape(-1, 2)
+        else:
+            self.driver_combos = constraints.driver_combos(self.drivers, current_team_drivers)
+            self.constructor_combos = constraints.constructor_combos(self.constructors, current_team_constructors)
+        
+        # prices are summed one position at a time so the floating point result matches sum() in the brute force loop
+        self.driver_combo_price = _sum_columns(self.driver_price_array[self.driver_combos])
+        self.constructor_combo_price = _sum_columns(self.constructor_price_array[self.constructor_combos])
+        
+        # every combination as a bitmask, and how many of its drivers/constructors are not already on my team
+        self.driver_combo_mask = Roster.combo_masks(self.driver_combos)
+        self.constructor_combo_mask = Roster.combo_masks(self.constructor_combos)
+        self.driver_combo_subs = Roster.substitutions(self.driver_combo_mask, self.current_driver_mask)
+        self.constructor_combo_subs = Roster.substitutions(self.constructor_combo_mask, self.current_constructor_mask)
+        
+        # which combination rows each driver and constructor is in, built the first time an update needs them
+        self._driver_combo_rows = None
+        self._constructor_combo_rows = None
+        
+        self._set_scores(driver_scores, constructor_scores, turbo_multipliers)
+    
+    def _set_scores(self, driver_scores, constructor_scores, turbo_multipliers):
+        self.driver_score_array = np.array([driver_scores[d] for d in self.drivers])
+        self.constructor_score_array = np.array([constructor_scores[c] for c in self.constructors])
+        self.turbo_multipliers = tuple(turbo_multipliers)
+        self.driver_combo_turbo, self.driver_combo_top_score, self.driver_combo_score = self._score_driver_combos(self.driver_combos)
+        self.constructor_combo_score = _sum_columns(self.constructor_score_array[self.constructor_combos])
+    
+    def _score_driver_combos(self, driver_combos, driver_score_array=None):
+        '''
+        turbo driver, top driver score and score (turbo included) of the given driver combinations,
+        with the tables' driver scores or the driver_score_array given
+        '''
+        # the turbo driver is the highest scorer on the team, ties going to the later driver like sorted(...)[-1] does
+        combo_driver_scores = (self.driver_score_array if driver_score_array is None else driver_score_array)[driver_combos]
+        turbo_position = combo_driver_scores.shape[1] - 1 - np.argmax(combo_driver_scores[:, ::-1], axis=1)
+        combo_turbo = driver_combos[np.arange(len(driver_combos)), turbo_position]
+        
+        # the turbo multipliers go to the highest scorers in order, e.g. the regular turbo adds the top score once more
+        ranked_scores = -np.sort(-combo_driver_scores, axis=1)
+        turbo_points = sum((multiplier - 1) * ranked_scores[:, i] for i, multiplier in enumerate(self.turbo_multipliers))
+        return combo_turbo, combo_driver_scores.max(axis=1), _sum_columns(combo_driver_scores) + turbo_points
+    
+    def driver_combo_weights(self):
+        '''
+        how many times each driver of every driver combination is counted in the team score, e.g. 2 for the turbo driver.
+        the turbo multipliers go to the highest scorers in order, ties going to the later driver like the turbo does.
+        '''
+        combo_driver_scores = self.driver_score_array[self.driver_combos]
+        positions = np.broadcast_to(np.arange(combo_driver_scores.shape[1]), combo_driver_scores.shape)
+        ranked = np.lexsort((-positions, -combo_driver_scores), axis=1)
+        weights = np.ones(combo_driver_scores.shape)
+        for i, multiplier in enumerate(self.turbo_multipliers):
+            weights[np.arange(len(weights)), ranked[:, i]] = multiplier
+        return weights
+    
+    def update(self, driver_scores=None, constructor_scores=None, current_driver_values=None, current_constructor_values=None):
+        '''
+        updates the tables in place for new scores or prices of some of the drivers and constructors. only the combinations
+        with one of the changed drivers or constructors in them are recomputed. the arrays are copied before they're written to,
+        so tables made from these ones with with_scores or shard are left as they were.
+        
+        parameters:
+        driver_scores: dict, new scores of the drivers whose score changed
+        constructor_scores: dict, new scores of the constructors whose score changed
+        current_driver_values: dict, new prices of the drivers whose price changed
+        current_constructor_values: dict, new prices of the constructors whose price changed
+        
+        returns:
+        driver_rows: array, indexes of the driver combinations that were recomputed
+        constructor_rows: array, indexes of the constructor combinations that were recomputed
+        '''
+        driver_scores = driver_scores or {}
+        constructor_scores = constructor_scores or {}
+        current_driver_values = current_driver_values or {}
+        current_constructor_values = current_constructor_values or {}
+        
+        # copied with a wider dtype if needed, e.g. a float score coming into integer scores
+        self.driver_score_array = self.driver_score_array.astype(np.result_type(self.driver_score_array, *driver_scores.values()))
+        for driver, score in driver_scores.items():
+            self.driver_score_array[self.drivers.index(driver)] = score
+        self.driver_price_array = self.driver_price_array.copy()
+        for driver, price in current_driver_values.items():
+            self.driver_price_array[self.drivers.index(driver)] = price
+        self.constructor_score_array = self.constructor_score_array.astype(np.result_type(self.constructor_score_array, *constructor_scores.values()))
+        for constructor, score in constructor_scores.items():
+            self.constructor_score_array[self.constructors.index(constructor)] = score
+        self.constructor_price_array = self.constructor_price_array.copy()
+        for constructor, price in current_constructor_values.items():
+            self.constructor_price_array[self.constructors.index(constructor)] = price
+        
+        changed_drivers = [self.drivers.index(d) for d in set(driver_scores) | set(current_driver_values)]
+        changed_constructors = [self.constructors.index(c) for c in set(constructor_scores) | set(current_constructor_values)]
+        driver_rows = _union_rows(self.driver_combo_rows, changed_drivers, len(self.driver_combos))
+        constructor_rows = _union_rows(self.constructor_combo_rows, changed_constructors, len(self.constructor_combos))
+        
+        combos = self.driver_combos[driver_rows]
+        for attribute, values in zip(
+            ['driver_combo_turbo', 'driver_combo_top_score', 'driver_combo_score', 'driver_combo_price'],
+            self._score_driver_combos(combos) + (_sum_columns(self.driver_price_array[combos]),)):
+            array = getattr(self, attribute).astype(np.result_type(getattr(self, attribute), values))
+            array[driver_rows] = values
+            setattr(self, attribute, array)
+        
+        combos = self.constructor_combos[constructor_rows]
+        for attribute, values in zip(
+            ['constructor_combo_score', 'constructor_combo_price'],
+            [_sum_columns(self.constructor_score_array[combos]), _sum_columns(self.constructor_price_array[combos])]):
+            array = getattr(self, attribute).astype(np.result_type(getattr(self, attribute), values))
+            array[constructor_rows] = values
+            setattr(self, attribute, array)
+        
+        return driver_rows, constructor_rows
+    
+    def with_scores(self, driver_scores, constructor_scores, turbo_multipliers=(2,)):
+        '''
+        a copy of the tables rescored with different driver and constructor scores or turbo multipliers (e.g. for a chip or
+        after an odds update). the combinations, prices and substitutions are shared with these tables, not recomputed.
+        '''
+        rescored = copy.copy(self)
+        rescored._set_scores(driver_scores, constructor_scores, turbo_multipliers)
+        return rescored
+    
+    def shard(self, start, stop):
+        '''
+        a copy of the tables that only has driver combinations start to stop, used to split the search up between processes.
+        the constructor side is left whole, so flat index i of the shard is flat index i + start * n_constructor_combos of the full tables.
+        '''
+        shard = copy.copy(self)
+        for attribute in ['driver_combos', 'driver_combo_mask', 'driver_combo_price', 'driver_combo_turbo', 'driver_combo_top_score', 'driver_combo_score', 'driver_combo_subs']:
+            setattr(shard, attribute, getattr(self, attribute)[start:stop])
+        shard._driver_combo_rows = None
+        return shard
+    
+    @property
+    def possible_team_count(self):
+        return len(self.driver_combos) * len(self.constructor_combos)
+    
+    @property
+    def driver_combo_rows(self):
+        '''
+        for each driver, the ascending indexes of the driver combinations they're in
+        '''
+        if self._driver_combo_rows is None:
+            self._driver_combo_rows = _rows_by_member(self.driver_combos, len(self.drivers))
+        return self._driver_combo_rows
+    
+    @property
+    def constructor_combo_rows(self):
+        '''
+        for each constructor, the ascending indexes of the constructor combinations they're in
+        '''
+        if self._constructor_combo_rows is None:
+            self._constructor_combo_rows = _rows_by_member(self.constructor_combos, len(self.constructors))
+        return self._constructor_combo_rows
+    
+    def price_grid(self):
+        '''
+        full team price of every driver combination (rows) with every constructor combination (columns)
+        '''
+        return self.driver_combo_price[:, None] + self.constructor_combo_price[None, :]
+    
+    def substitution_grid(self):
+        '''
+        substitutions needed for every driver combination (rows) with every constructor combination (columns)
+        '''
+        return self.driver_combo_subs[:, None] + self.constructor_combo_subs[None, :]
+    
+    def score_grid(self, use_wildcard=False):
+        '''
+        team score of every driver combination (rows) with every constructor combination (columns),
+        including the turbo driver and the -10 point penalty for each substitution beyond the 2 free ones
+        '''
+        team_score = self.driver_combo_score[:, None] + self.constructor_combo_score[None, :]
+        if not use_wildcard:
+            substitutions_incurring_penalty = np.maximum(self.substitution_grid() - 2, 0)
+            team_score = team_score - substitutions_incurring_penalty * 10
+        return team_score
     
+    def score_stdev_grid(self, covariance):
+        '''
+        standard deviation of the team score of every driver combination (rows) with every constructor combination (columns).
+        a team's variance is w' covariance w over its 5 drivers (turbo weighted) and 2 constructors, which splits into a
+        driver part and a constructor part that are each worked out once per combination, plus the driver-constructor covariance
+        of each pair of combinations, which is looked up from each driver combination's summed covariance with every constructor.
+        so no team's variance is worked out from scratch, and the grid costs about as much as score_grid.
+        
+        parameters:
+        covariance: array, covariance of the driver scores and then the constructor scores, in the order of the tables' names
+        
+        returns:
+        stdev: array, driver combinations x constructor combinations array of team score standard deviations
+        '''
+        n_drivers = len(self.drivers)
+        driver_covariance = covariance[:n_drivers, :n_drivers]
+        cross_covariance = covariance[:n_drivers, n_drivers:]
+        constructor_covariance = covariance[n_drivers:, n_drivers:]
+        
+        weights = self.driver_combo_weights()
+        combos = self.driver_combos
+        driver_variance = np.einsum('ij,ik,ijk->i', weights, weights, driver_covariance[combos[:, :, None], combos[:, None, :]])
+        constructor_variance = constructor_covariance[self.constructor_combos[:, :, None], self.constructor_combos[:, None, :]].sum(axis=(1, 2))
+        
+        # each driver combination's covariance with every single constructor, then with each constructor combination
+        driver_constructor = np.einsum('ij,ijk->ik', weights, cross_covariance[combos])
+        variance = driver_variance[:, None] + constructor_variance[None, :]
+        for j in range(self.constructor_combos.shape[1]):
+            variance += 2 * driver_constructor[:, self.constructor_combos[:, j]]
+        return np.sqrt(np.maximum(variance, 0))
+    
+    def final_fix_gain_grid(self, race_points, current_team_value, chunk_size=2000):
+        '''
+        best points gained by the Final Fix chip for every driver combination (rows) with every constructor combination (columns).
+        the Final Fix swaps one driver after qualifying, so the outgoing driver keeps the points they scored up to then and the
+        incoming driver scores the race. if the turbo driver is swapped out, the turbo moves to the incoming driver.
+        the incoming driver's price can't take the team over current_team_value, and a swap is only made if it gains points.
+        
+        parameters:
+        race_points: dict, each driver's points from the race itself, see final_fix_race_points
+        current_team_value: float, value of my current team plus the remaining cost cap
+        chunk_size: int, number of driver combinations handled at once, to keep memory down
+        
+        returns:
+        gain: array, driver combinations x constructor combinations array of the best Final Fix gain
+        '''
+        race = np.array([race_points[d] for d in self.drivers], dtype=float)
+        slack = current_team_value - self.price_grid()
+        gain = np.zeros(slack.shape)
+        
+        for j in range(self.driver_combos.shape[1]):
+            out = self.driver_combos[:, j]
+            multiplier = np.where(out == self.driver_combo_turbo, self.turbo_multipliers[0], 1)
+            swap_gain = multiplier[:, None] * (race[None, :] - race[out][:, None])
+            extra_price = self.driver_price_array[None, :] - self.driver_price_array[out][:, None]
+            
+            # drivers already on the team can't be swapped in
+            on_team = np.zeros(swap_gain.shape, dtype=bool)
+            np.put_along_axis(on_team, self.driver_combos, True, axis=1)
+            swap_gain[on_team] = -np.inf
+            
+            # the best swap within a price is a running max over the swaps sorted by the extra price they need
+            order = np.argsort(extra_price, axis=1)
+            extra_price = np.take_along_axis(extra_price, order, axis=1)
+            best_gain = np.maximum.accumulate(np.take_along_axis(swap_gain, order, axis=1), axis=1)
+            
+            for start in range(0, len(out), chunk_size):
+                rows = slice(start, start + chunk_size)
+                affordable_swaps = (extra_price[rows, None, :] <= slack[rows, :, None]).sum(axis=2)
+                chunk_gain = np.take_along_axis(best_gain[rows], np.maximum(affordable_swaps - 1, 0), axis=1)
+                gain[rows] = np.maximum(gain[rows], np.where(affordable_swaps > 0, chunk_gain, 0))
+        
+        return gain.astype(np.result_type(self.driver_score_array, np.int64)) if np.all(gain == np.round(gain)) else gain
+    
+    def make_team(self, driver_combo_index, constructor_combo_index, team_score, current_team_value):
+        '''
+        builds the Team for a single (driver combination, constructor combination) pair of the tables
+        '''
+        proposed_team_value = self.driver_combo_price[driver_combo_index] + self.constructor_combo_price[constructor_combo_index]
+        substitutions_needed = int(self.driver_combo_subs[driver_combo_index] + self.constructor_combo_subs[constructor_combo_index])
+        
+        return Team.from_codes(
+            team_score,
+            self.roster,
+            int(self.driver_combo_mask[driver_combo_index]),
+            int(self.constructor_combo_mask[constructor_combo_index]),
+            int(self.driver_combo_turbo[driver_combo_index]),
+            substitutions_needed,
+            proposed_team_value,
+            current_team_value - proposed_team_value)
 
-    print('\n=== Current Team ===')
-    print(f'Constructors: {current_team_constructors}')
-    print(f'Drivers: {current_team_drivers}')
-    print(f'Current Team Value: {round(current_team_value, 1)}')
-    print(f'Current Available Value: {remaining_cost_cap}')
+
+def _sum_columns(values):
+    '''
+    adds up the columns of a 2d array left to right, the same order python's sum() adds up a tuple
+    '''
+    total = values[:, 0]
+    for i in range(1, values.shape[1]):
+        total = total + values[:, i]
+    return total
+
+
+def top_k_indices(scores, candidates, k):
+    '''
+    picks the k best candidates the same way the SortedList in the brute force loop does:
+    highest score wins, and among equal scores the candidate visited later wins.
     
-    use_wildcard = False
+    parameters:
+    scores: array, flat array of team scores
+    candidates: array, ascending flat indexes into scores that are eligible (e.g. affordable teams)
+    k: int, how many teams to keep
+    
+    returns:
+    array of flat indexes, in ascending order of (score, index), which is the order SortedList keeps them in
+    '''
+    candidate_scores = scores[candidates]
+    if len(candidates) > k:
+        # the k-th highest score is the cut off, teams tied with it are taken from the latest visited
+        threshold = np.partition(candidate_scores, len(candidates) - k)[len(candidates) - k]
+        above = candidates[candidate_scores > threshold]
+        tied = candidates[candidate_scores == threshold]
+        candidates = np.concatenate([above, tied[len(tied) - (k - len(above)):]])
+        candidate_scores = scores[candidates]
+    
+    return candidates[np.lexsort((candidates, candidate_scores))]
+
 
-    # Keep track of the top teams.
+def _top_k_pool(pool_scores, pool_indexes, k):
+    '''
+    trims a pool of candidate teams down to the k best, ranked the same way as top_k_indices
+    
+    parameters:
+    pool_scores: array, team scores of the candidates
+    pool_indexes: array, flat indexes of the candidates, in any order
+    k: int, how many teams to keep
+    
+    returns:
+    pool_scores, pool_indexes: the kept candidates in ascending order of (score, index)
+    '''
+    order = np.lexsort((pool_indexes, pool_scores))[-k:]
+    return pool_scores[order], pool_indexes[order]
+
+
+def _affordable_prefix_length(sorted_prices, other_prices, current_team_value):
+    '''
+    for each price in other_prices, how many of the ascending sorted_prices can be added to it and stay within
+    current_team_value. the binary search result is nudged so it agrees exactly with the floating point check
+    sorted_price + other_price > current_team_value used by the brute force search.
+    '''
+    lengths = np.searchsorted(sorted_prices, current_team_value - other_prices, side='right')
+    for i, other_price in enumerate(other_prices):
+        while lengths[i] < len(sorted_prices) and sorted_prices[lengths[i]] + other_price <= current_team_value:
+            lengths[i] += 1
+        while lengths[i] > 0 and sorted_prices[lengths[i] - 1] + other_price > current_team_value:
+            lengths[i] -= 1
+    return lengths
+
+
+def enumerate_teams_brute_force(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    top_k=100,
+    turbo_multipliers=(2,),
+    stats=None):
+    '''
+    scores every team combination of 5 drivers and 2 constructors one at a time and keeps the top_k.
+    this is the original pure python search, kept around as the reference the faster engines are checked against.
+    
+    parameters:
+    drivers: list, driver names
+    constructors: list, constructor names
+    driver_scores: dict, predicted driver scores
+    constructor_scores: dict, predicted constructor scores
+    current_driver_values: dict, driver prices for this weekend
+    current_constructor_values: dict, constructor prices for this weekend
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    current_team_value: float, value of my current team plus the remaining cost cap
+    use_wildcard: bool, if True substitutions don't incur a penalty
+    top_k: int, how many of the top teams to return
+    turbo_multipliers: tuple, multipliers for the highest scoring drivers on a team, (2,) is the regular turbo
+    stats: SearchStats, optional, records how long the top_k stage takes
+    
+    returns:
+    top_teams: SortedList, the top_k Teams in ascending order of score
+    search_counts: dict, 'possible_team_count' is the number of team combinations there are,
+                   'team_count' is the number of team combinations I can afford,
+                   'pruned_by_cost' and 'pruned_by_score' are the numbers of team combinations ruled out by the cost cap
+                   and ruled out by the top_k-th best score without being scored (none for this engine, it scores them all)
+    '''
     team_count = 0
     possible_team_count = 0
-    top_teams = SortedList()
+    top_teams = TopTeamCollector(top_k)
 
     # Go through all team combinations of 5 drivers and 2 constructors.
     for driver_team in itertools.combinations(drivers, 5):
@@ -744,12 +2211,9 @@ def main(
 
             team_count += 1
 
-            # pick the driver to apply the turbo multiplier to by the highest scoring driver on the team
-            # this sorted function gives the list in ascending order of driver scores, so the top driver is the last in the list
-            # from this stackoverflow: https://stackoverflow.com/questions/12987178/sort-a-list-based-on-dictionary-values-in-python
-            turbo_driver = sorted(driver_team, key = lambda x: driver_scores[x])[-1]
-            # get the top driver's score
-            top_driver_score = max(map(lambda x: driver_scores[x], driver_team))
+            # get the top drivers' scores for the turbo multipliers
+            ranked_driver_scores = sorted(map(lambda x: driver_scores[x], driver_team), reverse=True)
+            turbo_points = sum((multiplier - 1) * score for multiplier, score in zip(turbo_multipliers, ranked_driver_scores))
 
             team_score = 0
             
@@ -763,39 +2227,1715 @@ def main(
                 team_score -= substitutions_incurring_penalty * 10
 
             # calculate team score
-            team_score += sum(map(lambda x: driver_scores[x], driver_team)) + top_driver_score + sum(map(lambda x: constructor_scores[x], constructor_team))
+            team_score += sum(map(lambda x: driver_scores[x], driver_team)) + turbo_points + sum(map(lambda x: constructor_scores[x], constructor_team))
+
+            # only build the team if it makes it into the top teams
+            if not top_teams.would_keep(team_score, possible_team_count):
+                continue
+
+            # pick the driver to apply the turbo multiplier to by the highest scoring driver on the team
+            # this sorted function gives the list in ascending order of driver scores, so the top driver is the last in the list
+            # from this stackoverflow: https://stackoverflow.com/questions/12987178/sort-a-list-based-on-dictionary-values-in-python
+            turbo_driver = sorted(driver_team, key = lambda x: driver_scores[x])[-1]
             proposed_team_value = driver_team_price + constructor_team_price
             remaining_cost_cap = current_team_value - proposed_team_value
 
-            # store the team in the top teams list, adjust if list greater than 100 long
             team = Team(team_score, constructor_team, driver_team, turbo_driver, substitutions_needed, proposed_team_value, remaining_cost_cap)
-            top_teams.add(team)
-            if len(top_teams) > 100:
-                top_teams.pop(0)
+            top_teams.add(team_score, possible_team_count, team)
+    
+    with _stage(stats, 'top_k'):
+        top_teams = top_teams.sorted_list()
+    
+    search_counts = {
+        'possible_team_count': possible_team_count,
+        'team_count': team_count,
+        'pruned_by_cost': possible_team_count - team_count,
+        'pruned_by_score': 0,
+    }
+    
+    return top_teams, search_counts
+
+
+def enumerate_teams_vectorized(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    top_k=100,
+    turbo_multipliers=(2,),
+    tables=None,
+    final_fix_race_points=None,
+    stats=None,
+    constraints=None,
+    risk=None):
+    '''
+    same search as enumerate_teams_brute_force, but every team combination is priced and scored at once with numpy
+    from the precomputed CombinationTables. returns the same Teams in the same order as the brute force search.
+    
+    parameters:
+    same as enumerate_teams_brute_force, plus
+    tables: CombinationTables, optional precomputed tables to reuse, built from the other parameters if not given
+    final_fix_race_points: dict, each driver's race points, if given the best Final Fix swap is added to every team's score
+    constraints: TeamConstraints, if given only the teams that meet them are searched. tables passed in have to be built with
+                 the same constraints.
+    risk: RiskObjective, if given the teams are ranked by its risk adjusted score, with driver_scores and constructor_scores
+          taken as the mean scores
+    
+    returns:
+    top_teams: SortedList, the top_k Teams in ascending order of score
+    search_counts: dict, same as enumerate_teams_brute_force
+    '''
+    if tables is None:
+        tables = CombinationTables(
+            drivers,
+            constructors,
+            driver_scores,
+            constructor_scores,
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors,
+            turbo_multipliers,
+            constraints)
+    
+    # flat index i is driver combination i // n_constructor_combos with constructor combination i % n_constructor_combos,
+    # which is the order the brute force loop visits the teams in
+    if constraints is None:
+        affordable = np.flatnonzero(tables.price_grid().ravel() <= current_team_value)
+    else:
+        affordable = np.flatnonzero(constraints.allowed_teams(tables, current_team_value).ravel())
+    team_scores = tables.score_grid(use_wildcard)
+    if final_fix_race_points is not None:
+        team_scores = team_scores + tables.final_fix_gain_grid(final_fix_race_points, current_team_value)
+    if risk is not None:
+        team_scores = team_scores - risk.stdev_multiplier * tables.score_stdev_grid(risk.covariance_array(tables.drivers, tables.constructors))
+    team_scores = team_scores.ravel()
+    
+    n_constructor_combos = len(tables.constructor_combos)
+    with _stage(stats, 'top_k'):
+        top_teams = SortedList()
+        for index in top_k_indices(team_scores, affordable, top_k):
+            top_teams.add(tables.make_team(index // n_constructor_combos, index % n_constructor_combos, team_scores[index], current_team_value))
+    
+    search_counts = {
+        'possible_team_count': tables.possible_team_count,
+        'team_count': len(affordable),
+        'pruned_by_cost': tables.possible_team_count - len(affordable),
+        'pruned_by_score': 0,
+    }
+    
+    return top_teams, search_counts
+
+
+def enumerate_teams_branch_and_bound(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    top_k=100,
+    turbo_multipliers=(2,),
+    stats=None):
+    '''
+    exact top_k search that doesn't score every team combination. drivers are picked depth first in order of
+    score per cost, and a partial team is dropped as soon as its optimistic upper bound can't beat the current top_k-th best
+    Team.score, or the cheapest way of finishing it can't be afforded. the upper bound assumes the best remaining drivers,
+    the turbo multipliers on the best driver available, the best constructor pair, and the fewest substitutions still possible.
+    
+    only teams that score strictly below the top_k-th best score are ever pruned, and ties are broken the same way as in
+    enumerate_teams_brute_force, so the result is the same top_k Teams.
+    
+    parameters:
+    same as enumerate_teams_brute_force
+    
+    returns:
+    top_teams: SortedList, the top_k Teams in ascending order of score
+    search_counts: dict, 'possible_team_count' is the number of team combinations there are,
+                   'teams_scored' is the number of affordable team combinations that were scored,
+                   'nodes_visited' is the number of partial and full teams the search looked at,
+                   'pruned_by_cost' and 'pruned_by_score' are the numbers of team combinations in the branches cut off
+                   by the cost cap and by the upper bound, so with teams_scored they add up to possible_team_count
+    '''
+    n_drivers = len(drivers)
+    driver_score_list = [driver_scores[d] for d in drivers]
+    driver_price_list = [current_driver_values[d] for d in drivers]
+    driver_is_new = [d not in current_team_drivers for d in drivers]
+    
+    # constructor pairs, best scoring first so a full driver team can stop looking at pairs once they can't make the cut
+    constructor_pairs = []
+    for pair in itertools.combinations(range(len(constructors)), 2):
+        constructor_pairs.append((
+            sum(constructor_scores[constructors[c]] for c in pair),
+            sum(current_constructor_values[constructors[c]] for c in pair),
+            len([c for c in pair if constructors[c] not in current_team_constructors]),
+            pair))
+    constructor_pairs.sort(key=lambda p: p[0], reverse=True)
+    best_constructor_score = constructor_pairs[0][0] if constructor_pairs else 0
+    cheapest_constructor_price = min([p[1] for p in constructor_pairs], default=0)
+    fewest_constructor_subs = min([p[2] for p in constructor_pairs], default=0)
+    
+    # search drivers in order of score per cost so good teams are found early and the cut off rises quickly
+    def score_per_cost(i):
+        return driver_score_list[i] / driver_price_list[i] if driver_price_list[i] > 0 else float('inf')
+    order = sorted(range(n_drivers), key=score_per_cost, reverse=True)
+    
+    # for every position in the search order, bounds on what the drivers from that position onwards can add
+    # suffix_top_scores[p][r]: sum of the r highest scores, suffix_cheapest[p][r]: sum of the r lowest prices
+    suffix_top_scores, suffix_cheapest, suffix_max_score, suffix_current_drivers = [], [], [], []
+    for p in range(n_drivers + 1):
+        remaining = order[p:]
+        top_scores = sorted((driver_score_list[i] for i in remaining), reverse=True)
+        cheapest = sorted(driver_price_list[i] for i in remaining)
+        suffix_top_scores.append([sum(top_scores[:r]) for r in range(6)])
+        suffix_cheapest.append([sum(cheapest[:r]) for r in range(6)])
+        suffix_max_score.append(top_scores[0] if top_scores else None)
+        suffix_current_drivers.append(len([i for i in remaining if not driver_is_new[i]]))
+    
+    def substitution_penalty(substitutions_needed):
+        return 0 if use_wildcard else max(substitutions_needed - 2, 0) * 10
+    
+    # every turbo multiplier adds at most its extra share of the best driver score available
+    turbo_extra = sum(m - 1 for m in turbo_multipliers)
+    
+    # teams are ranked by score and then by (driver indexes, constructor indexes), which is the order the brute force search
+    # visits them in, so ties are broken the same way
+    top_keys = TopTeamCollector(top_k)
+    counts = {'teams_scored': 0, 'nodes_visited': 0, 'pruned_by_cost': 0, 'pruned_by_score': 0}
+    
+    def score_driver_team(chosen):
+        counts['nodes_visited'] += 1
+        driver_team = tuple(sorted(chosen))
+        
+        # add up in the same order as the brute force search so floating point prices match exactly
+        driver_team_price = sum(driver_price_list[i] for i in driver_team)
+        ranked_driver_scores = sorted((driver_score_list[i] for i in driver_team), reverse=True)
+        driver_team_score = sum(driver_score_list[i] for i in driver_team) + sum((m - 1) * score for m, score in zip(turbo_multipliers, ranked_driver_scores))
+        driver_subs = len([i for i in driver_team if driver_is_new[i]])
+        fewest_penalty = substitution_penalty(driver_subs + fewest_constructor_subs)
+        
+        for p, (constructor_score, constructor_price, constructor_subs, pair) in enumerate(constructor_pairs):
+            cut_off = top_keys.threshold()
+            if cut_off is not None and driver_team_score + constructor_score - fewest_penalty < cut_off:
+                counts['pruned_by_score'] += len(constructor_pairs) - p
+                break
+            counts['nodes_visited'] += 1
+            if driver_team_price + constructor_price > current_team_value:
+                counts['pruned_by_cost'] += 1
+                continue
+            
+            counts['teams_scored'] += 1
+            team_score = driver_team_score + constructor_score - substitution_penalty(driver_subs + constructor_subs)
+            top_keys.add(team_score, (driver_team, pair), None)
+    
+    def search(chosen, position, chosen_score, chosen_max, chosen_price, chosen_subs):
+        counts['nodes_visited'] += 1
+        still_needed = 5 - len(chosen)
+        
+        # not enough drivers left, or the cheapest way of finishing the team is over the cost cap
+        if n_drivers - position < still_needed:
+            return
+        if chosen_price + suffix_cheapest[position][still_needed] + cheapest_constructor_price > current_team_value:
+            counts['pruned_by_cost'] += math.comb(n_drivers - position, still_needed) * len(constructor_pairs)
+            return
+        
+        # optimistic upper bound on any team in this subtree
+        best_top_score = max(s for s in (chosen_max, suffix_max_score[position]) if s is not None)
+        fewest_subs = chosen_subs + max(still_needed - suffix_current_drivers[position], 0) + fewest_constructor_subs
+        upper_bound = chosen_score + suffix_top_scores[position][still_needed] + turbo_extra * best_top_score + best_constructor_score - substitution_penalty(fewest_subs)
+        cut_off = top_keys.threshold()
+        if cut_off is not None and upper_bound < cut_off:
+            counts['pruned_by_score'] += math.comb(n_drivers - position, still_needed) * len(constructor_pairs)
+            return
+        
+        for next_position in range(position, n_drivers):
+            i = order[next_position]
+            chosen.append(i)
+            if still_needed == 1:
+                score_driver_team(chosen)
+            else:
+                search(
+                    chosen,
+                    next_position + 1,
+                    chosen_score + driver_score_list[i],
+                    driver_score_list[i] if chosen_max is None else max(chosen_max, driver_score_list[i]),
+                    chosen_price + driver_price_list[i],
+                    chosen_subs + driver_is_new[i])
+            chosen.pop()
+    
+    search([], 0, 0, None, 0, 0)
+    
+    with _stage(stats, 'top_k'):
+        top_teams = SortedList()
+        for team_score, (driver_team, pair), _ in top_keys.entries():
+            driver_team_scores = [driver_score_list[i] for i in driver_team]
+            # ties for the turbo go to the later driver, like sorted(...)[-1] in the brute force search
+            turbo_driver = drivers[driver_team[len(driver_team_scores) - 1 - driver_team_scores[::-1].index(max(driver_team_scores))]]
+            driver_team_price = sum(driver_price_list[i] for i in driver_team)
+            constructor_team_price = sum(current_constructor_values[constructors[c]] for c in pair)
+            proposed_team_value = driver_team_price + constructor_team_price
+            substitutions_needed = len([i for i in driver_team if driver_is_new[i]]) + len([c for c in pair if constructors[c] not in current_team_constructors])
+            
+            top_teams.add(Team(
+                team_score,
+                tuple(constructors[c] for c in pair),
+                tuple(drivers[i] for i in driver_team),
+                turbo_driver,
+                substitutions_needed,
+                proposed_team_value,
+                current_team_value - proposed_team_value))
+    
+    search_counts = {
+        'possible_team_count': math.comb(n_drivers, 5) * math.comb(len(constructors), 2),
+        'teams_scored': counts['teams_scored'],
+        'nodes_visited': counts['nodes_visited'],
+        'pruned_by_cost': counts['pruned_by_cost'],
+        'pruned_by_score': counts['pruned_by_score'],
+    }
+    
+    return top_teams, search_counts
+
+
+def enumerate_teams_meet_in_the_middle(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    top_k=100,
+    turbo_multipliers=(2,),
+    tables=None,
+    stats=None):
+    '''
+    cost capped search that joins a price sorted index of the driver combinations with the constructor pairs,
+    so unaffordable teams are never touched. the driver combinations are grouped by how many substitutions they need
+    (so the substitution penalty is the same across a group) and each group is sorted by price with a running max of score.
+    for a constructor pair, the affordable driver combinations of a group are a prefix found by binary search, and the
+    running max gives the best score in that prefix straight away. prefixes are then visited best first and only until
+    they can't beat the current top_k-th best score.
+    
+    returns the same Teams in the same order as enumerate_teams_brute_force.
+    
+    parameters:
+    same as enumerate_teams_vectorized
+    
+    returns:
+    top_teams: SortedList, the top_k Teams in ascending order of score
+    search_counts: dict, 'possible_team_count' is the number of team combinations there are,
+                   'team_count' is the number of team combinations I can afford,
+                   'nodes_visited' is the number of affordable teams that were actually scored,
+                   'pruned_by_cost' and 'pruned_by_score' are the numbers of team combinations ruled out by the cost cap
+                   and ruled out by the top_k-th best score without being scored
+    '''
+    if tables is None:
+        tables = CombinationTables(
+            drivers,
+            constructors,
+            driver_scores,
+            constructor_scores,
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors,
+            turbo_multipliers)
+    
+    n_constructor_combos = len(tables.constructor_combos)
+    
+    # price sorted driver combinations, one index per number of driver substitutions needed
+    groups = []
+    for driver_subs in np.unique(tables.driver_combo_subs):
+        members = np.flatnonzero(tables.driver_combo_subs == driver_subs)
+        members = members[np.argsort(tables.driver_combo_price[members], kind='stable')]
+        groups.append((
+            driver_subs,
+            members,
+            tables.driver_combo_price[members],
+            np.maximum.accumulate(tables.driver_combo_score[members])))
+    
+    # join every constructor pair with the affordable prefix of every group, keeping the best score each prefix can reach
+    team_count = 0
+    blocks = []
+    for driver_subs, members, prices, running_max in groups:
+        prefix_lengths = _affordable_prefix_length(prices, tables.constructor_combo_price, current_team_value)
+        team_count += int(prefix_lengths.sum())
+        for c in np.flatnonzero(prefix_lengths):
+            substitutions_needed = driver_subs + tables.constructor_combo_subs[c]
+            penalty = 0 if use_wildcard else max(substitutions_needed - 2, 0) * 10
+            best_score = running_max[prefix_lengths[c] - 1] + tables.constructor_combo_score[c] - penalty
+            blocks.append((best_score, c, members[:prefix_lengths[c]], tables.constructor_combo_score[c], penalty))
+    blocks.sort(key=lambda b: b[0], reverse=True)
+    
+    pool_scores = np.array([], dtype=np.result_type(tables.driver_combo_score, tables.constructor_combo_score))
+    pool_indexes = np.array([], dtype=np.int64)
+    nodes_visited = 0
+    for best_score, c, members, constructor_score, penalty in blocks:
+        full = len(pool_indexes) >= top_k
+        if full and best_score < pool_scores[0]:
+            break
+        
+        block_scores = tables.driver_combo_score[members] + constructor_score - penalty
+        nodes_visited += len(members)
+        if full:
+            keep = block_scores >= pool_scores[0]
+            members, block_scores = members[keep], block_scores[keep]
+        
+        pool_scores, pool_indexes = _top_k_pool(
+            np.concatenate([pool_scores, block_scores]),
+            np.concatenate([pool_indexes, members * n_constructor_combos + c]),
+            top_k)
+    
+    with _stage(stats, 'top_k'):
+        top_teams = SortedList()
+        for team_score, index in zip(pool_scores, pool_indexes):
+            top_teams.add(tables.make_team(index // n_constructor_combos, index % n_constructor_combos, team_score, current_team_value))
+    
+    search_counts = {
+        'possible_team_count': tables.possible_team_count,
+        'team_count': team_count,
+        'nodes_visited': nodes_visited,
+        'pruned_by_cost': tables.possible_team_count - team_count,
+        'pruned_by_score': team_count - nodes_visited,
+    }
+    
+    return top_teams, search_counts
+
+
+def _top_teams_in_shard(shard, first_combo, current_team_value, use_wildcard, top_k):
+    '''
+    process pool worker for enumerate_teams_parallel, finds the top_k of one shard of the driver combinations
+    
+    returns:
+    scores, indexes: the shard's top_k team scores and their flat indexes into the full tables
+    team_count: int, number of team combinations in the shard I can afford
+    '''
+    affordable = np.flatnonzero(shard.price_grid().ravel() <= current_team_value)
+    team_scores = shard.score_grid(use_wildcard).ravel()
+    top = top_k_indices(team_scores, affordable, top_k)
+    
+    return team_scores[top], top + first_combo * len(shard.constructor_combos), len(affordable)
+
+
+def enumerate_teams_parallel(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    top_k=100,
+    turbo_multipliers=(2,),
+    tables=None,
+    workers=None,
+    executor=None,
+    stats=None):
+    '''
+    splits the driver combinations into shards and searches them on a process pool. every worker keeps its own top_k
+    and they are merged here with the same ranking the brute force search ends up with, so the result doesn't depend on
+    the number of workers or the order the shards finish in, and is the same as enumerate_teams_brute_force.
+    
+    most worthwhile when most team combinations are affordable, e.g. with the Limitless chip.
+    
+    parameters:
+    same as enumerate_teams_vectorized, plus
+    workers: int, number of processes to use, defaults to the number of cpus
+    executor: concurrent.futures.Executor, optional pool to reuse between runs instead of starting a new one
+    
+    returns:
+    top_teams: SortedList, the top_k Teams in ascending order of score
+    search_counts: dict, same as enumerate_teams_brute_force
+    '''
+    if tables is None:
+        tables = CombinationTables(
+            drivers,
+            constructors,
+            driver_scores,
+            constructor_scores,
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors,
+            turbo_multipliers)
+    
+    workers = workers or os.cpu_count() or 1
+    
+    # a few shards per worker keeps the processes busy if some shards finish faster than others
+    shard_edges = np.linspace(0, len(tables.driver_combos), min(workers * 4, len(tables.driver_combos)) + 1).astype(int)
+    shards = [(start, stop) for start, stop in zip(shard_edges[:-1], shard_edges[1:]) if stop > start]
+    
+    pool = executor or concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(_top_teams_in_shard, tables.shard(start, stop), start, current_team_value, use_wildcard, top_k) for start, stop in shards]
+        results = [future.result() for future in futures]
+    finally:
+        if executor is None:
+            pool.shutdown()
+    
+    with _stage(stats, 'top_k'):
+        pool_scores, pool_indexes = _top_k_pool(
+            np.concatenate([r[0] for r in results]),
+            np.concatenate([r[1] for r in results]),
+            top_k)
+        
+        n_constructor_combos = len(tables.constructor_combos)
+        top_teams = SortedList()
+        for team_score, index in zip(pool_scores, pool_indexes):
+            top_teams.add(tables.make_team(index // n_constructor_combos, index % n_constructor_combos, team_score, current_team_value))
+    
+    team_count = sum(r[2] for r in results)
+    search_counts = {
+        'possible_team_count': tables.possible_team_count,
+        'team_count': team_count,
+        'pruned_by_cost': tables.possible_team_count - team_count,
+        'pruned_by_score': 0,
+    }
+    
+    return top_teams, search_counts
+
+
+def pareto_frontier(
+    drivers,
+    constructors,
+    driver_scores,
+    constructor_scores,
+    current_driver_values,
+    current_constructor_values,
+    current_team_drivers,
+    current_team_constructors,
+    current_team_value,
+    use_wildcard=False,
+    turbo_multipliers=(2,),
+    tables=None,
+    final_fix_race_points=None,
+    stats=None,
+    constraints=None,
+    risk=None):
+    '''
+    every affordable team that isn't beaten by another affordable team on predicted score, proposed team value and substitutions
+    needed all at once (as good on all three and better on at least one). it's the menu of trade-offs between points now and
+    cost cap banked for later weeks, where the top teams by score tend to all sit at the same price.
+    
+    the affordable teams are swept in order of price, one number of substitutions at a time starting from the fewest. a team is
+    on the frontier if it scores more than every team that is no more expensive and needs no more substitutions, which is a
+    running max within its own number of substitutions and a lookup in the running max of the frontier teams needing fewer.
+    only the frontier teams are built into Teams. of two teams that tie on all three, the later one in the brute force order is kept.
+    
+    parameters:
+    same as enumerate_teams_vectorized, without top_k
+    
+    returns:
+    frontier: list, the frontier Teams in ascending order of proposed team value
+    search_counts: dict, possible_team_count, team_count (the affordable teams) and frontier_count
+    '''
+    if tables is None:
+        tables = CombinationTables(
+            drivers,
+            constructors,
+            driver_scores,
+            constructor_scores,
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors,
+            turbo_multipliers,
+            constraints)
+    
+    team_prices = tables.price_grid().ravel()
+    if constraints is None:
+        affordable = np.flatnonzero(team_prices <= current_team_value)
+    else:
+        affordable = np.flatnonzero(constraints.allowed_teams(tables, current_team_value).ravel())
+    team_scores = tables.score_grid(use_wildcard)
+    if final_fix_race_points is not None:
+        team_scores = team_scores + tables.final_fix_gain_grid(final_fix_race_points, current_team_value)
+    if risk is not None:
+        team_scores = team_scores - risk.stdev_multiplier * tables.score_stdev_grid(risk.covariance_array(tables.drivers, tables.constructors))
+    team_scores = team_scores.ravel()[affordable]
+    # rounded so prices that only differ by floating point error in the sums count as the same price
+    team_prices = np.round(team_prices[affordable], 6)
+    team_subs = tables.substitution_grid().ravel()[affordable]
+    
+    with _stage(stats, 'frontier'):
+        # fewest substitutions first, then cheapest, then highest score, then the later team in the brute force order
+        order = np.lexsort((-affordable, -team_scores, team_prices, team_subs))
+        
+        frontier_rows = np.empty(0, dtype=np.int64)
+        for rows in np.split(order, np.flatnonzero(np.diff(team_subs[order])) + 1):
+            if not len(rows):
+                continue
+            
+            # beats every cheaper (or same price) team with the same number of substitutions
+            scores = team_scores[rows]
+            best_before = np.concatenate([[-np.inf], np.maximum.accumulate(scores)[:-1]])
+            rows = rows[scores > best_before]
+            
+            # and the best frontier team needing fewer substitutions at its price or below
+            if len(frontier_rows):
+                by_price = frontier_rows[np.argsort(team_prices[frontier_rows], kind='stable')]
+                best_score = np.maximum.accumulate(team_scores[by_price])
+                cheaper = np.searchsorted(team_prices[by_price], team_prices[rows], side='right') - 1
+                rows = rows[team_scores[rows] > np.where(cheaper >= 0, best_score[np.maximum(cheaper, 0)], -np.inf)]
             
+            frontier_rows = np.concatenate([frontier_rows, rows])
+        
+        frontier_rows = frontier_rows[np.lexsort((-team_scores[frontier_rows], team_prices[frontier_rows]))]
+        n_constructor_combos = len(tables.constructor_combos)
+        frontier = [
+            tables.make_team(affordable[row] // n_constructor_combos, affordable[row] % n_constructor_combos, team_scores[row], current_team_value)
+            for row in frontier_rows]
+    
+    search_counts = {
+        'possible_team_count': tables.possible_team_count,
+        'team_count': len(affordable),
+        'frontier_count': len(frontier),
+    }
+    
+    return frontier, search_counts
 
 
-    print(f'Total Number of Team Combinations: {possible_team_count}')
-    print(f'Total Number of Team Combinations I can afford: {team_count}')
+# how each chip changes the team search. the Autopilot chip puts the turbo on the highest scoring driver, which the
+# search already does with the predicted scores, so it doesn't change anything here
+chip_rules = {
+    'wildcard': {'use_wildcard': True},
+    'limitless': {'use_wildcard': True, 'no_cost_cap': True},
+    'extra_drs': {'turbo_multipliers': (3, 2)},
+    'no_negative': {'no_negative': True},
+    'autopilot': {},
+    'final_fix': {'final_fix': True},
+}
+
 
-    print(f'Explored all of the valid {team_count} teams.\n')
+def final_fix_race_points(driver_scores, driver_score_summary, rules=None):
+    '''
+    splits each driver's predicted score into the part scored in the race itself, which is what a Final Fix swap changes.
+    everything up to and including qualifying (qualifying points and the sprint) stays with the driver that was swapped out.
+    
+    parameters:
+    driver_scores: dict, predicted driver scores
+    driver_score_summary: dict, breakdown of the predicted driver scores from score_race_qualifying_sprint_predicted
+    rules: ScoringRules the scores were made with, for the fastest sprint lap points. defaults to default_rules
+    
+    returns:
+    race_points: dict, each driver's points from the race
+    '''
+    race_points = {}
+    for driver, score in driver_scores.items():
+        summary = driver_score_summary[driver]
+        before_race = summary['quali_position_points']
+        if summary.get('sprint_race'):
+            before_race += summary['sprint_position_points'] + summary['sprint_gain_loss'] + summary['sprint_overtake']
+            before_race += (rules or default_rules).superlative_points['fastest_sprint_lap'] if summary['sprint_race_position'] == 1 else 0
+        race_points[driver] = score - before_race
+    return race_points
 
-    if use_wildcard:
-        print(f'Using wildcard!\n')
 
-    for index, team in enumerate(reversed(top_teams)):
-        print(f'=== TEAM AT POSITION {index + 1} WITH SCORE {team.score} ===')
-        print(team)
-        drops = [driver for driver in current_team_drivers if driver not in team.driver_selection]
-        drops.extend([constructor for constructor in current_team_constructors if constructor not in team.constructor_team])
+def chip_search_settings(chip, driver_scores, constructor_scores, driver_score_summary, current_team_value, rules=None):
+    '''
+    turns a chip into the settings for the team search
+    
+    parameters:
+    chip: str, one of the keys of chip_rules, or None for no chip
+    driver_scores: dict, predicted driver scores
+    constructor_scores: dict, predicted constructor scores
+    driver_score_summary: dict, breakdown of the predicted driver scores
+    current_team_value: float, value of my current team plus the remaining cost cap
+    rules: ScoringRules the scores were made with, defaults to default_rules
+    
+    returns:
+    settings: dict with the driver_scores, constructor_scores, use_wildcard, search_team_value (the cost cap to search under),
+              turbo_multipliers and final_fix_race_points (None unless it's the Final Fix chip) to search with
+    '''
+    chip_rule = chip_rules[chip] if chip else {}
+    
+    # No Negative: nobody scores below zero
+    if chip_rule.get('no_negative'):
+        driver_scores = {d: max(score, 0) for d, score in driver_scores.items()}
+        constructor_scores = {c: max(score, 0) for c, score in constructor_scores.items()}
+    
+    return {
+        'driver_scores': driver_scores,
+        'constructor_scores': constructor_scores,
+        'use_wildcard': chip_rule.get('use_wildcard', False),
+        'search_team_value': float('inf') if chip_rule.get('no_cost_cap') else current_team_value,
+        'turbo_multipliers': chip_rule.get('turbo_multipliers', (2,)),
+        'final_fix_race_points': final_fix_race_points(driver_scores, driver_score_summary, rules) if chip_rule.get('final_fix') else None,
+    }
+
+
+# the team search engines available to main()
+team_search_engines = {
+    'brute_force': enumerate_teams_brute_force,
+    'vectorized': enumerate_teams_vectorized,
+    'branch_and_bound': enumerate_teams_branch_and_bound,
+    'meet_in_the_middle': enumerate_teams_meet_in_the_middle,
+    'parallel': enumerate_teams_parallel,
+}
+
+
+def main(
+    current_team_drivers,
+    current_team_constructors,
+    weekend_df,
+    track_name,
+    driver_pricing,
+    constructor_pricing,
+    remaining_cost_cap,
+    engine = 'vectorized',
+    workers = None,
+    top_k = 100,
+    chip = None,
+    stats = None,
+    rules = None,
+    frontier = False,
+    constraints = None,
+    store = None,
+    risk = None
+        ):
+    
+    # pass in a SearchStats to get the time, search counts and peak memory of each stage of the run
+    if stats is None:
+        stats = SearchStats(track_memory=False)
+    
+    with stats.tracing_memory():
+        # score predicted weekend points
+        with stats.stage('predicted_scoring'):
+            drivers, constructors, driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = score_race_qualifying_sprint_predicted(weekend_df, track_name, rules)
         
-        pickups = [driver for driver in team.driver_selection if driver not in current_team_drivers]
-        pickups.extend([constructor for constructor in team.constructor_team if constructor not in current_team_constructors])
+        print(f'=== Predicted Driver Scores for {track_name.capitalize()} ===')
+        print(driver_scores)
         
-        print('Changes to make:')
-        for drop, pickup in zip(drops, pickups):
-            print(f'    Drop {drop} for {pickup}')
+        with stats.stage('pricing'):
+            # reevaluate team value after changes in driver valuations
+            current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+            current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+            
+            # current_team_value is the updated value of drivers and teams, along with remaining_cost_cap
+            current_team_value = sum(map(lambda c: current_constructor_values[c], current_team_constructors)) + sum(map(lambda d: current_driver_values[d], current_team_drivers)) + remaining_cost_cap
+        
+        
+        print('\n=== Current Team ===')
+        print(f'Constructors: {current_team_constructors}')
+        print(f'Drivers: {current_team_drivers}')
+        print(f'Current Team Value: {round(current_team_value, 1)}')
+        print(f'Current Available Value: {remaining_cost_cap}')
+        
+        # with a RiskObjective the teams are searched on its mean scores, less the risk each team carries
+        if risk is not None:
+            settings = chip_search_settings(chip, risk.driver_scores, risk.constructor_scores, driver_score_summary, current_team_value, rules)
+        else:
+            settings = chip_search_settings(chip, driver_scores, constructor_scores, driver_score_summary, current_team_value, rules)
+        use_wildcard = settings['use_wildcard']
+        
+        # only the parallel engine runs on a process pool, and only the vectorized engine scores the Final Fix
+        engine_options = {'workers': workers} if engine == 'parallel' else {}
+        if settings['final_fix_race_points'] is not None:
+            if engine != 'vectorized':
+                raise ValueError('The Final Fix chip is only supported by the vectorized engine.')
+            engine_options['final_fix_race_points'] = settings['final_fix_race_points']
+        
+        # locked, banned and max substitution rules are pushed down into the tables the vectorized engine searches
+        if constraints is not None:
+            if engine != 'vectorized':
+                raise ValueError('Team constraints are only supported by the vectorized engine.')
+            engine_options['constraints'] = constraints
+        
+        if risk is not None:
+            if engine != 'vectorized':
+                raise ValueError('The risk objective is only supported by the vectorized engine.')
+            if settings['final_fix_race_points'] is not None:
+                raise ValueError('The Final Fix chip can not be combined with the risk objective.')
+            engine_options['risk'] = risk
+        
+        # Go through all team combinations of 5 drivers and 2 constructors, keeping track of the top teams.
+        with stats.stage('enumeration'):
+            top_teams, search_counts = team_search_engines[engine](
+                drivers,
+                constructors,
+                settings['driver_scores'],
+                settings['constructor_scores'],
+                current_driver_values,
+                current_constructor_values,
+                current_team_drivers,
+                current_team_constructors,
+                settings['search_team_value'],
+                use_wildcard,
+                top_k,
+                settings['turbo_multipliers'],
+                stats=stats,
+                **engine_options)
+        stats.search_counts = search_counts
+        
+        # with frontier=True the cost vs score trade-off teams are returned along with the top teams
+        if frontier:
+            with stats.stage('frontier'):
+                frontier_teams, _ = pareto_frontier(
+                    drivers,
+                    constructors,
+                    settings['driver_scores'],
+                    settings['constructor_scores'],
+                    current_driver_values,
+                    current_constructor_values,
+                    current_team_drivers,
+                    current_team_constructors,
+                    settings['search_team_value'],
+                    use_wildcard,
+                    settings['turbo_multipliers'],
+                    final_fix_race_points=settings['final_fix_race_points'],
+                    constraints=constraints,
+                    risk=risk)
+        
+        with stats.stage('output'):
+            # with no cost cap the teams were searched against an unlimited value, so work out what's really left
+            if settings['search_team_value'] != current_team_value:
+                for team in list(top_teams) + (frontier_teams if frontier else []):
+                    team.remaining_cost_cap = current_team_value - team.proposed_team_value
+            
+            print(f'Total Number of Team Combinations: {search_counts["possible_team_count"]}')
+            if 'team_count' in search_counts:
+                print(f'Total Number of Team Combinations I can afford: {search_counts["team_count"]}')
+            
+            # the pruning engines only look at the teams that could still make the top teams
+            if 'nodes_visited' in search_counts:
+                print(f'Total Number of Search Nodes Visited: {search_counts["nodes_visited"]}\n')
+            else:
+                print(f'Explored all of the valid {search_counts["team_count"]} teams.\n')
+            
+            if chip:
+                print(f'Using the {chip} chip!\n')
+            
+            if risk is not None:
+                print(f'Teams ranked by {risk}\n')
+            
+            for index, team in enumerate(reversed(top_teams)):
+                print(f'=== TEAM AT POSITION {index + 1} WITH SCORE {team.score} ===')
+                print(team)
+                drops = [driver for driver in current_team_drivers if driver not in team.driver_selection]
+                drops.extend([constructor for constructor in current_team_constructors if constructor not in team.constructor_team])
+                
+                pickups = [driver for driver in team.driver_selection if driver not in current_team_drivers]
+                pickups.extend([constructor for constructor in team.constructor_team if constructor not in current_team_constructors])
+                
+                print('Changes to make:')
+                for drop, pickup in zip(drops, pickups):
+                    print(f'    Drop {drop} for {pickup}')
+                
+                print()
+            
+            if frontier:
+                print('=== COST VS SCORE FRONTIER ===')
+                for team in frontier_teams:
+                    print(f'Score: {team.score}, Team Value: {round(team.proposed_team_value, 1)}, Remaining: {round(team.remaining_cost_cap, 1)}, '
+                          f'Substitutions: {team.substitutions_needed}, Drivers: {team.driver_selection}, Constructors: {team.constructor_team}')
+    
+        # save the run so its teams and predicted points can be queried later, see result_store.ResultStore
+        if store is not None:
+            store.save_run(
+                track_name,
+                top_teams,
+                driver_scores,
+                constructor_scores,
+                driver_score_summary,
+                constructor_score_summary,
+                inputs=(weekend_df, driver_pricing[['Driver', track_name]], constructor_pricing[['Constructor', track_name]], current_team_drivers, current_team_constructors, remaining_cost_cap, engine, top_k, chip,
+                        vars(rules) if rules is not None else None, vars(constraints) if constraints is not None else None,
+                        risk.covariance if risk is not None else None, vars(risk) if risk is not None else None),
+                engine=engine,
+                chip=chip,
+                remaining_cost_cap=remaining_cost_cap,
+                current_team_value=current_team_value)
+    
+    if frontier:
+        return top_teams, frontier_teams
+    return top_teams
+
+
+def recommend_chip(
+    current_team_drivers,
+    current_team_constructors,
+    weekend_df,
+    track_name,
+    driver_pricing,
+    constructor_pricing,
+    remaining_cost_cap,
+    chips = None,
+    top_k = 1,
+    rules = None):
+    '''
+    runs the team search once without a chip and once for each chip, and recommends the chip with the biggest predicted gain
+    this weekend. the predicted scores and the CombinationTables are built once and shared by every run, the chips only
+    rescore the tables (No Negative, Extra DRS) or change the cost cap, substitution penalty or Final Fix swap they're searched with.
+    
+    parameters:
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    weekend_df: dataframe, weekend dataframe with the predicted positions for each driver
+    track_name: str, track name as it appears in the sheet_gid dict
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    remaining_cost_cap: float, cost cap left over with the current team
+    chips: list, chips to evaluate, defaults to every chip in chip_rules
+    top_k: int, how many of the top teams to keep for each chip
+    rules: ScoringRules to score the weekend with, defaults to default_rules
+    
+    returns:
+    best_chip: str, the chip with the biggest predicted gain, None if no chip gains anything
+    chip_teams: dict, chip (None for no chip) to the SortedList of its top teams
+    '''
+    chips = list(chip_rules) if chips is None else chips
+    
+    drivers, constructors, driver_scores, constructor_scores, driver_score_summary, constructor_score_summary = score_race_qualifying_sprint_predicted(weekend_df, track_name, rules)
+    current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+    current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+    current_team_value = sum(map(lambda c: current_constructor_values[c], current_team_constructors)) + sum(map(lambda d: current_driver_values[d], current_team_drivers)) + remaining_cost_cap
+    
+    tables = CombinationTables(
+        drivers,
+        constructors,
+        driver_scores,
+        constructor_scores,
+        current_driver_values,
+        current_constructor_values,
+        current_team_drivers,
+        current_team_constructors)
+    
+    chip_teams = {}
+    for chip in [None] + chips:
+        settings = chip_search_settings(chip, driver_scores, constructor_scores, driver_score_summary, current_team_value, rules)
+        chip_tables = tables
+        if settings['driver_scores'] is not driver_scores or settings['turbo_multipliers'] != tables.turbo_multipliers:
+            chip_tables = tables.with_scores(settings['driver_scores'], settings['constructor_scores'], settings['turbo_multipliers'])
         
-        print()
+        top_teams, _ = enumerate_teams_vectorized(
+            drivers,
+            constructors,
+            settings['driver_scores'],
+            settings['constructor_scores'],
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors,
+            settings['search_team_value'],
+            settings['use_wildcard'],
+            top_k,
+            settings['turbo_multipliers'],
+            tables=chip_tables,
+            final_fix_race_points=settings['final_fix_race_points'])
         
-    return top_teams
\ No newline at end of file
+        for team in top_teams:
+            team.remaining_cost_cap = current_team_value - team.proposed_team_value
+        chip_teams[chip] = top_teams
+    
+    no_chip_score = chip_teams[None][-1].score if chip_teams[None] else 0
+    gains = {chip: (chip_teams[chip][-1].score if chip_teams[chip] else 0) - no_chip_score for chip in chips}
+    best_chip = max(gains, key=gains.get) if gains and max(gains.values()) > 0 else None
+    
+    print(f'=== Chip Gains for {track_name.capitalize()} (best team without a chip scores {no_chip_score}) ===')
+    for chip in sorted(gains, key=gains.get, reverse=True):
+        print(f'{chip}: {gains[chip]:+}')
+    print(f'\nRecommended Chip: {best_chip}')
+    
+    return best_chip, chip_teams
+
+
+def _track_weekend_df(weekend_dfs, track_name):
+    '''
+    the weekend dataframe for a track, from either a dict of weekend dataframes keyed by track or one dataframe with every track's columns
+    '''
+    return weekend_dfs[track_name] if isinstance(weekend_dfs, dict) else weekend_dfs
+
+
+def plan_transfers(
+    current_team_drivers,
+    current_team_constructors,
+    weekend_dfs,
+    track_names,
+    driver_pricing,
+    constructor_pricing,
+    remaining_cost_cap,
+    free_transfers = 2,
+    max_carried_transfers = 1,
+    candidates_per_week = 200,
+    beam_width = 500,
+    rules = None):
+    '''
+    plans the transfers for several upcoming race weekends together, so a move made this week is valued for what it sets up later.
+    
+    this is a dynamic program over team states, one week at a time. a state is the team held after the week's transfers and the
+    free transfers available next week, and it carries the banked cost cap and the total predicted score so far. each week a state
+    can keep its team or move to any of that week's top candidate teams it can afford with its team value at that week's prices.
+    substitutions beyond the free transfers cost 10 points each, and unused free transfers carry over up to max_carried_transfers.
+    a state beaten on score, free transfers and banked cost cap by another state with the same team is dropped, and only the best
+    beam_width states are kept each week. the moves of a week are scored together as arrays over (state, team) pairs.
+    team scores and prices per track come from that track's CombinationTables and are cached per (track, team).
+    
+    parameters:
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    weekend_dfs: dict of weekend dataframes keyed by track name, or one dataframe with the predicted columns of every track
+    track_names: list, the upcoming tracks in race order, as they appear in sheet_gid
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    remaining_cost_cap: float, cost cap left over with the current team
+    free_transfers: int, free transfers each week
+    max_carried_transfers: int, most unused free transfers that carry over to the next week
+    candidates_per_week: int, number of top teams per week considered as transfer targets
+    beam_width: int, number of team states kept after each week
+    rules: ScoringRules to score the weekends with, defaults to default_rules
+    
+    returns:
+    plan: list of dicts, one per track, with the team to field, turbo driver, substitutions, penalty, predicted score and remaining cost cap
+    total_score: predicted total score of the plan
+    '''
+    weeks = []
+    for track_name in track_names:
+        drivers, constructors, driver_scores, constructor_scores, _, _ = score_race_qualifying_sprint_predicted(_track_weekend_df(weekend_dfs, track_name), track_name, rules)
+        current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+        current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+        tables = CombinationTables(
+            drivers,
+            constructors,
+            driver_scores,
+            constructor_scores,
+            current_driver_values,
+            current_constructor_values,
+            current_team_drivers,
+            current_team_constructors)
+        weeks.append({
+            'track_name': track_name,
+            'tables': tables,
+            'driver_values': current_driver_values,
+            'constructor_values': current_constructor_values,
+            'driver_rows': {tuple(combo): row for row, combo in enumerate(tables.driver_combos.tolist())},
+            'constructor_rows': {tuple(combo): row for row, combo in enumerate(tables.constructor_combos.tolist())},
+            'driver_index': {d: i for i, d in enumerate(tables.drivers)},
+            'constructor_index': {c: i for i, c in enumerate(tables.constructors)},
+        })
+    
+    # per (track, team) score, price and turbo driver, teams are (frozenset of drivers, frozenset of constructors)
+    team_cache = {}
+    
+    def week_team(week, team):
+        key = (week['track_name'], team)
+        if key not in team_cache:
+            try:
+                driver_row = week['driver_rows'][tuple(sorted(week['driver_index'][d] for d in team[0]))]
+                constructor_row = week['constructor_rows'][tuple(sorted(week['constructor_index'][c] for c in team[1]))]
+            except KeyError:
+                # someone on the team isn't on the grid for this track
+                team_cache[key] = None
+                return None
+            tables = week['tables']
+            team_cache[key] = (
+                tables.driver_combo_score[driver_row] + tables.constructor_combo_score[constructor_row],
+                tables.driver_combo_price[driver_row] + tables.constructor_combo_price[constructor_row],
+                tables.drivers[tables.driver_combo_turbo[driver_row]])
+        return team_cache[key]
+    
+    def team_price(week, team):
+        # the price of a team this week, even if it isn't a valid team for the week
+        return sum(week['driver_values'].get(d, 0) for d in team[0]) + sum(week['constructor_values'].get(c, 0) for c in team[1])
+    
+    # teams as a driver and a constructor bitmask over everyone seen so far, so substitutions are popcounts
+    driver_bits, constructor_bits, mask_cache = {}, {}, {}
+    
+    def team_masks(team):
+        if team not in mask_cache:
+            mask_cache[team] = (
+                sum(1 << driver_bits.setdefault(d, len(driver_bits)) for d in team[0]),
+                sum(1 << constructor_bits.setdefault(c, len(constructor_bits)) for c in team[1]))
+        return mask_cache[team]
+    
+    # a state is team -> (total score, free transfers next week, banked cost cap, plan so far)
+    start_team = (frozenset(current_team_drivers), frozenset(current_team_constructors))
+    states = [(0, free_transfers, remaining_cost_cap, start_team, [])]
+    
+    for week in weeks:
+        tables = week['tables']
+        n_constructor_combos = len(tables.constructor_combos)
+        team_values = [team_price(week, team) + bank for _, _, bank, team, _ in states]
+        
+        # transfer targets: the best scoring teams any of the states can afford this week, before substitution penalties
+        affordable = np.flatnonzero(tables.price_grid().ravel() <= max(team_values))
+        team_scores = tables.score_grid(use_wildcard=True).ravel()
+        targets = []
+        for index in top_k_indices(team_scores, affordable, candidates_per_week)[::-1]:
+            driver_row, constructor_row = index // n_constructor_combos, index % n_constructor_combos
+            targets.append((
+                frozenset(tables.drivers[i] for i in tables.driver_combos[driver_row]),
+                frozenset(tables.constructors[i] for i in tables.constructor_combos[constructor_row])))
+        
+        # every move of every state: to each target, or keeping its own team. moves are arrays over (state, team) pairs
+        teams = list(dict.fromkeys(targets + [team for _, _, _, team, _ in states]))
+        team_ids = {team: i for i, team in enumerate(teams)}
+        team_weeks = [week_team(week, team) for team in teams]
+        team_scores = np.array([0 if team_week is None else team_week[0] for team_week in team_weeks])
+        team_prices = np.array([np.inf if team_week is None else team_week[1] for team_week in team_weeks])
+        masks = np.array([team_masks(team) for team in teams], dtype=np.uint64)
+        
+        state_teams = np.array([team_ids[team] for _, _, _, team, _ in states])
+        state_frees = np.array([free for _, free, _, _, _ in states])
+        move_states = np.concatenate([np.repeat(np.arange(len(states)), len(targets)), np.arange(len(states))])
+        move_teams = np.concatenate([np.tile(np.arange(len(targets)), len(states)), state_teams])
+        
+        substitutions_needed = (
+            popcount(masks[move_teams, 0] & ~masks[state_teams[move_states], 0])
+            + popcount(masks[move_teams, 1] & ~masks[state_teams[move_states], 1]))
+        penalty = np.maximum(substitutions_needed - state_frees[move_states], 0) * 10
+        next_free = free_transfers + np.minimum(np.maximum(state_frees[move_states] - substitutions_needed, 0), max_carried_transfers)
+        next_bank = np.array(team_values)[move_states] - team_prices[move_teams]
+        next_score = np.array([total_score for total_score, _, _, _, _ in states])[move_states] + team_scores[move_teams] - penalty
+        
+        # drop moves beaten on score, free transfers and banked cost cap by another move to the same team. with the moves to each
+        # team sorted best first, a move is beaten if an earlier one has at least its free transfers and banked cost cap. free
+        # transfers only take a few values, so for each of them that's a running max of the bank over the earlier moves to the
+        # same team with at least that many free transfers (banks as integer ranks, so each team's running max starts above the last)
+        moves = np.flatnonzero(next_bank >= 0)
+        moves = moves[np.lexsort((-next_bank[moves], -next_free[moves], -next_score[moves], move_teams[moves]))]
+        team_start = np.r_[True, move_teams[moves][1:] != move_teams[moves][:-1]]
+        group_offset = (np.cumsum(team_start) - 1) * (len(moves) + 1)
+        bank_rank = np.unique(next_bank[moves], return_inverse=True)[1].reshape(-1) + 1
+        beaten = np.zeros(len(moves), dtype=bool)
+        for free in np.unique(next_free[moves]):
+            best_bank = np.maximum.accumulate(group_offset + np.where(next_free[moves] >= free, bank_rank, 0))
+            earlier_bank = np.where(team_start, 0, np.r_[0, best_bank[:-1]] - group_offset)
+            beaten |= (next_free[moves] == free) & (earlier_bank >= bank_rank)
+        moves = moves[~beaten]
+        
+        # the best beam_width states go on to the next week
+        moves = moves[np.argsort(-next_score[moves], kind='stable')[:beam_width]]
+        states = [
+            (next_score[move], int(next_free[move]), next_bank[move], teams[move_teams[move]], states[move_states[move]][4] + [{
+                'track_name': week['track_name'],
+                'drivers': sorted(teams[move_teams[move]][0], key=tables.drivers.index),
+                'constructors': sorted(teams[move_teams[move]][1], key=tables.constructors.index),
+                'turbo_driver': team_weeks[move_teams[move]][2],
+                'substitutions_needed': int(substitutions_needed[move]),
+                'penalty': int(penalty[move]),
+                'score': team_scores[move_teams[move]] - penalty[move],
+                'remaining_cost_cap': next_bank[move],
+            }])
+            for move in moves]
+    
+    total_score, _, _, _, plan = max(states, key=lambda s: s[0])
+    
+    for week_plan in plan:
+        print(f'=== {week_plan["track_name"].capitalize()} ===')
+        print(f'Constructors: {week_plan["constructors"]}')
+        print(f'Drivers: {week_plan["drivers"]}')
+        print(f'Turbo Driver: {week_plan["turbo_driver"]}')
+        print(f'Substitutions: {week_plan["substitutions_needed"]} (penalty {week_plan["penalty"]})')
+        print(f'Predicted Score: {week_plan["score"]}')
+        print(f'Remaining Cost Cap: {round(week_plan["remaining_cost_cap"], 2)}\n')
+    print(f'Predicted Total Score: {total_score}')
+    
+    return plan, total_score
+
+
+class OptimizerSession:
+    '''
+    keeps a weekend's team search around between odds and price updates, so the best teams can be re-answered without a full
+    rescan. the session holds the CombinationTables and a reserve of the best affordable teams with their scores. when one
+    driver's predicted position or price changes, only the combinations with the drivers or constructors whose score or price
+    changed are recomputed (found from the tables' per driver and per constructor index of combination rows), which is the
+    changed driver combination rows against every constructor combination and every driver combination against the changed
+    constructor combinations. the reserve is repaired from the teams it still holds plus the best of the recomputed ones. a full rescan only happens if the repaired reserve can't vouch for top_k teams, or if the value of my
+    current team changed (a price change of one of its members), which moves the cost cap of every team.
+    
+    best_teams returns the same Teams in the same order as main with the vectorized engine would for the updated weekend.
+    
+    parameters:
+    weekend_df: dataframe, weekend dataframe with the predicted qualifying and race positions
+    track_name: str, track name as it appears in the sheet_gid dict
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    remaining_cost_cap: float, cost cap left over on my current team
+    use_wildcard: bool, if True there is no penalty for substitutions
+    top_k: int, how many teams best_teams returns
+    reserve: int, how many of the best teams are kept between updates, defaults to 4 * top_k. a bigger reserve means fewer rescans.
+    rules: ScoringRules to score the weekend with, defaults to default_rules
+    '''
+    def __init__(
+        self,
+        weekend_df,
+        track_name,
+        driver_pricing,
+        constructor_pricing,
+        current_team_drivers,
+        current_team_constructors,
+        remaining_cost_cap,
+        use_wildcard=False,
+        top_k=100,
+        reserve=None,
+        rules=None):
+        
+        self.weekend_df = weekend_df.copy()
+        self.track_name = track_name
+        self.current_team_drivers = list(current_team_drivers)
+        self.current_team_constructors = list(current_team_constructors)
+        self.remaining_cost_cap = remaining_cost_cap
+        self.use_wildcard = use_wildcard
+        self.top_k = top_k
+        self.reserve = reserve or 4 * top_k
+        self.rules = rules
+        self.rescans = 0
+        
+        self.current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+        self.current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+        drivers, constructors, self.driver_scores, self.constructor_scores = self._score_weekend()
+        
+        self.tables = CombinationTables(
+            drivers,
+            constructors,
+            self.driver_scores,
+            self.constructor_scores,
+            self.current_driver_values,
+            self.current_constructor_values,
+            self.current_team_drivers,
+            self.current_team_constructors)
+        self._rescan()
+    
+    @property
+    def current_team_value(self):
+        return sum(map(lambda c: self.current_constructor_values[c], self.current_team_constructors)) + sum(map(lambda d: self.current_driver_values[d], self.current_team_drivers)) + self.remaining_cost_cap
+    
+    def _score_weekend(self):
+        # the sprint weekend message is printed once when the session is set up, not on every update
+        with contextlib.redirect_stdout(io.StringIO()):
+            drivers, constructors, driver_scores, constructor_scores, _, _ = score_race_qualifying_sprint_predicted(self.weekend_df, self.track_name, self.rules)
+        return drivers, constructors, driver_scores, constructor_scores
+    
+    def _keys_at_least(self, indexes, scores, bound):
+        '''
+        which of the flat indexes (with their scores) rank at or above bound, a (score, index) pair, in the (score, index) order
+        of top_k_indices
+        '''
+        return (scores > bound[0]) | ((scores == bound[0]) & (indexes >= bound[1]))
+    
+    def _keep_best(self, indexes, scores, bound):
+        '''
+        keeps the reserve best of the flat indexes, given with their scores. bound is the (score, index) pair at or above which
+        every affordable team is among the indexes, or None if they're all there. the same has to hold for what's kept, so it's
+        tightened if the indexes are cut down.
+        '''
+        if len(indexes) > self.reserve:
+            order = np.argsort(indexes)
+            order = order[top_k_indices(scores[order], np.arange(len(order)), self.reserve)]
+            indexes, scores = indexes[order], scores[order]
+            bound = (scores[0], indexes[0])
+        order = np.lexsort((indexes, scores))
+        self.best_indexes, self.best_scores = indexes[order], scores[order]
+        self.bound = bound
+    
+    def _rescan(self):
+        '''
+        scores every team combination and picks the reserve from scratch
+        '''
+        self.rescans += 1
+        affordable = np.flatnonzero((self.tables.price_grid() <= self.current_team_value).ravel())
+        self._keep_best(affordable, self.tables.score_grid(self.use_wildcard).ravel()[affordable], None)
+    
+    def _repair(self, driver_rows, constructor_rows):
+        '''
+        rescores the team combinations in the given driver combination rows and constructor combination columns,
+        then repairs the reserve of best teams
+        '''
+        n_driver_combos, n_constructor_combos = len(self.tables.driver_combos), len(self.tables.constructor_combos)
+        team_value = self.current_team_value
+        
+        # the reserve teams that weren't rescored still hold every untouched team at or above the old bound
+        row_changed = np.zeros(n_driver_combos, dtype=bool)
+        row_changed[driver_rows] = True
+        column_changed = np.zeros(n_constructor_combos, dtype=bool)
+        column_changed[constructor_rows] = True
+        unchanged = ~(row_changed[self.best_indexes // n_constructor_combos] | column_changed[self.best_indexes % n_constructor_combos])
+        sources = [(self.best_indexes[unchanged], self.best_scores[unchanged], self.bound)]
+        
+        # the rescored teams are two blocks, the changed rows with every column and every row with the changed columns, scored
+        # the same way as score_grid and price_grid. a block's flat indexes are in the same order as the full grid's, so the best
+        # of each block are picked on their own, with their own bound. teams in both blocks are left to the row block.
+        for rows, columns in [(driver_rows, slice(None)), (slice(None), constructor_rows)]:
+            team_score = self.tables.driver_combo_score[rows, None] + self.tables.constructor_combo_score[None, columns]
+            if not self.use_wildcard:
+                # substitutions are at most 7, so the penalty is worked out in int8
+                substitutions = self.tables.driver_combo_subs[rows, None].astype(np.int8) + self.tables.constructor_combo_subs[None, columns].astype(np.int8)
+                team_score = team_score - np.maximum(substitutions - 2, 0) * 10
+            affordable = self.tables.driver_combo_price[rows, None] + self.tables.constructor_combo_price[None, columns] <= team_value
+            if isinstance(rows, slice):
+                affordable &= ~row_changed[:, None]
+            
+            team_score = team_score.ravel()
+            rescored = np.flatnonzero(affordable)
+            rescored_best = top_k_indices(team_score, rescored, self.reserve)
+            block_rows, block_columns = np.arange(n_driver_combos)[rows], np.arange(n_constructor_combos)[columns]
+            indexes = block_rows[rescored_best // len(block_columns)] * n_constructor_combos + block_columns[rescored_best % len(block_columns)]
+            scores = team_score[rescored_best]
+            sources.append((indexes, scores, (scores[0], indexes[0]) if len(rescored) > self.reserve else None))
+        
+        # every affordable team at or above all the bounds is in one of the sources, anything below any of them might not be
+        bounds = [b for _, _, b in sources if b is not None]
+        bound = max(bounds) if bounds else None
+        indexes = np.concatenate([indexes for indexes, _, _ in sources])
+        scores = np.concatenate([scores for _, scores, _ in sources])
+        if bound is not None:
+            at_least = self._keys_at_least(indexes, scores, bound)
+            indexes, scores = indexes[at_least], scores[at_least]
+        
+        if bound is None or len(indexes) >= self.top_k:
+            self._keep_best(indexes, scores, bound)
+        else:
+            self._rescan()
+    
+    def _update(self, driver_values=None, constructor_values=None):
+        '''
+        rescores the weekend and repairs the search for whatever changed
+        '''
+        old_team_value = self.current_team_value
+        self.current_driver_values.update(driver_values or {})
+        self.current_constructor_values.update(constructor_values or {})
+        _, _, driver_scores, constructor_scores = self._score_weekend()
+        
+        changed_driver_scores = {d: s for d, s in driver_scores.items() if s != self.driver_scores[d]}
+        changed_constructor_scores = {c: s for c, s in constructor_scores.items() if s != self.constructor_scores[c]}
+        self.driver_scores, self.constructor_scores = driver_scores, constructor_scores
+        
+        driver_rows, constructor_rows = self.tables.update(changed_driver_scores, changed_constructor_scores, driver_values, constructor_values)
+        if self.current_team_value != old_team_value:
+            self._rescan()
+        else:
+            self._repair(driver_rows, constructor_rows)
+    
+    def update_position(self, driver, session, position):
+        '''
+        changes one driver's predicted position
+        
+        parameters:
+        driver: str, the driver
+        session: str, 'qualifying', 'race', 'sprint_qualifying' or 'sprint_race'
+        position: int, the new predicted position
+        '''
+        self.weekend_df.loc[self.weekend_df.Driver == driver, f'predicted_{session}_{self.track_name}'] = position
+        self._update()
+    
+    def update_driver_price(self, driver, price):
+        '''
+        changes one driver's price
+        '''
+        self._update(driver_values={driver: price})
+    
+    def update_constructor_price(self, constructor, price):
+        '''
+        changes one constructor's price
+        '''
+        self._update(constructor_values={constructor: price})
+    
+    def best_teams(self):
+        '''
+        the best teams for the weekend as it stands now
+        
+        returns:
+        top_teams: SortedList, the top_k Teams in ascending order of score
+        '''
+        n_constructor_combos = len(self.tables.constructor_combos)
+        team_value = self.current_team_value
+        top_teams = SortedList()
+        for index, score in zip(self.best_indexes[-self.top_k:], self.best_scores[-self.top_k:]):
+            top_teams.add(self.tables.make_team(index // n_constructor_combos, index % n_constructor_combos, score, team_value))
+        return top_teams
+
+
+# price changes tried by sensitivity_sweep, a couple of weeks of the biggest price moves either way
+sweep_price_changes = tuple(np.round(np.arange(-2.0, 2.05, 0.1), 1))
+
+
+def _stable_range(values, same_team, base_value):
+    '''
+    lowest and highest of the sorted values that keep the same top team without a break from base_value
+    '''
+    low = high = base_value
+    for value, same in zip(values[::-1], same_team[::-1]):
+        if value < base_value:
+            if not same:
+                break
+            low = value
+    for value, same in zip(values, same_team):
+        if value > base_value:
+            if not same:
+                break
+            high = value
+    return low, high
+
+
+def _move_position(positions, i, position):
+    '''
+    the session's positions with driver i moved to position and the drivers in between moved one place the other way,
+    so the positions are still a finishing order. e.g. moving P10 up to P2 drops the old P2 to P9 down one place each.
+    '''
+    positions = positions.copy()
+    old_position = positions[i]
+    if position < old_position:
+        positions[(positions >= position) & (positions < old_position)] += 1
+    elif position > old_position:
+        positions[(positions > old_position) & (positions <= position)] -= 1
+    positions[i] = position
+    return positions
+
+
+def sensitivity_sweep(
+    current_team_drivers,
+    current_team_constructors,
+    weekend_df,
+    track_name,
+    driver_pricing,
+    constructor_pricing,
+    remaining_cost_cap,
+    sessions = None,
+    positions = None,
+    price_changes = sweep_price_changes,
+    use_wildcard = False,
+    rules = None):
+    '''
+    how fragile the recommended team is. every driver's predicted position in each session is moved through positions (the
+    drivers in between moving one place to make room), and every driver and constructor price through price_changes, one at a
+    time, and the top team is found again for each.
+    
+    all the moved positions are scored in one batch with the ScoringRules.score_weekends kernel. the team search shares one set of
+    CombinationTables: the best team a change doesn't touch is looked up in the affordable teams of the weekend as predicted,
+    sorted once, and only the combinations with a driver or constructor whose score or price changed (and that could still beat
+    that team) are rescored. each change costs well under a millisecond instead of a full main() run.
+    
+    parameters:
+    current_team_drivers: list, drivers currently on my team
+    current_team_constructors: list, constructors currently on my team
+    weekend_df: dataframe, weekend dataframe with the predicted positions for each driver
+    track_name: str, track name as it appears in the sheet_gid dict
+    driver_pricing: dataframe, driver prices with a column per track
+    constructor_pricing: dataframe, constructor prices with a column per track
+    remaining_cost_cap: float, cost cap left over on my current team
+    sessions: list, predicted sessions to move positions in, defaults to qualifying and race (and the sprint ones on a sprint weekend)
+    positions: list, positions each driver is moved to, defaults to 1 to the number of drivers
+    price_changes: list, changes added to each price
+    use_wildcard: bool, if True there is no penalty for substitutions
+    rules: ScoringRules, the season's scoring rules, default_rules if not given
+    
+    returns:
+    stability: dataframe, one row per driver and constructor, whether it's on the top team and the lowest and highest position
+               (session_low and session_high) and price change (price_change_low and price_change_high) that keep the same top team
+    sweep: dataframe, one row per change, with the top team it leads to and whether that's the same top team (with the same turbo driver)
+    '''
+    rules = rules or default_rules
+    with contextlib.redirect_stdout(io.StringIO()):
+        drivers, constructors, driver_scores, constructor_scores, _, _ = score_race_qualifying_sprint_predicted(weekend_df, track_name, rules)
+    current_driver_values = {x[0]: x[1] for x in driver_pricing[['Driver', track_name]].values}
+    current_constructor_values = {x[0]: x[1] for x in constructor_pricing[['Constructor', track_name]].values}
+    tables = CombinationTables(drivers, constructors, driver_scores, constructor_scores, current_driver_values, current_constructor_values, current_team_drivers, current_team_constructors)
+    drivers, constructors = tables.drivers, tables.constructors
+    
+    sprint_flag = f'predicted_sprint_race_{track_name}' in weekend_df.columns
+    all_sessions = ['qualifying', 'race'] + (['sprint_qualifying', 'sprint_race'] if sprint_flag else [])
+    sessions = list(sessions or all_sessions)
+    positions = list(positions or range(1, len(drivers) + 1))
+    
+    current_driver_rows = [drivers.index(d) for d in current_team_drivers]
+    current_constructor_rows = [constructors.index(c) for c in current_team_constructors]
+    n_constructor_combos = len(tables.constructor_combos)
+    substitution_penalty = np.zeros(tables.substitution_grid().shape) if use_wildcard else np.maximum(tables.substitution_grid() - 2, 0) * 10
+    
+    def team_value_of(driver_price_array, constructor_price_array):
+        return sum(constructor_price_array[current_constructor_rows].tolist()) + sum(driver_price_array[current_driver_rows].tolist()) + remaining_cost_cap
+    
+    # every affordable team of the weekend as predicted, best first, so the best team a change doesn't touch is a lookup
+    base_team_value = team_value_of(tables.driver_price_array, tables.constructor_price_array)
+    base_scores = tables.score_grid(use_wildcard).ravel()
+    base_prices = tables.price_grid().ravel()
+    affordable = np.flatnonzero(base_prices <= base_team_value)
+    base_order = affordable[np.lexsort((affordable, base_scores[affordable]))[::-1]]
+    
+    # which combinations each driver and constructor is in
+    driver_in_combo = np.zeros((len(drivers), len(tables.driver_combos)), dtype=bool)
+    driver_in_combo[tables.driver_combos, np.arange(len(tables.driver_combos))[:, None]] = True
+    constructor_in_combo = np.zeros((len(constructors), n_constructor_combos), dtype=bool)
+    constructor_in_combo[tables.constructor_combos, np.arange(n_constructor_combos)[:, None]] = True
+    
+    def best_untouched(driver_changed, constructor_changed, team_value, chunk_size=4096):
+        # the first team in base_order without a changed driver or constructor that's still affordable
+        for start in range(0, len(base_order), chunk_size):
+            chunk = base_order[start:start + chunk_size]
+            rows, columns = np.divmod(chunk, n_constructor_combos)
+            untouched = ~driver_changed[rows] & ~constructor_changed[columns] & (base_prices[chunk] <= team_value)
+            if untouched.any():
+                index = chunk[untouched.argmax()]
+                return (base_scores[index], index)
+        return (-np.inf, -1)
+    
+    def best_in(rows, row_scores, row_prices, columns, column_scores, column_prices, team_value, best):
+        '''
+        best affordable team of a block of the grid as (score, flat index), ties going to the later team like top_k_indices,
+        or best if nothing in the block beats it. rows that can't reach best even with the top constructor combination are skipped.
+        '''
+        if not len(rows) or not len(columns):
+            return best
+        reachable = row_scores + column_scores.max() >= best[0]
+        rows, row_scores, row_prices = rows[reachable], row_scores[reachable], row_prices[reachable]
+        if not len(rows):
+            return best
+        
+        team_scores = row_scores[:, None] + column_scores[None, :] - substitution_penalty[np.ix_(rows, columns)]
+        team_scores = np.where(row_prices[:, None] + column_prices[None, :] <= team_value, team_scores, -np.inf)
+        top_score = team_scores.max()
+        if top_score == -np.inf:
+            return best
+        row, column = divmod(np.flatnonzero(team_scores.ravel() == top_score)[-1], len(columns))
+        return max(best, (top_score, rows[row] * n_constructor_combos + columns[column]))
+    
+    def top_team(driver_score_array, constructor_score_array, driver_price_array, constructor_price_array):
+        '''
+        the top team with the changed scores and prices, only rescoring the combinations they touch
+        '''
+        changed_drivers = np.flatnonzero((driver_score_array != tables.driver_score_array) | (driver_price_array != tables.driver_price_array))
+        changed_constructors = np.flatnonzero((constructor_score_array != tables.constructor_score_array) | (constructor_price_array != tables.constructor_price_array))
+        team_value = team_value_of(driver_price_array, constructor_price_array)
+        
+        driver_changed = driver_in_combo[changed_drivers].any(axis=0)
+        constructor_changed = constructor_in_combo[changed_constructors].any(axis=0)
+        rows, other_rows = np.flatnonzero(driver_changed), np.flatnonzero(~driver_changed)
+        columns, other_columns = np.flatnonzero(constructor_changed), np.flatnonzero(~constructor_changed)
+        
+        # the untouched teams keep their score and price, so with no more team value than before their best is the first one
+        # still affordable in base_order. with more team value it's a lower bound, and the untouched teams are searched above it.
+        best = best_untouched(driver_changed, constructor_changed, team_value)
+        if team_value > base_team_value:
+            best = best_in(other_rows, tables.driver_combo_score[other_rows], tables.driver_combo_price[other_rows],
+                           other_columns, tables.constructor_combo_score[other_columns], tables.constructor_combo_price[other_columns], team_value, best)
+        
+        # the changed constructor combinations against the unchanged driver combinations
+        constructor_combo_score = tables.constructor_combo_score.astype(np.result_type(tables.constructor_combo_score, constructor_score_array))
+        constructor_combo_price = tables.constructor_combo_price.copy()
+        if len(columns):
+            constructor_combo_score[columns] = _sum_columns(constructor_score_array[tables.constructor_combos[columns]])
+            constructor_combo_price[columns] = _sum_columns(constructor_price_array[tables.constructor_combos[columns]])
+        best = best_in(other_rows, tables.driver_combo_score[other_rows], tables.driver_combo_price[other_rows],
+                       columns, constructor_combo_score[columns], constructor_combo_price[columns], team_value, best)
+        
+        # and the changed driver combinations against every constructor combination. a changed combination scores at most its
+        # old score plus the turbo weighted gains of the changed drivers, so only the ones that could beat best are rescored
+        score_gain = np.maximum(driver_score_array - tables.driver_score_array, 0).sum() * max(tables.turbo_multipliers)
+        rows = rows[tables.driver_combo_score[rows] + score_gain + constructor_combo_score.max() >= best[0]]
+        row_turbo, _, row_score = tables._score_driver_combos(tables.driver_combos[rows], driver_score_array)
+        row_price = _sum_columns(driver_price_array[tables.driver_combos[rows]]) if len(rows) else np.zeros(0)
+        best = best_in(rows, row_score, row_price, np.arange(n_constructor_combos), constructor_combo_score, constructor_combo_price, team_value, best)
+        
+        score, index = best
+        if index < 0:
+            return None
+        row, column = divmod(index, n_constructor_combos)
+        turbo = row_turbo[np.searchsorted(rows, row)] if driver_changed[row] else tables.driver_combo_turbo[row]
+        return score, row, column, turbo
+    
+    def describe(team):
+        if team is None:
+            return {'score': np.nan, 'drivers': None, 'turbo_driver': None, 'constructors': None}
+        score, row, column, turbo = team
+        return {
+            'score': score,
+            'drivers': ', '.join(drivers[i] for i in tables.driver_combos[row]),
+            'turbo_driver': drivers[turbo],
+            'constructors': ', '.join(constructors[i] for i in tables.constructor_combos[column]),
+        }
+    
+    base_team = top_team(tables.driver_score_array, tables.constructor_score_array, tables.driver_price_array, tables.constructor_price_array)
+    base_key = base_team[1:] if base_team is not None else None
+    
+    # every moved position as its own row of predicted positions, scored in one batch
+    base_positions = {session: weekend_df[f'predicted_{session}_{track_name}'].to_numpy() for session in all_sessions}
+    moves = [(i, session, position) for i in range(len(drivers)) for session in sessions for position in positions]
+    moved_positions = {session: np.tile(base_positions[session], (len(moves), 1)) for session in all_sessions}
+    for k, (i, session, position) in enumerate(moves):
+        moved_positions[session][k] = _move_position(base_positions[session], i, position)
+    moved_driver_points, moved_constructor_points, _ = rules.score_weekends(
+        moved_positions['qualifying'],
+        moved_positions['race'],
+        constructor_membership(weekend_df.Team.to_numpy(), weekend_df.Team.unique()),
+        moved_positions.get('sprint_qualifying'),
+        moved_positions.get('sprint_race'),
+        constructor_fastest_lap=False)
+    
+    sweep = []
+    for k, (i, session, position) in enumerate(moves):
+        team = top_team(moved_driver_points[k], moved_constructor_points[k], tables.driver_price_array, tables.constructor_price_array)
+        sweep.append({'name': drivers[i], 'kind': 'driver', 'change': session, 'value': position,
+                      'same_team': team is not None and team[1:] == base_key, **describe(team)})
+    
+    for kind, names, price_array in [('driver', drivers, tables.driver_price_array), ('constructor', constructors, tables.constructor_price_array)]:
+        for i, name in enumerate(names):
+            for price_change in price_changes:
+                changed_price_array = price_array.copy()
+                changed_price_array[i] += price_change
+                if kind == 'driver':
+                    team = top_team(tables.driver_score_array, tables.constructor_score_array, changed_price_array, tables.constructor_price_array)
+                else:
+                    team = top_team(tables.driver_score_array, tables.constructor_score_array, tables.driver_price_array, changed_price_array)
+                sweep.append({'name': name, 'kind': kind, 'change': 'price', 'value': price_change,
+                              'same_team': team is not None and team[1:] == base_key, **describe(team)})
+    sweep = pd.DataFrame(sweep)
+    
+    # how far each position and price can move either way before the top team changes
+    base = describe(base_team)
+    stability = []
+    for (name, kind), changes in sweep.groupby(['name', 'kind'], sort=False):
+        on_top_team = name in ((base['drivers'] or '').split(', ') if kind == 'driver' else (base['constructors'] or '').split(', '))
+        row = {'name': name, 'kind': kind, 'on_top_team': on_top_team, 'turbo_driver': name == base['turbo_driver']}
+        for change, values in changes.groupby('change', sort=False):
+            values = values.sort_values('value')
+            if change == 'price':
+                base_value, prefix = 0.0, 'price_change'
+                row['price'] = (current_driver_values if kind == 'driver' else current_constructor_values)[name]
+            else:
+                base_value, prefix = base_positions[change][drivers.index(name)], change
+                row[change] = base_value
+            row[f'{prefix}_low'], row[f'{prefix}_high'] = _stable_range(values.value.to_numpy(), values.same_team.to_numpy(), base_value)
+        stability.append(row)
+    stability = pd.DataFrame(stability).set_index('name')
+    
+    return stability, sweep
+
+
+def score_rosters(rosters, driver_scores, constructor_scores, previous_rosters=None):
+    '''
+    scores a whole league of fantasy rosters against one weekend's results in one vectorized pass, e.g. with the actual
+    driver and constructor scores from score_race_full. the names of every roster are turned into score indexes at once,
+    so thousands of rosters cost about as much as a handful.
+    
+    each roster scores its 5 drivers and 2 constructors, the turbo driver once more, and -10 points for each substitution
+    beyond the 2 free ones. the chips of chip_rules are applied per roster: wildcard and limitless waive the substitution
+    penalty, no_negative scores nobody below zero, extra_drs triples the extra_drs_driver on top of the turbo, and autopilot
+    gives the turbo to the highest scoring driver of the roster. with the final_fix chip, pass the roster after the swap.
+    drivers or constructors without a score score 0.
+    
+    parameters:
+    rosters: dataframe, one row per roster indexed by its league member, with 'drivers' (5 driver names), 'constructors'
+             (2 constructor names) and 'turbo_driver' columns, and optional 'chip', 'extra_drs_driver' and 'substitutions' columns
+    driver_scores: dict, each driver's score for the weekend
+    constructor_scores: dict, each constructor's score for the weekend
+    previous_rosters: dataframe, the rosters of the weekend before, shaped like rosters. the substitutions of every member in it
+                      are counted from it instead of taken from the substitutions column
+    
+    returns:
+    standings: dataframe, the members ranked by points
+    breakdown: dataframe, one row per roster of its chip, driver points, extra turbo (and extra DRS) points, constructor points,
+               substitutions, penalty and points
+    '''
+    n_rosters = len(rosters)
+    driver_names = np.array(rosters.drivers.tolist(), dtype=object).reshape(n_rosters, 5)
+    constructor_names = np.array(rosters.constructors.tolist(), dtype=object).reshape(n_rosters, 2)
+    chips = rosters.chip.fillna('').to_numpy(dtype=object) if 'chip' in rosters.columns else np.full(n_rosters, '', dtype=object)
+    unknown_chips = set(chips) - set(chip_rules) - {''}
+    if unknown_chips:
+        raise ValueError(f'Unknown chips {sorted(unknown_chips)}, they have to be one of {list(chip_rules)}.')
+    
+    # every name as a code, with the names that have no score coded after the ones that do
+    previous_driver_names, previous_constructor_names = np.empty((0, 5), dtype=object), np.empty((0, 2), dtype=object)
+    if previous_rosters is not None:
+        previous = previous_rosters.reindex(rosters.index)
+        has_previous = previous.drivers.notna().to_numpy()
+        previous_driver_names = np.array(previous.drivers[has_previous].tolist(), dtype=object).reshape(-1, 5)
+        previous_constructor_names = np.array(previous.constructors[has_previous].tolist(), dtype=object).reshape(-1, 2)
+    driver_codes = pd.Index(pd.unique(np.concatenate([np.array(list(driver_scores), dtype=object), driver_names.ravel(), previous_driver_names.ravel()])))
+    constructor_codes = pd.Index(pd.unique(np.concatenate([np.array(list(constructor_scores), dtype=object), constructor_names.ravel(), previous_constructor_names.ravel()])))
+    driver_score_array = np.zeros(len(driver_codes), dtype=np.result_type(np.int64, *driver_scores.values()))
+    driver_score_array[:len(driver_scores)] = list(driver_scores.values())
+    constructor_score_array = np.zeros(len(constructor_codes), dtype=np.result_type(np.int64, *constructor_scores.values()))
+    constructor_score_array[:len(constructor_scores)] = list(constructor_scores.values())
+    driver_rows = driver_codes.get_indexer(driver_names.ravel()).reshape(n_rosters, 5)
+    constructor_rows = constructor_codes.get_indexer(constructor_names.ravel()).reshape(n_rosters, 2)
+    
+    roster_driver_scores = driver_score_array[driver_rows]
+    roster_constructor_scores = constructor_score_array[constructor_rows]
+    no_negative = np.isin(chips, [c for c, rules in chip_rules.items() if rules.get('no_negative')])
+    roster_driver_scores = np.where(no_negative[:, None], np.maximum(roster_driver_scores, 0), roster_driver_scores)
+    roster_constructor_scores = np.where(no_negative[:, None], np.maximum(roster_constructor_scores, 0), roster_constructor_scores)
+    
+    # the turbo driver counts twice, or goes to the highest scorer with autopilot (ties going to the later driver like the turbo does)
+    autopilot = chips == 'autopilot'
+    turbo_on_team = driver_names == rosters.turbo_driver.to_numpy(dtype=object)[:, None]
+    if not (turbo_on_team.any(axis=1) | autopilot).all():
+        raise ValueError(f'The turbo driver is not on the roster of {rosters.index[~(turbo_on_team.any(axis=1) | autopilot)].tolist()}.')
+    highest_scorer = 4 - np.argmax(roster_driver_scores[:, ::-1], axis=1)
+    turbo_slot = np.where(autopilot, highest_scorer, np.argmax(turbo_on_team, axis=1))
+    multipliers = np.ones((n_rosters, 5), dtype=np.int64)
+    multipliers[np.arange(n_rosters), turbo_slot] = 2
+    
+    # extra DRS triples its driver, with the turbo still on another
+    extra_drs = np.isin(chips, [c for c, rules in chip_rules.items() if 'turbo_multipliers' in rules])
+    if extra_drs.any():
+        extra_drs_on_team = driver_names == rosters.get('extra_drs_driver', pd.Series(None, index=rosters.index)).to_numpy(dtype=object)[:, None]
+        if not extra_drs_on_team[extra_drs].any(axis=1).all():
+            raise ValueError(f'The extra DRS driver is not on the roster of {rosters.index[extra_drs & ~extra_drs_on_team.any(axis=1)].tolist()}.')
+        extra_drs_slot = np.argmax(extra_drs_on_team, axis=1)
+        multipliers[extra_drs, extra_drs_slot[extra_drs]] = chip_rules['extra_drs']['turbo_multipliers'][0]
+    
+    # substitutions from last weekend's roster as bitmasks, members without one keep the substitutions column (or 0)
+    substitutions = rosters.substitutions.fillna(0).to_numpy(dtype=np.int64, copy=True) if 'substitutions' in rosters.columns else np.zeros(n_rosters, dtype=np.int64)
+    if previous_rosters is not None:
+        if has_previous.any():
+            previous_driver_rows = driver_codes.get_indexer(previous_driver_names.ravel()).reshape(-1, 5)
+            previous_constructor_rows = constructor_codes.get_indexer(previous_constructor_names.ravel()).reshape(-1, 2)
+            new_drivers = popcount(Roster.combo_masks(driver_rows[has_previous]) & ~Roster.combo_masks(previous_driver_rows))
+            new_constructors = popcount(Roster.combo_masks(constructor_rows[has_previous]) & ~Roster.combo_masks(previous_constructor_rows))
+            substitutions[has_previous] = new_drivers + new_constructors
+    no_penalty = np.isin(chips, [c for c, rules in chip_rules.items() if rules.get('use_wildcard')])
+    penalty = np.where(no_penalty, 0, np.maximum(substitutions - 2, 0) * 10)
+    
+    driver_points = _sum_columns(roster_driver_scores)
+    turbo_points = _sum_columns(roster_driver_scores * (multipliers - 1))
+    constructor_points = _sum_columns(roster_constructor_scores)
+    breakdown = pd.DataFrame({
+        'chip': np.where(chips == '', None, chips),
+        'driver_points': driver_points,
+        'turbo_points': turbo_points,
+        'constructor_points': constructor_points,
+        'substitutions': substitutions,
+        'penalty': -penalty,
+        'points': driver_points + turbo_points + constructor_points - penalty,
+    }, index=rosters.index)
+    
+    standings = breakdown[['points']].sort_values('points', ascending=False, kind='stable')
+    standings.insert(0, 'rank', standings.points.rank(method='min', ascending=False).astype(int))
+    return standings, breakdown
+
+
+def season_standings(weekend_breakdowns):
+    '''
+    the league table of a season from the breakdown score_rosters returned for each weekend, members missing a weekend score 0 for it
+    
+    parameters:
+    weekend_breakdowns: dict, track name to the breakdown of its weekend, in calendar order
+    
+    returns:
+    standings: dataframe, one row per member with their points at each track and in total, ranked by the total
+    '''
+    standings = pd.DataFrame({track_name: breakdown.points for track_name, breakdown in weekend_breakdowns.items()}).fillna(0)
+    standings = standings.astype(np.result_type(*[breakdown.points.dtype for breakdown in weekend_breakdowns.values()]))
+    standings['total'] = standings.sum(axis=1)
+    standings = standings.sort_values('total', ascending=False, kind='stable')
+    standings.insert(0, 'rank', standings.total.rank(method='min', ascending=False).astype(int))
+    return standings